@@ -1,6 +1,7 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
 import json
+from category_index import KEY_FIELD, category_key
 
 def fetch_all_animals():
     cred = credentials.Certificate("serviceaccount.json")
@@ -11,11 +12,11 @@ def fetch_all_animals():
 
     db = firestore.client()
 
-    # adjust these to match how categories are stored in your documents
-    categories = ["animal", "animals", "Animal", "Animals"]
+    # every spelling of the category shares one categoryKey (python category_index.py migrate)
+    key = category_key("animals")
 
-    print("Fetching documents from 'models' collection with category in", categories, "...\n")
-    docs = db.collection("models").where("category", "in", categories).stream()
+    print(f"Fetching documents from 'models' collection with {KEY_FIELD} == {key!r} ...\n")
+    docs = db.collection("models").where(KEY_FIELD, "==", key).stream()
 
     found = False
     for doc in docs:
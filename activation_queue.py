@@ -0,0 +1,136 @@
+import sys
+import threading
+import time
+
+MAX_BATCH_WRITES = 500  # Firestore limit per batch
+
+
+class ActivationWriter:
+    """Write-behind queue for `/activate`.
+
+    Activations are coalesced per document id and flushed every `window`
+    seconds from a background thread as Firestore batch writes, so a class
+    scanning the same card produces one write instead of thirty and the
+    request thread never waits on Firestore. Each write adds the coalesced
+    count to the document's `activations` counter, which ranks the models
+    the page prefetches.
+    """
+
+    def __init__(self, db_factory, collection="models", window=2.0, max_batch=MAX_BATCH_WRITES,
+                 clock=time.monotonic):
+        self._db_factory = db_factory
+        self._collection = collection
+        self.window = window
+        self.max_batch = min(max_batch, MAX_BATCH_WRITES)
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._pending = {}  # doc_id -> activations since last flush
+        self._thread = None
+        self._stopping = False
+        self._flush_lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "flushes": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+        }
+
+    @property
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def enqueue(self, doc_id):
+        with self._cond:
+            self.stats["enqueued"] += 1
+            if doc_id in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[doc_id] = self._pending.get(doc_id, 0) + 1
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name="activation-writer", daemon=True)
+                self._thread.start()
+
+    def metrics(self):
+        with self._cond:
+            return dict(self.stats, queue_depth=len(self._pending))
+
+    def flush(self):
+        """Write everything pending now; return the number of documents written."""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        with self._flush_lock:
+            start = self._clock()
+            written = self._write(pending)
+            elapsed = self._clock() - start
+        with self._cond:
+            self.stats["flushes"] += 1
+            self.stats["last_flush_seconds"] = elapsed
+            self.stats["max_flush_seconds"] = max(self.stats["max_flush_seconds"], elapsed)
+        return written
+
+    def stop(self, flush=True):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=self.window + 5)
+        if flush:
+            self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait(timeout=self.window)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception as e:
+                print("Error flushing activations:", e, file=sys.stderr)
+            if stopping:
+                return
+
+    def _write(self, pending):
+        db = self._db_factory()
+        col = db.collection(self._collection)
+        from firebase_admin import firestore  # deferred: slow to import, see server.init_firebase
+
+        def payload(doc_id):
+            return {"activated": True, "activations": firestore.Increment(pending[doc_id]),
+                    "updatedAt": firestore.SERVER_TIMESTAMP}
+
+        doc_ids = list(pending)
+        written = 0
+        for i in range(0, len(doc_ids), self.max_batch):
+            chunk = doc_ids[i:i + self.max_batch]
+            batch = db.batch()
+            for doc_id in chunk:
+                batch.update(col.document(doc_id), payload(doc_id))
+            try:
+                batch.commit()
+                ok = len(chunk)
+                with self._cond:
+                    self.stats["batches"] += 1
+            except Exception as e:
+                # one missing document fails the whole batch; retry the chunk one by one
+                print(f"Notice: activation batch of {len(chunk)} failed, retrying singly - {e}", file=sys.stderr)
+                ok = 0
+                for doc_id in chunk:
+                    try:
+                        col.document(doc_id).update(payload(doc_id))
+                        ok += 1
+                    except Exception as e:
+                        print("Error activating model", doc_id, e, file=sys.stderr)
+            with self._cond:
+                self.stats["written"] += ok
+                self.stats["failed"] += len(chunk) - ok
+            written += ok
+        return written
@@ -0,0 +1,313 @@
+"""ASGI entry point: the routes of server.py served from an event loop.
+
+    uvicorn asgi_app:app --port 5000                    # development
+    gunicorn -c gunicorn_asgi.conf.py asgi_app:app      # production
+
+`/`, `/activate`, `/test` and the `/healthz` and `/readyz` probes run on
+the loop. The catalog is read with firestore.AsyncClient and catalog
+assets are downloaded with httpx (asset_fetch_async.AsyncAssetFetcher), so a slow Firestore read or asset
+origin holds no thread and other requests keep being answered meanwhile.
+Rendering, the page caches and the activation write-behind are server.py's
+own, through the same Flask views, so responses are identical to the
+threaded app. Every other path (static files, /api/models, /api/search) is handed to
+the Flask app on a worker thread, after the catalog is loaded.
+
+The snapshot listener that keeps the catalog fresh stays on the sync
+client: the async client has no `on_snapshot`. Without a listener the
+async reader refreshes the catalog in the background once CATALOG_TTL
+has passed and the stale one is served until it lands.
+
+With CATALOG_MODE=category the catalog is read a category at a time
+through the sync client (category_index.CategoryCatalog); those reads run
+on worker threads, the requested category's before `/` renders.
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import HTTPException
+
+import metrics
+import server
+from catalog_cache import READS_METRIC
+from asset_fetch_async import AsyncAssetFetcher
+
+# worker threads for the Flask fallback (static files, /api/models, /api/search) and blocking store writes
+WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "16"))
+# larger request bodies are refused; the app only takes small JSON posts
+MAX_BODY = 1 << 20
+# bytes of a streamed Flask response forwarded per worker-thread hop
+STREAM_CHUNK = 1 << 18
+LOOP_ROUTES = ("/", "/activate", "/test", "/healthz", "/readyz")
+
+
+class AsyncCatalog:
+    """Fills server.catalog_cache from reads made with the async Firestore client.
+
+    Concurrent first requests share one read. A stale catalog (TTL mode)
+    is served while a background read replaces it.
+    """
+
+    def __init__(self, cache, db_factory, collection="models"):
+        self.cache = cache
+        self._db_factory = db_factory
+        self._collection = collection
+        self._lock = asyncio.Lock()
+        self._background = None
+
+    async def get(self, category=None):
+        grouped, stale = self.cache.peek()
+        if grouped is None:
+            async with self._lock:
+                grouped, _ = self.cache.peek()
+                if grouped is None:
+                    self.cache.claim_refresh()
+                    grouped = await self._read()
+            return grouped
+        if stale and self.cache.claim_refresh():
+            self._background = asyncio.ensure_future(self._read())
+        return grouped
+
+    async def _read(self):
+        try:
+            with metrics.phase("firestore"):
+                db = self._db_factory()
+                docs = [doc async for doc in db.collection(self._collection).stream()]
+        except Exception as e:
+            self.cache.load_failed(e)
+            grouped, _ = self.cache.peek()
+            return grouped if grouped is not None else {}
+        # resolving submits downloads and may start the (blocking) listener
+        await asyncio.to_thread(self.cache.load, docs, getattr(db, "reads_metric", READS_METRIC))
+        grouped, _ = self.cache.peek()
+        return grouped
+
+
+class ThreadCatalog:
+    """Reads a category-mode catalog (blocking, per category) off the loop."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    async def get(self, category=None):
+        """The catalog view, with the category `/` would show for `?category=` already read."""
+        view = await asyncio.to_thread(self.cache.get)
+        await asyncio.to_thread(lambda: view.get(server.pick_category(view, category)))
+        return view
+
+
+class App:
+    """The ASGI application; `app` below is the instance servers load."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.catalog = None
+        self.fetcher = None
+        self._started = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.startup()
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        """Switch server.py's asset downloads to this loop and start the warmup; runs once, on the
+        first request if the server has no lifespan support."""
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._startup())
+        await asyncio.shield(self._started)
+
+    async def _startup(self):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="asgi-wsgi"))
+        self.fetcher = AsyncAssetFetcher(server.asset_store, loop,
+                                         max_connections=int(os.environ.get("ASSET_FETCH_WORKERS", "8")) * 4)
+        threaded, server.asset_prefetcher = server.asset_prefetcher, self.fetcher
+        threaded.shutdown(wait=False)
+        if server.CATALOG_MODE == "category":
+            self.catalog = ThreadCatalog(server.catalog_cache)
+        else:
+            self.catalog = AsyncCatalog(server.catalog_cache, server.catalog_async_db)
+        # catalog and assets load in the background; /readyz reports when they are in
+        server.start_warmup(lambda: asyncio.run_coroutine_threadsafe(self.catalog.get(), loop).result())
+
+    async def shutdown(self):
+        """Drain on SIGTERM: write pending activations, stop the listener and the downloads, save the manifest."""
+        if self._started is None:
+            return
+        await asyncio.to_thread(server.activation_writer.stop)
+        server.catalog_cache.close()
+        await self.fetcher.aclose()
+        await asyncio.to_thread(server.asset_store.flush)
+        print("Shut down: activations and asset manifest flushed, catalog listener closed", file=sys.stderr)
+
+    async def http(self, scope, receive, send):
+        start = time.perf_counter()
+        body = await read_body(receive)
+        if body is None:
+            await send_response(send, 413, [("Content-Type", "text/plain")], b"Request body too large")
+            return
+        environ = wsgi_environ(scope, body)
+        environ["learn.request_start"] = start
+        path = scope["path"]
+        if path in LOOP_ROUTES:
+            status, headers, chunks = await self.on_loop(path, environ)
+            await send_response(send, status, headers, b"".join(chunks))
+        else:
+            if path.startswith("/api/"):
+                await self.catalog.get()
+            await self.in_thread(environ, send)
+
+    async def on_loop(self, path, environ):
+        """Dispatch one of LOOP_ROUTES to its Flask view on the loop; only an uncached page render leaves it."""
+        index = path == "/" and environ["REQUEST_METHOD"] in ("GET", "HEAD")
+        if index:
+            metrics.start_request(environ["learn.request_start"])
+            category = parse_qs(environ["QUERY_STRING"]).get("category", [None])[0]
+            with metrics.phase("catalog"):
+                models_by_category = await self.catalog.get(category)
+            generation = server.catalog_cache.generation
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                if index:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        key, page_generation, render = server.index_page(models_by_category, generation)
+                        page = server.page_cache.peek(key, page_generation)
+                        if page is None:
+                            # a render takes milliseconds: keep it off the loop
+                            page = await asyncio.to_thread(server.page_cache.get, key, page_generation, render)
+                        rv = server.page_response(*page)
+                    resp = app.finalize_request(rv)
+                else:
+                    resp = app.full_dispatch_request()
+            except HTTPException as e:
+                resp = e.get_response(environ)
+            except Exception as e:
+                resp = app.handle_exception(e)
+            app_iter, status, headers = resp.get_wsgi_response(environ)
+            return int(status.split(" ", 1)[0]), headers, list(app_iter)
+
+    async def in_thread(self, environ, send):
+        """Run the Flask app on a worker thread and stream its body back."""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = headers
+            return lambda data: None
+
+        app_iter = await asyncio.to_thread(self.flask_app, environ, start_response)
+        try:
+            chunks = iter(app_iter)
+            chunk = await asyncio.to_thread(take, chunks)
+            await send({"type": "http.response.start", "status": started["status"],
+                        "headers": encode_headers(started["headers"])})
+            while chunk is not None:
+                following = await asyncio.to_thread(take, chunks)
+                await send({"type": "http.response.body", "body": chunk, "more_body": following is not None})
+                chunk = following
+        finally:
+            close = getattr(app_iter, "close", None)
+            if close is not None:
+                await asyncio.to_thread(close)
+
+
+async def read_body(receive):
+    """The full request body, or None when it is larger than MAX_BODY."""
+    parts = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            return None
+        parts.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(parts)
+
+
+def take(chunks, size=STREAM_CHUNK):
+    """Join body chunks from a WSGI iterator up to `size` bytes; None once it is exhausted."""
+    parts = []
+    total = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        total += len(chunk)
+        if total >= size:
+            break
+    if not parts:
+        return None
+    return b"".join(parts)
+
+
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI http scope (PEP 3333 strings: latin-1 decoded bytes)."""
+    server_addr = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server_addr[0]),
+        "SERVER_PORT": str(server_addr[1] or 80),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = "HTTP_" + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def encode_headers(headers):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+async def send_response(send, status, headers, body):
+    await send({"type": "http.response.start", "status": status, "headers": encode_headers(headers)})
+    await send({"type": "http.response.body", "body": body})
+
+
+app = App(server.app)
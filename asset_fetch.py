@@ -0,0 +1,196 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class FetchResult:
+    """Outcome of one asset download."""
+
+    __slots__ = ("url", "dest_path", "local", "ok", "error", "status", "attempts",
+                 "bytes", "elapsed", "context")
+
+    def __init__(self, url, dest_path, ok, local=None, error=None, status=None, attempts=0,
+                 nbytes=0, elapsed=0.0, context=None):
+        self.url = url
+        self.dest_path = dest_path
+        self.local = local
+        self.ok = ok
+        self.error = error
+        self.status = status
+        self.attempts = attempts
+        self.bytes = nbytes
+        self.elapsed = elapsed
+        self.context = context or {}
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "dest_path": self.dest_path,
+            "local": self.local,
+            "ok": self.ok,
+            "error": self.error,
+            "status": self.status,
+            "attempts": self.attempts,
+            "bytes": self.bytes,
+            "elapsed": round(self.elapsed, 4),
+            **self.context,
+        }
+
+
+class AssetPrefetcher:
+    """Bounded thread pool that downloads catalog assets into an AssetStore.
+
+    All downloads share one pooled `requests.Session`. Requests for a URL that
+    is already in flight get the same future back, at most `per_host`
+    downloads run against one host at a time, and connection errors, timeouts
+    and 408/429/5xx responses are retried with exponential backoff.
+    """
+
+    def __init__(self, store, max_workers=8, per_host=4, retries=3, backoff=0.5,
+                 timeout=(5, 30), session=None):
+        self.store = store
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or self._make_session(max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="asset-fetch")
+        self._lock = threading.Lock()
+        self._inflight = {}  # url -> Future
+        self._host_slots = {}  # host -> BoundedSemaphore
+        self._results = {}  # url -> last FetchResult
+
+    @staticmethod
+    def _make_session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def submit(self, url, context=None):
+        """Schedule a download (or revalidation) of `url` into the store.
+
+        Returns a Future resolving to a FetchResult. URLs whose store record
+        is still fresh resolve immediately without touching the network.
+        """
+        rec = self.store.fresh_record(url)
+        if rec is not None:
+            fut = Future()
+            fut.set_result(self._stored_result(url, rec, context=context))
+            return fut
+        with self._lock:
+            fut = self._inflight.get(url)
+            if fut is not None:
+                return fut
+            fut = self._executor.submit(self._fetch, url, context)
+            self._inflight[url] = fut
+        fut.add_done_callback(lambda f, u=url: self._done(u, f))
+        return fut
+
+    def wait(self, futures, timeout=None):
+        """Wait up to `timeout` seconds; return (done, not_done) sets."""
+        futures = [f for f in futures if f is not None]
+        if not futures:
+            return set(), set()
+        return wait(futures, timeout=timeout)
+
+    def report(self):
+        """Structured summary of finished downloads and what is still pending."""
+        with self._lock:
+            results = list(self._results.values())
+            pending = len(self._inflight)
+        failed = [r.to_dict() for r in results if not r.ok]
+        return {
+            "ok": sum(1 for r in results if r.ok),
+            "failed": failed,
+            "pending": pending,
+            "bytes": sum(r.bytes for r in results),
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        self.session.close()
+
+    def _done(self, url, fut):
+        if fut.cancelled():  # shut down before it ran: nothing to report
+            with self._lock:
+                self._inflight.pop(url, None)
+            return
+        try:
+            result = fut.result()
+        except Exception as e:  # _fetch never raises, but keep the map consistent
+            result = FetchResult(url, None, False, error=str(e))
+        with self._lock:
+            self._inflight.pop(url, None)
+            self._results[url] = result
+        kind = result.context.get("kind", "asset")
+        metrics.inc("asset_downloads_total", kind=kind, result="ok" if result.ok else "failed")
+        metrics.inc("asset_download_bytes_total", result.bytes, kind=kind)
+        if not result.ok:
+            level = "Notice" if result.context.get("kind") == "audio" else "Warning"
+            print(f"{level}: failed to download {result.context.get('kind', 'asset')} "
+                  f"(id={result.context.get('id')}) {url} after {result.attempts} attempt(s) - {result.error}",
+                  file=sys.stderr)
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+        return slot
+
+    def _stored_result(self, url, rec, **kwargs):
+        return FetchResult(url, os.path.join(self.store.root, rec["path"]), True,
+                           local=rec["local"], **kwargs)
+
+    def _fetch(self, url, context):
+        start = time.perf_counter()
+        attempts = 0
+        error = None
+        status = None
+        while attempts <= self.retries:
+            if attempts:
+                time.sleep(self.backoff * (2 ** (attempts - 1)))
+            attempts += 1
+            try:
+                # one download per url across worker processes; the others find it stored
+                with self.store.download_lock(url):
+                    rec = self.store.fresh_record(url)
+                    if rec is not None:
+                        return self._stored_result(url, rec, attempts=attempts,
+                                                   elapsed=time.perf_counter() - start, context=context)
+                    with self._host_slot(url):
+                        rec, nbytes, status = self.store.fetch(url, self.session, self.timeout)
+                return self._stored_result(url, rec, status=status, attempts=attempts, nbytes=nbytes,
+                                           elapsed=time.perf_counter() - start, context=context)
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                error = str(e)
+                if status not in RETRY_STATUS:
+                    break
+            except (requests.ConnectionError, requests.Timeout, IOError) as e:
+                error = str(e)
+            except Exception as e:
+                error = str(e)
+                break
+        # a failed revalidation still leaves the last good copy usable
+        rec = self.store.lookup(url)
+        if rec is not None:
+            return self._stored_result(url, rec, error=error, status=status, attempts=attempts,
+                                       elapsed=time.perf_counter() - start, context=context)
+        return FetchResult(url, None, False, error=error, status=status, attempts=attempts,
+                           elapsed=time.perf_counter() - start, context=context)
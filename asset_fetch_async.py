@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, wait
+from urllib.parse import urlparse
+
+import httpx
+
+from asset_fetch import RETRY_STATUS, AssetPrefetcher, FetchResult
+
+
+class AsyncAssetFetcher(AssetPrefetcher):
+    """AssetPrefetcher whose downloads run on an event loop with httpx.
+
+    Same surface as AssetPrefetcher, so server.py's resolve code can use
+    either one: `submit` is thread-safe and returns a concurrent Future
+    (in-flight URLs share one), `report` and the failure notices are
+    inherited. The downloads themselves are coroutines on `loop`, sharing
+    one pooled `httpx.AsyncClient`, so waiting on a slow origin holds no
+    thread. Use `wait_async` from coroutines; `wait` blocks and is only for
+    callers on other threads.
+    """
+
+    def __init__(self, store, loop, max_connections=32, per_host=4, retries=3, backoff=0.5,
+                 timeout=httpx.Timeout(30, connect=5), client=None):
+        self.store = store
+        self.loop = loop
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+        self._lock = threading.Lock()
+        self._inflight = {}  # url -> Future
+        self._host_slots = {}  # host -> asyncio.Semaphore, only touched on the loop
+        self._results = {}  # url -> last FetchResult
+
+    def submit(self, url, context=None):
+        """Schedule a download (or revalidation) of `url` into the store; see AssetPrefetcher.submit."""
+        rec = self.store.fresh_record(url)
+        if rec is not None:
+            fut = Future()
+            fut.set_result(self._stored_result(url, rec, context=context))
+            return fut
+        with self._lock:
+            fut = self._inflight.get(url)
+            if fut is not None:
+                return fut
+            fut = asyncio.run_coroutine_threadsafe(self._fetch(url, context), self.loop)
+            self._inflight[url] = fut
+        fut.add_done_callback(lambda f, u=url: self._done(u, f))
+        return fut
+
+    def wait(self, futures, timeout=None):
+        """Wait up to `timeout` seconds; return (done, not_done) sets. Never call this on the loop."""
+        futures = [f for f in futures if f is not None]
+        if not futures:
+            return set(), set()
+        return wait(futures, timeout=timeout)
+
+    async def wait_async(self, futures, timeout=None):
+        """`wait` for coroutines: returns (done, not_done) sets of the given futures."""
+        futures = [f for f in futures if f is not None]
+        if not futures:
+            return set(), set()
+        wrapped = {asyncio.wrap_future(f): f for f in futures}
+        done, not_done = await asyncio.wait(wrapped, timeout=timeout)
+        return {wrapped[f] for f in done}, {wrapped[f] for f in not_done}
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pending = list(self._inflight.values())
+        for fut in pending:
+            fut.cancel()
+
+    async def aclose(self):
+        self.shutdown(wait=False)
+        await self.client.aclose()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    @staticmethod
+    async def _acquire(lock, poll=0.05):
+        """Enter a store download lock without blocking the loop (polls a cross-process lock)."""
+        acquire = getattr(lock, "acquire", None)
+        if acquire is None:
+            lock.__enter__()
+            return
+        deadline = time.monotonic() + (lock.timeout or 0)
+        while not acquire(timeout=0) and time.monotonic() < deadline:
+            await asyncio.sleep(poll)
+
+    async def _download(self, url):
+        rec = self.store.lookup(url)
+        headers = self.store.revalidation_headers(rec)
+        async with self.client.stream("GET", url, headers=headers) as resp:
+            if resp.status_code == 304 and rec is not None:
+                return await asyncio.to_thread(self.store.mark_checked, url, rec), 0, 304
+            resp.raise_for_status()
+            download = self.store.begin_download()
+            try:
+                async for chunk in resp.aiter_bytes(65536):
+                    download.write(chunk)
+                await asyncio.to_thread(download.finish)
+            except BaseException:
+                download.discard()
+                raise
+        rec = await asyncio.to_thread(self.store.commit_download, url, download, resp.headers)
+        return rec, rec["size"], resp.status_code
+
+    async def _fetch(self, url, context):
+        start = time.perf_counter()
+        attempts = 0
+        error = None
+        status = None
+        while attempts <= self.retries:
+            if attempts:
+                await asyncio.sleep(self.backoff * (2 ** (attempts - 1)))
+            attempts += 1
+            try:
+                lock = self.store.download_lock(url)
+                await self._acquire(lock)
+                try:
+                    rec = self.store.fresh_record(url)
+                    if rec is not None:  # another worker process fetched it meanwhile
+                        return self._stored_result(url, rec, attempts=attempts,
+                                                   elapsed=time.perf_counter() - start, context=context)
+                    async with self._host_slot(url):
+                        rec, nbytes, status = await self._download(url)
+                finally:
+                    lock.__exit__(None, None, None)
+                return self._stored_result(url, rec, status=status, attempts=attempts, nbytes=nbytes,
+                                           elapsed=time.perf_counter() - start, context=context)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                error = str(e)
+                if status not in RETRY_STATUS:
+                    break
+            except (httpx.TransportError, IOError) as e:
+                error = str(e) or type(e).__name__
+            except Exception as e:
+                error = str(e)
+                break
+        # a failed revalidation still leaves the last good copy usable
+        rec = self.store.lookup(url)
+        if rec is not None:
+            return self._stored_result(url, rec, error=error, status=status, attempts=attempts,
+                                       elapsed=time.perf_counter() - start, context=context)
+        return FetchResult(url, None, False, error=error, status=status, attempts=attempts,
+                           elapsed=time.perf_counter() - start, context=context)
@@ -0,0 +1,346 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse, unquote
+
+
+class AssetStore:
+    """Content-addressed local store for downloaded catalog assets.
+
+    Files live under `root` as `<sha256[:2]>/<sha256><ext>` and are served
+    from `url_prefix`, so a served path changes whenever the bytes do. The
+    manifest maps each remote URL to its sha256, size, ETag/Last-Modified and
+    local path. Downloads are streamed to a temp file, hashed, then renamed
+    into place, and known URLs are revalidated with conditional GETs once
+    their record is older than `revalidate_after` seconds.
+
+    With `shared` (a shared_cache.SharedCache) the manifest is the one in
+    the shared database instead of the JSON file, so every worker process
+    on the host sees the others' downloads, and `download_lock(url)` keeps
+    two processes from fetching the same URL at once.
+
+    `read_only` is for offline tools looking up a running server's store:
+    the manifest is only read, the temp folder with its in-progress
+    downloads is left alone, and recording a download raises.
+
+    The JSON manifest is rewritten at most once per `save_delay` seconds,
+    outside the lock lookups take, so a cold fetch of n assets is not n
+    full rewrites; call `flush()` at shutdown to write the last batch.
+    """
+
+    def __init__(self, root, manifest_path, url_prefix="/static/cas", revalidate_after=3600, shared=None,
+                 read_only=False, save_delay=1.0):
+        self.root = root
+        self.manifest_path = manifest_path
+        self.url_prefix = url_prefix.rstrip("/")
+        self.revalidate_after = revalidate_after
+        self.shared = shared
+        self.read_only = read_only
+        self.save_delay = save_delay
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # keeps a newer snapshot from being overwritten by an older one
+        self._save_timer = None
+        self._dirty = False
+        self._tmp_dir = os.path.join(root, ".tmp")
+        if read_only:
+            # broken records are still skipped: lookup() checks the file of every record it returns
+            self._records = shared.assets() if shared is not None else self._load_manifest()
+            return
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+        # temp files left behind by a crash are never valid; other workers' live ones are young
+        stale_before = time.time() - 3600 if shared is not None else None
+        for name in os.listdir(self._tmp_dir):
+            try:
+                path = os.path.join(self._tmp_dir, name)
+                if stale_before is None or os.path.getmtime(path) < stale_before:
+                    os.remove(path)
+            except OSError:
+                pass
+        if shared is not None:
+            imported = shared.import_assets(self._load_manifest())
+            if imported:
+                print(f"Imported {imported} asset record(s) into the shared cache", file=sys.stderr)
+            self._records = shared.assets()
+        else:
+            self._records = self._load_manifest()
+        self._drop_broken(deep=False)
+
+    def lookup(self, url):
+        """Manifest record for `url`, or None if it is unknown or its file is gone."""
+        with self._lock:
+            rec = self._records.get(url)
+        if rec is None and self.shared is not None:
+            rec = self._from_shared(url)
+        if rec is None or not self._intact(rec, deep=False):
+            return None
+        return rec
+
+    def local_url(self, url):
+        rec = self.lookup(url)
+        return rec["local"] if rec else None
+
+    def fresh_record(self, url):
+        """The record for `url` if it is intact and was checked within `revalidate_after`, else None."""
+        rec = self.lookup(url)
+        if rec is not None and time.time() - rec.get("checked_at", 0) >= self.revalidate_after \
+                and self.shared is not None:
+            # another worker may have revalidated it since
+            rec = self._from_shared(url) or rec
+        if rec is None or time.time() - rec.get("checked_at", 0) >= self.revalidate_after:
+            return None
+        return rec
+
+    def is_fresh(self, url):
+        return self.fresh_record(url) is not None
+
+    def download_lock(self, url):
+        """Context manager held around a download of `url`: a cross-process lock when shared."""
+        if self.shared is None:
+            return contextlib.nullcontext()
+        return self.shared.download_lock(url)
+
+    def fetch(self, url, session, timeout=(5, 30)):
+        """Download or revalidate `url`; return (record, bytes_transferred, status).
+
+        HTTP errors are raised (via `raise_for_status`) so callers can decide
+        whether to retry.
+        """
+        rec = self.lookup(url)
+        with session.get(url, stream=True, timeout=timeout, headers=self.revalidation_headers(rec)) as resp:
+            if resp.status_code == 304 and rec is not None:
+                return self.mark_checked(url, rec), 0, 304
+            resp.raise_for_status()
+            download = self.begin_download()
+            try:
+                for chunk in resp.iter_content(chunk_size=65536):
+                    download.write(chunk)
+                download.finish()
+            except BaseException:
+                download.discard()
+                raise
+        rec = self.commit_download(url, download, resp.headers)
+        return rec, rec["size"], resp.status_code
+
+    @staticmethod
+    def revalidation_headers(rec):
+        """Conditional GET headers for a known record (None for an unknown url)."""
+        headers = {}
+        if rec is not None:
+            if rec.get("etag"):
+                headers["If-None-Match"] = rec["etag"]
+            if rec.get("last_modified"):
+                headers["If-Modified-Since"] = rec["last_modified"]
+        return headers
+
+    def mark_checked(self, url, rec):
+        """Record a 304 for `url`; returns the refreshed record."""
+        rec = dict(rec, checked_at=time.time())
+        self._put(url, rec)
+        return rec
+
+    def begin_download(self):
+        """Temp file in the store that hashes what is written to it; see `commit_download`."""
+        self._writable()
+        return Download(self._tmp_dir)
+
+    def commit_download(self, url, download, headers):
+        """Move a finished download into place and record it; returns the record.
+
+        `headers` are the response headers, used for the validators and to
+        reject truncated bodies.
+        """
+        size = download.size
+        expected = headers.get("Content-Length")
+        if expected is not None and "Content-Encoding" not in headers and int(expected) != size:
+            download.discard()
+            raise IOError(f"truncated download: got {size} of {expected} bytes")
+
+        ext = os.path.splitext(unquote(urlparse(url).path))[1].lower()
+        rel_path = f"{download.sha256[:2]}/{download.sha256}{ext}"
+        dest = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if os.path.exists(dest) and os.path.getsize(dest) == size:
+            download.discard()
+        else:
+            os.replace(download.path, dest)
+
+        rec = {
+            "url": url,
+            "sha256": download.sha256,
+            "size": size,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "path": rel_path,
+            "local": f"{self.url_prefix}/{rel_path}",
+            "checked_at": time.time(),
+        }
+        self._put(url, rec)
+        return rec
+
+    def verify(self, deep=True):
+        """Re-check every record (rehashing when `deep`); return the dropped URLs."""
+        return self._drop_broken(deep=deep)
+
+    def prune(self):
+        """Delete stored files no manifest record points at; return how many."""
+        live = {rec["path"] for rec in self.records().values()}
+        removed = 0
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard.startswith(".") or not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if f"{shard}/{name}" not in live:
+                    os.remove(os.path.join(shard_dir, name))
+                    removed += 1
+            if not os.listdir(shard_dir):
+                shutil.rmtree(shard_dir, ignore_errors=True)
+        return removed
+
+    def records(self):
+        if self.shared is not None:
+            records = self.shared.assets()
+            with self._lock:
+                self._records.update(records)
+            return records
+        with self._lock:
+            return dict(self._records)
+
+    def _intact(self, rec, deep):
+        path = os.path.join(self.root, rec["path"])
+        try:
+            if os.path.getsize(path) != rec["size"]:
+                return False
+        except OSError:
+            return False
+        if not deep:
+            return True
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest() == rec["sha256"]
+
+    def _writable(self):
+        if self.read_only:
+            raise RuntimeError(f"asset store {self.manifest_path} was opened read-only")
+
+    def _drop_broken(self, deep):
+        self._writable()
+        with self._lock:
+            items = list(self._records.items())
+        dropped = [url for url, rec in items if not self._intact(rec, deep)]
+        if dropped:
+            with self._lock:
+                for url in dropped:
+                    self._records.pop(url, None)
+            if self.shared is None:
+                self._schedule_save()
+            else:
+                self.shared.drop_assets(dropped)
+            print(f"Notice: dropped {len(dropped)} broken asset store record(s)", file=sys.stderr)
+        return dropped
+
+    def _put(self, url, rec):
+        self._writable()
+        if self.shared is not None:
+            self.shared.put_asset(url, rec)
+            with self._lock:
+                self._records[url] = rec
+            return
+        with self._lock:
+            self._records[url] = rec
+        self._schedule_save()
+
+    def flush(self):
+        """Write pending manifest changes now (the JSON manifest only)."""
+        with self._save_lock:
+            with self._lock:
+                timer, self._save_timer = self._save_timer, None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                records = dict(self._records)
+            if timer is not None:
+                timer.cancel()
+            try:
+                self._save(records)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                print("Error saving the asset manifest:", e, file=sys.stderr)
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _from_shared(self, url):
+        rec = self.shared.asset(url)
+        if rec is not None:
+            with self._lock:
+                self._records[url] = rec
+        return rec
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print("Warning: unreadable asset manifest, starting empty -", e, file=sys.stderr)
+            return {}
+        return data.get("assets", {}) if isinstance(data, dict) else {}
+
+    def _save(self, records):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.manifest_path) or ".", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "assets": records}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class Download:
+    """A download in progress: a temp file plus the running sha256 of its bytes."""
+
+    def __init__(self, tmp_dir):
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.sha256 = None
+
+    def write(self, chunk):
+        if chunk:
+            self._file.write(chunk)
+            self._hash.update(chunk)
+            self.size += len(chunk)
+
+    def finish(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.sha256 = self._hash.hexdigest()
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,355 @@
+"""Offline audio stage: compact Opus/AAC clips and per-category sprites.
+
+Every clip under static/audio (and audio downloaded into static/cas) is
+decoded once with ffmpeg: leading and trailing silence is trimmed,
+loudness is normalized (EBU R128), and the result is downmixed to 48 kHz
+mono PCM. That PCM is encoded to Opus (.ogg) and AAC (.m4a) at the
+target bitrates. With `--sprites`, the clips of each category are
+concatenated, with a short gap, into one sprite per codec, plus an
+offset index, so one request warms a whole category's sounds.
+
+Outputs are named after the source hashes and the encoder settings, so
+only changed clips are re-encoded. Requires ffmpeg on PATH:
+
+    python audio_pipeline.py                    # clips only
+    python audio_pipeline.py --sprites          # + sprites, grouped from the Firestore catalog
+    python audio_pipeline.py --sprites --groups groups.json   # {"animals": ["static/audio/x.mp3", ...]}
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pipeline_manifest import MANIFEST_NAME, ManifestView, file_sha256, read_manifest, write_json_atomic
+
+SOURCE_DIRS = ["static/audio", "static/cas"]
+OUT_DIR = "static/audio_opt"
+PCM_CACHE = "cache/audio_pcm"
+PIPELINE_VERSION = 1
+AUDIO_EXTS = {".wav", ".mp3", ".ogg", ".flac", ".m4a", ".aac"}
+
+SAMPLE_RATE = 48000
+SILENCE_THRESHOLD = "-50dB"
+LOUDNESS = "I=-16:TP=-1.5:LRA=11"
+SPRITE_GAP = 0.3  # seconds of silence between sprite clips
+CODECS = {
+    # name: (extension, ffmpeg encoder arguments; {bitrate} is filled in)
+    "opus": (".ogg", ["-c:a", "libopus", "-b:a", "{bitrate}", "-vbr", "on", "-application", "audio"]),
+    "aac": (".m4a", ["-c:a", "aac", "-b:a", "{bitrate}", "-movflags", "+faststart"]),
+}
+BITRATES = {"opus": "32k", "aac": "64k"}
+
+
+class AudioVariants(ManifestView):
+    """Server-side view of the audio manifest: clip and sprite urls per served path and category."""
+
+    def __init__(self, out_dir, url_prefix, check_interval=5.0):
+        super().__init__(out_dir, url_prefix, check_interval)
+        self._clips = {}
+        self._sprites = {}
+
+    def _load(self):
+        manifest = load_manifest(self.out_dir)
+        self._clips = {"/" + key: dict(self._urls(rec["files"]), duration=rec["duration"])
+                       for key, rec in manifest.get("clips", {}).items()}
+        self._sprites = {category: (self._urls(rec["files"]), {"/" + key: v for key, v in rec["clips"].items()})
+                         for category, rec in manifest.get("sprites", {}).items()}
+
+    def clip(self, local):
+        """{"opus": url, "aac": url, "duration": seconds} for a served audio path, or None."""
+        return self._clips.get(local) if local else None
+
+    def sprite(self, category):
+        """{"opus": url, "aac": url} of the category's sprite, or None."""
+        sprite = self._sprites.get(category)
+        return sprite[0] if sprite else None
+
+    def sprite_offset(self, category, local):
+        """[start, duration] in seconds of a clip inside the category's sprite, or None."""
+        sprite = self._sprites.get(category)
+        return sprite[1].get(local) if sprite and local else None
+
+    def _urls(self, files):
+        return {codec: f"{self.url_prefix}/{name}" for codec, name in files.items()}
+
+
+def settings_key(bitrates):
+    raw = json.dumps([PIPELINE_VERSION, SAMPLE_RATE, SILENCE_THRESHOLD, LOUDNESS, SPRITE_GAP,
+                      sorted(bitrates.items())])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _ffmpeg(ffmpeg, args):
+    subprocess.run([ffmpeg, "-nostdin", "-y", "-loglevel", "error"] + args, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def normalize_to_pcm(ffmpeg, src, dest):
+    """Trim silence at both ends, normalize loudness, and write 48 kHz mono 16-bit WAV."""
+    trim = f"silenceremove=start_periods=1:start_threshold={SILENCE_THRESHOLD}"
+    filters = f"{trim},areverse,{trim},areverse,loudnorm={LOUDNESS}"
+    tmp = dest + ".tmp.wav"
+    _ffmpeg(ffmpeg, ["-i", src, "-af", filters, "-ac", "1", "-ar", str(SAMPLE_RATE),
+                     "-c:a", "pcm_s16le", "-f", "wav", tmp])
+    os.replace(tmp, dest)
+
+
+def encode(ffmpeg, pcm_path, codec, bitrate, dest):
+    ext, args = CODECS[codec]
+    tmp = dest + ".tmp" + ext
+    _ffmpeg(ffmpeg, ["-i", pcm_path] + [a.replace("{bitrate}", bitrate) for a in args] + [tmp])
+    os.replace(tmp, dest)
+
+
+def wav_frames(path):
+    with wave.open(path, "rb") as w:
+        return w.getnframes()
+
+
+def load_manifest(out_dir):
+    return read_manifest(out_dir, PIPELINE_VERSION)
+
+
+class AudioPipeline:
+    def __init__(self, out_dir=OUT_DIR, pcm_cache=PCM_CACHE, bitrates=None, ffmpeg="ffmpeg", workers=None):
+        self.out_dir = out_dir
+        self.pcm_cache = pcm_cache
+        self.bitrates = dict(BITRATES, **(bitrates or {}))
+        self.ffmpeg = ffmpeg
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.settings = settings_key(self.bitrates)
+        os.makedirs(out_dir, exist_ok=True)
+        os.makedirs(pcm_cache, exist_ok=True)
+
+    def clip_name(self, sha):
+        return hashlib.sha256((sha + self.settings).encode("ascii")).hexdigest()[:16]
+
+    def _encode_all(self, name, pcm):
+        files = {}
+        for codec, (ext, _) in CODECS.items():
+            dest = os.path.join(self.out_dir, name + ext)
+            if not os.path.exists(dest):
+                encode(self.ffmpeg, pcm, codec, self.bitrates[codec], dest)
+            files[codec] = name + ext
+        return files
+
+    def _out_bytes(self, files):
+        return {codec: os.path.getsize(os.path.join(self.out_dir, f)) for codec, f in files.items()}
+
+    def build_clip(self, path, sha):
+        """Normalize and encode one source. Runs on a worker thread (ffmpeg does the work)."""
+        start = time.perf_counter()
+        name = self.clip_name(sha)
+        pcm = os.path.join(self.pcm_cache, name + ".wav")
+        if not os.path.exists(pcm):
+            normalize_to_pcm(self.ffmpeg, path, pcm)
+        files = self._encode_all(name, pcm)
+        return {"sha256": sha, "pcm": name + ".wav", "duration": round(wav_frames(pcm) / SAMPLE_RATE, 3),
+                "files": files, "bytes": os.path.getsize(path), "out_bytes": self._out_bytes(files),
+                "seconds": round(time.perf_counter() - start, 3)}
+
+    def build_clips(self, source_dirs):
+        previous = load_manifest(self.out_dir).get("clips", {})
+        clips = {}
+        todo = []
+        for source_dir in source_dirs:
+            if not os.path.isdir(source_dir):
+                continue
+            for root, _, files in os.walk(source_dir):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() not in AUDIO_EXTS:
+                        continue
+                    path = os.path.join(root, name)
+                    key = os.path.relpath(path, ".").replace(os.sep, "/")
+                    sha = file_sha256(path)
+                    prev = previous.get(key)
+                    if prev and prev.get("sha256") == sha and prev["pcm"] == self.clip_name(sha) + ".wav" and \
+                            all(os.path.exists(os.path.join(self.out_dir, f)) for f in prev["files"].values()) and \
+                            os.path.exists(os.path.join(self.pcm_cache, prev["pcm"])):
+                        clips[key] = prev
+                    else:
+                        todo.append((key, path, sha))
+
+        errors = {}
+        if todo:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.build_clip, path, sha): key for key, path, sha in todo}
+                for fut in as_completed(futures):
+                    key = futures[fut]
+                    try:
+                        clips[key] = fut.result()
+                    except subprocess.CalledProcessError as e:
+                        errors[key] = (e.stderr or b"").decode("utf-8", "replace").strip() or str(e)
+                    except Exception as e:
+                        errors[key] = f"{type(e).__name__}: {e}"
+        return clips, errors, len(todo)
+
+    def build_sprite(self, category, keys, clips):
+        """Concatenate the clips' PCM (in `keys` order) and encode one sprite per codec."""
+        keys = [k for k in keys if k in clips]
+        if not keys:
+            return None
+        inputs = [clips[k]["pcm"] for k in keys]
+        h = hashlib.sha256(self.settings.encode("ascii"))
+        for pcm_name in inputs:
+            h.update(b"\0" + pcm_name.encode("ascii"))
+        name = f"{category}-{h.hexdigest()[:16]}"
+        pcm = os.path.join(self.pcm_cache, name + ".wav")
+
+        # offsets from exact frame counts, so rounding never accumulates
+        gap_frames = int(SPRITE_GAP * SAMPLE_RATE)
+        offsets = {}
+        position = 0
+        for key, pcm_name in zip(keys, inputs):
+            frames = wav_frames(os.path.join(self.pcm_cache, pcm_name))
+            offsets[key] = [round(position / SAMPLE_RATE, 3), round(frames / SAMPLE_RATE, 3)]
+            position += frames + gap_frames
+
+        if not os.path.exists(pcm):
+            tmp = pcm + ".tmp"
+            with wave.open(tmp, "wb") as out:
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(SAMPLE_RATE)
+                for i, pcm_name in enumerate(inputs):
+                    if i:
+                        out.writeframes(b"\0\0" * gap_frames)
+                    with wave.open(os.path.join(self.pcm_cache, pcm_name), "rb") as w:
+                        out.writeframes(w.readframes(w.getnframes()))
+            os.replace(tmp, pcm)
+        files = self._encode_all(name, pcm)
+        return {"files": files, "clips": offsets, "pcm": name + ".wav", "inputs": inputs,
+                "out_bytes": self._out_bytes(files)}
+
+    def write(self, clips, sprites):
+        write_json_atomic(os.path.join(self.out_dir, MANIFEST_NAME),
+                          {"version": PIPELINE_VERSION, "bitrates": self.bitrates, "sample_rate": SAMPLE_RATE,
+                           "clips": clips, "sprites": sprites})
+        records = list(clips.values()) + list(sprites.values())
+        live = {f for rec in records for f in rec["files"].values()} | {MANIFEST_NAME}
+        for name in os.listdir(self.out_dir):
+            if name not in live:
+                os.remove(os.path.join(self.out_dir, name))
+        live_pcm = {rec["pcm"] for rec in records}
+        for name in os.listdir(self.pcm_cache):
+            if name not in live_pcm:
+                os.remove(os.path.join(self.pcm_cache, name))
+
+
+def catalog_groups():
+    """{category key: [clip keys]} from the Firestore `models` catalog, in .mind order.
+
+    Categories and audio fields are resolved the way server.py serves
+    them: documents group under category_index.doc_key (their stored
+    categoryKey), downloaded urls map to their file in the asset store,
+    bare filenames to static/audio.
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    from asset_store import AssetStore
+    from category_index import KEY_FIELD, doc_key
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate("serviceaccount.json"))
+    # read-only: the server may be downloading into this store right now
+    store = AssetStore("static/cas", "cache/asset_manifest.json", read_only=True)
+    rows = []
+    fields = ["name", "category", KEY_FIELD, "audio", "targetCard"]
+    for doc in firestore.client().collection("models").select(fields).stream():
+        data = doc.to_dict() or {}
+        audio = data.get("audio") or {}
+        if audio.get("url"):
+            local = store.local_url(audio["url"])
+        elif audio.get("filename"):
+            local = "/static/audio/" + os.path.basename(audio["filename"])
+        else:
+            local = None
+        if not local:
+            continue
+        target = os.path.basename((data.get("targetCard") or {}).get("filename") or "").lower()
+        rows.append((doc_key(data), target or str(data.get("name", "")).lower(), local.lstrip("/")))
+    groups = {}
+    for category, _, key in sorted(rows):
+        if key not in groups.setdefault(category, []):
+            groups[category].append(key)
+    return groups
+
+
+def print_report(clips, sprites, errors, built):
+    print(f"{'clip':44} {'source':>9} {'opus':>8} {'aac':>8} {'secs':>6}")
+    total = {"source": 0, "opus": 0, "aac": 0}
+    for key in sorted(clips):
+        rec = clips[key]
+        out = rec["out_bytes"]
+        print(f"{os.path.basename(key)[:44]:44} {rec['bytes']:>9} {out.get('opus', 0):>8} {out.get('aac', 0):>8} "
+              f"{rec['duration']:>6.1f}")
+        total["source"] += rec["bytes"]
+        total["opus"] += out.get("opus", 0)
+        total["aac"] += out.get("aac", 0)
+    if total["source"]:
+        for codec in ("opus", "aac"):
+            print(f"{codec}: {total['source']} -> {total[codec]} bytes "
+                  f"({1 - total[codec] / total['source']:.0%} saved)")
+    for category, rec in sorted(sprites.items()):
+        out = rec["out_bytes"]
+        print(f"sprite {category}: {len(rec['clips'])} clip(s), opus {out.get('opus', 0)} bytes, "
+              f"aac {out.get('aac', 0)} bytes")
+    for key, error in sorted(errors.items()):
+        print(f"Error transcoding {key}: {error}", file=sys.stderr)
+    print(f"Transcoded {built - len(errors)} clip(s), {len(clips) - (built - len(errors))} unchanged, "
+          f"{len(errors)} failed", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcode catalog audio to compact clips and category sprites.")
+    parser.add_argument("--source", action="append", help="source folder (repeatable)")
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--opus-bitrate", default=BITRATES["opus"])
+    parser.add_argument("--aac-bitrate", default=BITRATES["aac"])
+    parser.add_argument("--sprites", action="store_true", help="also pack each category's clips into a sprite")
+    parser.add_argument("--groups", help="JSON {category: [clip paths]} instead of reading Firestore")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if shutil.which(args.ffmpeg) is None:
+        raise SystemExit(f"ffmpeg not found ({args.ffmpeg}); install it or pass --ffmpeg")
+    pipeline = AudioPipeline(args.out, bitrates={"opus": args.opus_bitrate, "aac": args.aac_bitrate},
+                             ffmpeg=args.ffmpeg, workers=args.workers)
+    clips, errors, built = pipeline.build_clips(args.source or SOURCE_DIRS)
+
+    if args.sprites:
+        if args.groups:
+            with open(args.groups, "r") as f:
+                groups = {c: [os.path.normpath(p).replace(os.sep, "/") for p in paths]
+                          for c, paths in json.load(f).items()}
+        else:
+            groups = catalog_groups()
+        sprites = {}
+        for category, keys in sorted(groups.items()):
+            try:
+                rec = pipeline.build_sprite(category, keys, clips)
+            except Exception as e:
+                print(f"Error building sprite for {category}: {e}", file=sys.stderr)
+                continue
+            if rec:
+                sprites[category] = rec
+    else:
+        # keep previously built sprites whose clips are all unchanged
+        sprites = {c: rec for c, rec in load_manifest(args.out).get("sprites", {}).items()
+                   if [clips[k]["pcm"] if k in clips else None for k in rec["clips"]] == rec["inputs"]}
+
+    pipeline.write(clips, sprites)
+    print_report(clips, sprites, errors, built)
+
+
+if __name__ == "__main__":
+    main()
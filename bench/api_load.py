@@ -0,0 +1,79 @@
+"""Load-test /api/models against the HTML index route.
+
+Fires the same number of requests at `/?category=<c>` and at
+`/api/models?category=<c>&fields=<f>` on a running server and reports
+bytes on the wire and latency percentiles for each:
+
+    python server.py &
+    python bench/api_load.py --base-url http://localhost:5000 --category animals
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+def hit(session, url, encoding):
+    start = time.perf_counter()
+    with session.get(url, headers={"Accept-Encoding": encoding}, stream=True, timeout=30) as resp:
+        wire = resp.raw.read(decode_content=False)
+        status = resp.status_code
+    return time.perf_counter() - start, len(wire), status
+
+
+def run(url, requests_total, concurrency, encoding):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    hit(session, url, encoding)  # warm the server-side caches
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: hit(session, url, encoding), range(requests_total)))
+    wall = time.perf_counter() - start
+    latencies = [r[0] * 1000 for r in results]
+    return {
+        "url": url,
+        "requests": requests_total,
+        "errors": sum(1 for r in results if r[2] >= 400),
+        "bytes_per_response": int(statistics.mean(r[1] for r in results)),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "rps": round(requests_total / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--category", default="animals")
+    parser.add_argument("--fields", default="id,name,src,image.local,audio.local")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--encoding", default="gzip, br")
+    args = parser.parse_args()
+
+    base = args.base_url.rstrip("/")
+    html = run(f"{base}/?category={args.category}", args.requests, args.concurrency, args.encoding)
+    api = run(f"{base}/api/models?category={args.category}&fields={args.fields}",
+              args.requests, args.concurrency, args.encoding)
+    print(json.dumps({
+        "html": html,
+        "api": api,
+        "bytes_ratio": round(api["bytes_per_response"] / max(1, html["bytes_per_response"]), 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
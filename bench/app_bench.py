@@ -0,0 +1,235 @@
+"""End-to-end benchmark of the Flask app against synthetic catalogs, fully offline.
+
+Each catalog size runs in its own process, so RSS figures don't leak
+between sizes. The process imports server.py with Firestore replaced by
+fake_firestore.FakeFirestore, and with assets downloaded from a local
+asset_origin.AssetOrigin into a temporary asset store. It then measures:
+
+    fetch_cold   fetch_all_models_grouped() with an empty asset store
+    fetch_warm   fetch_all_models_grouped() with every asset stored
+    index_cold   GET /, with the catalog and page caches dropped before each request
+    index_warm   GET / with primed caches, spread over categories
+    activate     POST /activate for random models
+
+For each phase it reports p50/p95/p99 latency, throughput, Firestore
+reads per request and RSS. Results are printed (or written with
+--out) as JSON:
+
+    python bench/app_bench.py --sizes 10,1000,10000 --out bench-results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from api_load import percentile  # noqa: E402
+from asset_origin import AssetOrigin  # noqa: E402
+from fake_firestore import FakeFirestore, synthetic_catalog  # noqa: E402
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def summarize(latencies, wall, reads, errors=0):
+    ms = [s * 1000 for s in latencies]
+    n = len(ms)
+    return {
+        "requests": n,
+        "errors": errors,
+        "p50_ms": round(percentile(ms, 50), 3) if n else None,
+        "p95_ms": round(percentile(ms, 95), 3) if n else None,
+        "p99_ms": round(percentile(ms, 99), 3) if n else None,
+        "rps": round(n / wall, 1) if wall else None,
+        "reads_per_request": round(reads / n, 2) if n else None,
+        "rss_mb": rss_mb(),
+    }
+
+
+def timed_phase(db, calls, concurrency=1):
+    """Run `calls` (zero-argument callables returning an HTTP status) and summarize them."""
+    reads_before = db.counters()["reads"]
+
+    def one(call):
+        start = time.perf_counter()
+        status = call()
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, calls))
+    else:
+        results = [one(call) for call in calls]
+    wall = time.perf_counter() - start
+    errors = sum(1 for _, status in results if status >= 400)
+    return summarize([r[0] for r in results], wall, db.counters()["reads"] - reads_before, errors)
+
+
+def run_worker(args):
+    tmp = tempfile.mkdtemp(prefix="app-bench-")
+    os.environ.setdefault("ACTIVATE_FLUSH_WINDOW", "0.5")
+    # every phase reads the fake Firestore; no snapshot of the synthetic catalog in cache/
+    os.environ["CATALOG_SNAPSHOT_POLICY"] = "off"
+    # and no categoryKey backfill writing back into it mid-phase
+    os.environ["CATEGORY_INDEX"] = "off"
+    try:
+        import firebase_admin.firestore
+        import server
+        from asset_fetch import AssetPrefetcher
+        from asset_store import AssetStore
+        from mind_compiler import MindCompiler
+
+        db = FakeFirestore({"models": synthetic_catalog(args.worker, args.origin,
+                                                         distinct_assets=args.distinct_assets)},
+                           latency=args.firestore_latency)
+        firebase_admin.firestore.client = lambda *a, **kw: db
+        server.init_firebase = lambda: None
+        server.asset_store = AssetStore(os.path.join(tmp, "cas"), os.path.join(tmp, "asset_manifest.json"))
+        server.asset_prefetcher = AssetPrefetcher(server.asset_store)
+
+        def compile_mind(paths, output):
+            with open(output, "wb") as f:
+                f.write(b"\0" * len(paths))
+        server.mind_compiler = MindCompiler(tmp, os.path.join(tmp, "mind"), "/static/mind", compile_fn=compile_mind)
+        server.mind_compiler.on_compiled = lambda category: server.catalog_cache.touch()
+
+        local = threading.local()
+
+        def client():
+            c = getattr(local, "client", None)
+            if c is None:
+                c = local.client = server.app.test_client()
+            return c
+
+        def get(path):
+            return lambda: client().get(path).status_code
+
+        def post_activate(doc_id):
+            return lambda: client().post("/activate", json={"id": doc_id}).status_code
+
+        def fetch_all():
+            server.fetch_all_models_grouped()
+            return 200
+
+        result = {"models": args.worker, "rss_mb_start": rss_mb(), "phases": {}}
+        phases = result["phases"]
+        phases["fetch_cold"] = timed_phase(db, [fetch_all])
+        phases["fetch_warm"] = timed_phase(db, [fetch_all] * args.fetch_repeats)
+
+        categories = sorted(server.catalog_cache.get().keys()) or ["uncategorized"]
+        paths = [f"/?category={categories[i % len(categories)]}" for i in range(args.requests)]
+
+        def cold(path):
+            def call():
+                server.catalog_cache.invalidate()
+                server.payload_cache.clear()
+                server.page_cache.clear()
+                return client().get(path).status_code
+            return call
+        phases["index_cold"] = timed_phase(db, [cold(p) for p in paths[:args.cold_requests]])
+
+        for category in categories:
+            client().get(f"/?category={category}")
+        phases["index_warm"] = timed_phase(db, [get(p) for p in paths], args.concurrency)
+
+        rng = random.Random(0)
+        ids = [f"m{rng.randrange(args.worker):06d}" for _ in range(args.requests)]
+        writes_before = db.counters()["writes"]
+        phases["activate"] = timed_phase(db, [post_activate(i) for i in ids], args.concurrency)
+        server.activation_writer.flush()
+        phases["activate"]["firestore_writes"] = db.counters()["writes"] - writes_before
+        phases["activate"]["firestore_commits"] = server.activation_writer.metrics().get("batches")
+
+        result["firestore"] = db.counters()
+        result["catalog_cache"] = dict(server.catalog_cache.stats)
+        result["rss_mb_end"] = rss_mb()
+        result["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+        server.activation_writer.stop()
+        server.asset_prefetcher.shutdown(wait=False)
+        return result
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,10000", help="comma-separated catalog sizes")
+    parser.add_argument("--requests", type=int, default=200, help="requests per warm phase")
+    parser.add_argument("--cold-requests", type=int, default=10)
+    parser.add_argument("--fetch-repeats", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--distinct-assets", type=int, default=200,
+                        help="distinct asset urls per kind shared by the catalog")
+    parser.add_argument("--origin-latency", type=float, default=0.005, help="seconds per asset response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of asset responses that fail")
+    parser.add_argument("--firestore-latency", type=float, default=0.0, help="seconds per Firestore RPC")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--origin", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        json.dump(run_worker(args), sys.stdout)
+        return
+
+    origin = AssetOrigin(latency=args.origin_latency, fail_rate=args.fail_rate)
+    origin_url = origin.start()
+    runs = []
+    try:
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            cmd = [sys.executable, os.path.abspath(__file__), "--worker", str(size), "--origin", origin_url,
+                   "--requests", str(args.requests), "--cold-requests", str(args.cold_requests),
+                   "--fetch-repeats", str(args.fetch_repeats), "--concurrency", str(args.concurrency),
+                   "--distinct-assets", str(args.distinct_assets),
+                   "--firestore-latency", str(args.firestore_latency)]
+            print(f"Benchmarking {size} model(s)...", file=sys.stderr)
+            proc = subprocess.run(cmd, cwd=REPO_ROOT, stdout=subprocess.PIPE,
+                                  stderr=None if args.verbose else subprocess.PIPE, text=True)
+            if proc.returncode != 0:
+                print(proc.stderr or "", file=sys.stderr)
+                raise SystemExit(f"benchmark worker for {size} models failed")
+            runs.append(json.loads(proc.stdout))
+    finally:
+        origin.stop()
+
+    results = {
+        "benchmark": "app_bench",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("worker", "origin", "out", "verbose")},
+        "origin": origin.stats,
+        "runs": runs,
+    }
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Threaded Flask vs the ASGI app under concurrent load, fully offline.
+
+Both modes run in their own process against the same fake Firestore (with
+`--firestore-latency` per RPC) and local asset origin. The threaded mode
+calls the WSGI app from a pool of `--threads` threads, like a gthread
+worker; the ASGI mode drives asgi_app.app from `--concurrency` tasks on one
+event loop. Phases:
+
+    cold      first requests of a fresh process: catalog read and asset
+              downloads happen while they are waiting; `downloads_settled_s`
+              is how much longer the downloads took after the last response
+    warm      `/` with primed caches
+    activate  POST /activate for random models
+    refresh   listener off and a short CATALOG_TTL, so the catalog is
+              re-read from Firestore over and over during the phase
+    mixed     `/`, `/activate` and `/test` interleaved, still refreshing
+
+Each phase reports p50/p95/p99, requests per second and the peak number
+of threads in the process:
+
+    python bench/asgi_load.py --models 1000 --concurrency 64 --threads 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from api_load import percentile  # noqa: E402
+from asset_origin import AssetOrigin  # noqa: E402
+from fake_firestore import FakeFirestore, synthetic_catalog  # noqa: E402
+
+MODES = ("threaded", "asgi")
+PHASES = ("cold", "warm", "activate", "refresh", "mixed")
+
+
+class PeakThreads:
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def summarize(latencies, statuses, wall, threads):
+    ms = [s * 1000 for s in latencies]
+    n = len(ms)
+    return {
+        "requests": n,
+        "errors": sum(1 for s in statuses if s >= 400),
+        "p50_ms": round(percentile(ms, 50), 3) if n else None,
+        "p95_ms": round(percentile(ms, 95), 3) if n else None,
+        "p99_ms": round(percentile(ms, 99), 3) if n else None,
+        "rps": round(n / wall, 1) if wall else None,
+        "peak_threads": threads,
+    }
+
+
+def plan(phase, n, categories, models, rng):
+    """(method, path, query, body) per request of a phase."""
+    def index():
+        return ("GET", "/", f"category={rng.choice(categories)}", b"")
+
+    def activate():
+        return ("POST", "/activate", "", json.dumps({"id": f"m{rng.randrange(models):06d}"}).encode())
+
+    if phase == "activate":
+        return [activate() for _ in range(n)]
+    if phase == "mixed":
+        kinds = [index, index, activate, lambda: ("GET", "/test", "", b"")]
+        return [rng.choice(kinds)() for _ in range(n)]
+    return [index() for _ in range(n)]
+
+
+def run_threaded(server, requests, threads):
+    from werkzeug.test import EnvironBuilder
+
+    def environ_for(req):
+        method, path, query, body = req
+        return EnvironBuilder(path=path, method=method, query_string=query, data=body or None,
+                              content_type="application/json" if body else None,
+                              base_url="http://bench.local").get_environ()
+
+    def one(environ):
+        status = []
+        start = time.perf_counter()
+        app_iter = server.app(environ, lambda s, h, e=None: status.append(int(s.split()[0])))
+        for _ in app_iter:
+            pass
+        getattr(app_iter, "close", lambda: None)()
+        return time.perf_counter() - start, status[0]
+
+    # built up front, so the client side costs about the same as an ASGI scope
+    environs = [environ_for(req) for req in requests]
+    with PeakThreads() as peak, ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(one, environs))
+        wall = time.perf_counter() - start
+    return summarize([r[0] for r in results], [r[1] for r in results], wall, peak.peak)
+
+
+def run_asgi(loop, app, requests, concurrency):
+    async def one(req, slots):
+        method, path, query, body = req
+        headers = [(b"host", b"bench.local")]
+        if body:
+            headers.append((b"content-type", b"application/json"))
+        scope = {"type": "http", "http_version": "1.1", "method": method, "scheme": "http", "path": path,
+                 "root_path": "", "query_string": query.encode(), "headers": headers,
+                 "server": ("bench.local", 80), "client": ("127.0.0.1", 0)}
+        status = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        async with slots:
+            start = time.perf_counter()
+            await app(scope, receive, send)
+            return time.perf_counter() - start, status[0]
+
+    async def all_requests():
+        slots = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[one(r, slots) for r in requests])
+
+    with PeakThreads() as peak:
+        start = time.perf_counter()
+        results = loop.run_until_complete(all_requests())
+        wall = time.perf_counter() - start
+    return summarize([r[0] for r in results], [r[1] for r in results], wall, peak.peak)
+
+
+def run_worker(args):
+    tmp = tempfile.mkdtemp(prefix="asgi-bench-")
+    os.environ["ACTIVATE_FLUSH_WINDOW"] = "0.5"
+    os.environ["CATALOG_SNAPSHOT_POLICY"] = "off"
+    os.environ["CATEGORY_INDEX"] = "off"
+    try:
+        import firebase_admin.firestore
+        import firebase_admin.firestore_async
+        import server
+        from asset_store import AssetStore
+        from asset_fetch import AssetPrefetcher
+        from mind_compiler import MindCompiler
+
+        db = FakeFirestore({"models": synthetic_catalog(args.models, args.origin,
+                                                         distinct_assets=args.distinct_assets)},
+                           latency=args.firestore_latency)
+        firebase_admin.firestore.client = lambda *a, **kw: db
+        firebase_admin.firestore_async.client = lambda *a, **kw: db.async_client()
+        server.init_firebase = lambda: None
+        server.asset_store = AssetStore(os.path.join(tmp, "cas"), os.path.join(tmp, "asset_manifest.json"))
+        server.asset_prefetcher = AssetPrefetcher(server.asset_store)
+        server.mind_compiler = MindCompiler(tmp, os.path.join(tmp, "mind"), "/static/mind",
+                                            compile_fn=lambda paths, output: open(output, "wb").close())
+
+        rng = random.Random(0)
+        categories = sorted({doc["category"] for doc in db.collection("models")._docs.values()})
+        if args.mode == "asgi":
+            import asgi_app
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(asgi_app.app.startup())
+
+            def run(requests):
+                return run_asgi(loop, asgi_app.app, requests, args.concurrency)
+        else:
+            def run(requests):
+                return run_threaded(server, requests, args.threads)
+
+        phases = {}
+        for phase in PHASES:
+            if phase == "refresh":
+                # no listener, a short TTL: the catalog is re-read all through the phase
+                server.catalog_cache.close()
+                server.catalog_cache._use_listener = False
+                server.catalog_cache._ttl = args.refresh_ttl
+            rpcs = db.counters()["rpcs"]
+            phases[phase] = run(plan(phase, args.requests, categories, args.models, rng))
+            phases[phase]["firestore_rpcs"] = db.counters()["rpcs"] - rpcs
+            if phase == "cold":
+                # landed downloads re-render the pages; let them finish before the warm phases
+                start = time.perf_counter()
+                while server.asset_prefetcher.report()["pending"] and time.perf_counter() - start < 300:
+                    if args.mode == "asgi":
+                        loop.run_until_complete(asyncio.sleep(0.05))
+                    else:
+                        time.sleep(0.05)
+                phases[phase]["downloads_settled_s"] = round(time.perf_counter() - start, 2)
+        if args.mode == "asgi":
+            loop.run_until_complete(asgi_app.app.shutdown())
+        else:
+            server.activation_writer.stop()
+            server.asset_prefetcher.shutdown(wait=False)
+        return {"mode": args.mode, "phases": phases}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=64, help="in-flight requests (ASGI)")
+    parser.add_argument("--threads", type=int, default=8, help="request threads (threaded Flask)")
+    parser.add_argument("--distinct-assets", type=int, default=200)
+    parser.add_argument("--firestore-latency", type=float, default=0.05, help="seconds per Firestore RPC")
+    parser.add_argument("--origin-latency", type=float, default=0.02, help="seconds per asset response")
+    parser.add_argument("--refresh-ttl", type=float, default=0.05, help="CATALOG_TTL during the refresh phase")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--origin", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        json.dump(run_worker(args), sys.stdout)
+        return
+
+    origin = AssetOrigin(latency=args.origin_latency)
+    origin_url = origin.start()
+    runs = {}
+    try:
+        for mode in MODES:
+            cmd = [sys.executable, os.path.abspath(__file__), "--mode", mode, "--origin", origin_url]
+            for flag in ("models", "requests", "concurrency", "threads", "distinct_assets",
+                         "firestore_latency", "refresh_ttl"):
+                cmd += ["--" + flag.replace("_", "-"), str(getattr(args, flag))]
+            print(f"Benchmarking {mode}...", file=sys.stderr)
+            proc = subprocess.run(cmd, cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                raise SystemExit(f"benchmark worker for {mode} failed")
+            runs[mode] = json.loads(proc.stdout)["phases"]
+    finally:
+        origin.stop()
+
+    speedup = {phase: round(runs["asgi"][phase]["rps"] / runs["threaded"][phase]["rps"], 2)
+               for phase in PHASES if runs["threaded"][phase]["rps"]}
+    text = json.dumps({"benchmark": "asgi_load",
+                       "settings": {k: v for k, v in vars(args).items() if k not in ("mode", "origin", "out")},
+                       "runs": runs, "rps_ratio_asgi_vs_threaded": speedup}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
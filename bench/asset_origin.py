@@ -0,0 +1,127 @@
+"""Local HTTP stand-in for Firebase Storage, for offline benchmarks.
+
+Serves deterministic bytes for `/<kind>/<name>` (kind: target, image,
+audio, model) with ETags, so conditional revalidation works, plus
+configurable latency and failure rate:
+
+    python bench/asset_origin.py --port 8765 --latency 0.05 --fail-rate 0.02
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SIZES = {"target": 48 * 1024, "image": 24 * 1024, "audio": 96 * 1024, "model": 256 * 1024}
+CONTENT_TYPES = {"target": "image/png", "image": "image/jpeg", "audio": "audio/mpeg", "model": "model/gltf-binary"}
+
+
+def asset_bytes(kind, name, size):
+    seed = hashlib.sha256(f"{kind}/{name}".encode("utf-8")).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+class AssetOrigin:
+    """Threaded origin server; `start()` returns its base url."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fail_rate=0.0, sizes=None, seed=0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.sizes = dict(SIZES, **(sizes or {}))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.stats = {"requests": 0, "bytes": 0, "not_modified": 0, "failed": 0}
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                origin._serve(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="asset-origin", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _body(self, kind, name):
+        key = (kind, name)
+        body = self._cache.get(key)
+        if body is None:
+            body = self._cache[key] = asset_bytes(kind, name, self.sizes[kind])
+        return body
+
+    def _serve(self, handler):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = handler.path.split("?", 1)[0].strip("/").split("/", 1)
+        with self._lock:
+            self.stats["requests"] += 1
+            fail = self.fail_rate and self._random.random() < self.fail_rate
+        if len(parts) != 2 or parts[0] not in self.sizes:
+            handler.send_error(404)
+            return
+        if fail:
+            with self._lock:
+                self.stats["failed"] += 1
+            handler.send_response(503)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        kind, name = parts
+        body = self._body(kind, name)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", CONTENT_TYPES[kind])
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+        with self._lock:
+            self.stats["bytes"] += len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+    origin = AssetOrigin(args.host, args.port, args.latency, args.fail_rate)
+    print(f"Serving synthetic assets on {origin.start()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        origin.stop()
+
+
+if __name__ == "__main__":
+    main()
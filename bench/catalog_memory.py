@@ -0,0 +1,124 @@
+"""Compare the memory footprint of dict catalog entries with ModelEntry.
+
+Builds a synthetic catalog of N models both ways, then measures resident
+size and the allocations of one enrichment pass (what `/` does per
+category render). Run from the repo root:
+
+    python bench/catalog_memory.py --models 10000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from urllib.parse import quote_plus
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_entry import AssetRef, ModelEntry  # noqa: E402
+
+CATEGORIES = ["animals", "fruits", "shapes", "vehicles"]
+HOST = "http://localhost:5000/"
+
+
+def synthetic_docs(n):
+    for i in range(n):
+        name = f"Model {i}"
+        yield f"doc{i:06d}", {
+            "name": name,
+            # fresh strings each time, like values decoded from Firestore
+            "category": "".join(CATEGORIES[i % len(CATEGORIES)]),
+            "model": {"filename": f"{name}.glb", "path": f"3D/{i}_{name}.glb"},
+            "targetCard": {"filename": f"{name}.png", "path": f"targets/{i}_{name}.png",
+                           "url": f"https://example.test/targets/{i}_{name}.png"},
+            "image": {"filename": f"{name}.jpg", "path": f"images/{i}_{name}.jpg",
+                      "url": f"https://example.test/images/{i}_{name}.jpg"},
+            "audio": {"filename": f"{name}.mp3", "url": f"https://example.test/audio/{i}_{name}.mp3"},
+        }
+
+
+def dict_entry(doc_id, data):
+    # the shape fetch_all_models_grouped built before ModelEntry
+    entry = {
+        "id": doc_id,
+        "name": data["name"].strip(),
+        "category": data["category"].lower(),
+        "model": data["model"],
+        "targetCard": dict(data["targetCard"]),
+        "image": dict(data["image"]),
+        "audio": dict(data["audio"]),
+    }
+    for key in ("targetCard", "image", "audio"):
+        entry[key]["local"] = "/static/cas/" + entry[key]["filename"]
+    entry["src"] = "/static/models/" + data["model"]["filename"]
+    return entry
+
+
+def slotted_entry(doc_id, data):
+    entry = ModelEntry(doc_id, data["name"].strip(), data["category"].lower(),
+                       model=AssetRef.from_dict(data["model"]),
+                       targetCard=AssetRef.from_dict(data["targetCard"]),
+                       image=AssetRef.from_dict(data["image"]),
+                       audio=AssetRef.from_dict(data["audio"]))
+    for ref in (entry.targetCard, entry.image, entry.audio):
+        ref.local = "/static/cas/" + ref.filename
+    entry.src = "/static/models/" + entry.model.filename
+    return entry
+
+
+def dict_enrich(models):
+    out = []
+    for m in models:
+        abs_src = HOST.rstrip("/") + m["src"]
+        entry = dict(m)
+        entry["abs_src"] = abs_src
+        entry["scene_link"] = "https://arvr.google.com/scene-viewer/1.0?file=" + quote_plus(abs_src) + "&mode=ar_preferred"
+        entry["intent_link"] = "intent://arvr.google.com/scene-viewer/1.0?file=" + quote_plus(abs_src) + "&mode=ar_preferred#Intent;end"
+        out.append(entry)
+    return out
+
+
+def slotted_enrich(models):
+    return [m.to_dict(HOST) for m in models]
+
+
+def measure(build, enrich, docs):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    catalog = [build(doc_id, data) for doc_id, data in docs]
+    resident = tracemalloc.get_traced_memory()[0] - base
+
+    # first pass warms lazy fields; the second is the steady-state request cost
+    enrich(catalog)
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    payload = enrich(catalog)
+    elapsed = time.perf_counter() - start
+    per_render = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    del payload
+    return {"resident_bytes": resident, "render_peak_bytes": per_render, "render_seconds": round(elapsed, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=10000)
+    args = parser.parse_args()
+
+    docs = list(synthetic_docs(args.models))
+    results = {
+        "models": args.models,
+        "dict": measure(dict_entry, dict_enrich, docs),
+        "ModelEntry": measure(slotted_entry, slotted_enrich, docs),
+    }
+    results["resident_saved_pct"] = round(
+        100 * (1 - results["ModelEntry"]["resident_bytes"] / results["dict"]["resident_bytes"]), 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Cost of a category page with CATALOG_MODE=full vs CATALOG_MODE=category, fully offline.
+
+For each catalog size a fresh server process is booted per mode against
+the fake Firestore (`--firestore-latency` per RPC), with category
+spellings scattered the way the real collection has them ("animals",
+"Animals", "Animal") and `category_index.py migrate` already applied.
+Per run, for the smallest category:
+
+    first_page_ms    cold `GET /?category=<smallest>` on a fresh process
+    first_page_reads Firestore documents read to serve it
+    warm_page_ms     median of `--requests` further requests for it
+    all_pages_reads  documents read once every category has been shown
+    rss_mb           resident memory after the first page
+
+    python bench/category_pages.py --sizes 1000,5000,20000
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from fake_firestore import FakeFirestore, synthetic_catalog  # noqa: E402
+
+MODES = ("full", "category")
+ORIGIN = "http://127.0.0.1:9"  # nothing listens: pages serve remote urls while downloads fail
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+def messy_catalog(n):
+    """synthetic_catalog with the category spelled three ways."""
+    docs = synthetic_catalog(n, ORIGIN)
+    for i, data in enumerate(docs.values()):
+        category = data["category"]
+        if i % 3 == 1:
+            data["category"] = category.capitalize()
+        elif i % 3 == 2 and category.endswith("s"):
+            data["category"] = category[:-1].capitalize()
+    return docs
+
+
+def run_worker(args):
+    import category_index
+    db = FakeFirestore({"models": messy_catalog(args.models)}, latency=args.firestore_latency)
+    docs = {doc.id: doc.to_dict() for doc in db.collection("models").stream()}
+    keys, backfill = category_index.plan(docs)
+    category_index.apply_backfill(db, backfill)
+    summary = category_index.build_summary(docs, keys)
+    category_index.summary_ref(db).set(summary)
+
+    import firebase_admin.firestore
+    firebase_admin.firestore.client = lambda *a, **kw: db
+    import server
+    from asset_fetch import AssetPrefetcher
+    server.init_firebase = lambda: None
+    server.asset_prefetcher = AssetPrefetcher(server.asset_store, max_workers=1)
+    server.start_warmup = lambda *a, **kw: None  # measure the request path, not the boot
+    client = server.app.test_client()
+
+    categories = {c["key"]: c["count"] for c in summary["categories"]}
+    smallest = min(categories, key=categories.get)
+    reads = db.counters()["reads"]
+    start = time.perf_counter()
+    status = client.get(f"/?category={smallest}").status_code
+    first_ms = (time.perf_counter() - start) * 1000
+    first_reads = db.counters()["reads"] - reads
+    memory = rss_mb()
+    warm = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        client.get(f"/?category={smallest}")
+        warm.append((time.perf_counter() - start) * 1000)
+    for key in categories:
+        client.get(f"/?category={key}")
+    print(json.dumps({
+        "status": status,
+        "category": smallest,
+        "category_models": categories[smallest],
+        "first_page_ms": round(first_ms, 1),
+        "first_page_reads": first_reads,
+        "warm_page_ms": round(statistics.median(warm), 2),
+        "all_pages_reads": db.counters()["reads"] - reads,
+        "rss_mb": round(memory, 1),
+    }), flush=True)
+    server.asset_prefetcher.shutdown(wait=False)
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,5000,20000", help="comma-separated catalog sizes")
+    parser.add_argument("--requests", type=int, default=50, help="warm requests per run")
+    parser.add_argument("--firestore-latency", type=float, default=0.05, help="seconds per Firestore RPC")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--models", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    runs = {mode: {} for mode in MODES}
+    for size in [int(n) for n in args.sizes.split(",")]:
+        for mode in MODES:
+            print(f"Benchmarking {size} models, CATALOG_MODE={mode}...", file=sys.stderr)
+            env = dict(os.environ, CATALOG_MODE=mode, CATALOG_SNAPSHOT_POLICY="off", CATEGORY_INDEX="off",
+                       TIMING_LOG="off", ASSET_WAIT_TIMEOUT="0")
+            env.pop("SHARED_CACHE", None)
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", "--models", str(size),
+                                  "--requests", str(args.requests),
+                                  "--firestore-latency", str(args.firestore_latency)],
+                                 cwd=REPO_ROOT, env=env, check=True, stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL, text=True).stdout
+            runs[mode][size] = json.loads(out.strip().splitlines()[-1])
+
+    text = json.dumps({"benchmark": "category_pages",
+                       "settings": {k: v for k, v in vars(args).items() if k not in ("worker", "models", "out")},
+                       "runs": runs}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""In-memory stand-in for the parts of the Firestore client the app uses.
+
+Covers `collection(...).stream()/where()/select()/order_by()/limit()`,
+`document(...).get()/set()/update()` (with `Increment`), `batch()`, `on_snapshot(...)` on
+collections, queries and documents, and async queries through `async_client()`, and counts reads and writes the way Firestore bills them (one read per
+document returned, at least one per query). Used by the benchmarks to
+run the app offline against synthetic catalogs:
+
+    from fake_firestore import FakeFirestore, synthetic_catalog
+    db = FakeFirestore({"models": synthetic_catalog(1000, "http://127.0.0.1:8765")})
+"""
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+import types
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.json")
+
+# data.json only carries names; this is the category each one is filed under in the app
+CATEGORIES = {
+    "animals": ["Beagle", "Cow", "Pig", "Alligator", "Snake", "Capuchin", "Rooster", "Goat", "Tiger",
+                "Horse", "Cat", "Rabbit"],
+    "fruits": ["Pineapple", "Watermelon", "Kiwi", "Pear", "Lime", "Lemon", "Passion Fruit", "Banana",
+               "Plum", "Pomegranate", "Apple Green", "Strawberries", "Apple", "Orange", "Mango", "Papaya",
+               "Avocado", "Tangerine", "Tomato", "Coconut", "Blueberries", "Peach", "Cherry"],
+    "shapes": ["Sphere", "Square", "Circle", "Diamond", "Heart", "Star", "Hexagon", "Triangle", "Rectangle",
+               "Cube", "Pentagon Shape", "Cone Shape", "Cylinder", "Pyramid"],
+    "vehicles": ["Truck", "Helicopter", "Police Car", "Tank", "Train", "Unicycle", "Hot Air Balloon",
+                 "Motorcycle", "Ambulance", "Boat", "Airplane", "Bus", "Jeep", "Bicycle"],
+}
+_CATEGORY_OF = {name: category for category, names in CATEGORIES.items() for name in names}
+
+
+def synthetic_catalog(n, origin_url, data_path=DATA_PATH, distinct_assets=None):
+    """{doc_id: data} for `n` models shaped like the real `models` documents.
+
+    Names and categories cycle through data.json; asset urls point at
+    `origin_url` (see asset_origin.py). With `distinct_assets`, models
+    share that many asset urls per kind, so large catalogs don't need one
+    download per model.
+    """
+    with open(data_path, "r") as f:
+        base = [item["name"] for item in json.load(f)]
+    origin_url = origin_url.rstrip("/")
+    docs = {}
+    for i in range(n):
+        name = base[i % len(base)]
+        if i >= len(base):
+            name = f"{name} {i // len(base)}"
+        a = i % distinct_assets if distinct_assets else i
+        stem = f"{a:05d}"
+        docs[f"m{i:06d}"] = {
+            "name": name,
+            "description": f"Synthetic model {i}",
+            "category": _CATEGORY_OF.get(base[i % len(base)], "uncategorized"),
+            "activated": False,
+            "model": {"filename": f"{stem}.glb", "path": f"3D/{stem}.glb", "url": f"{origin_url}/model/{stem}.glb"},
+            "targetCard": {"filename": f"{stem}.png", "path": f"targets/{stem}.png",
+                           "url": f"{origin_url}/target/{stem}.png"},
+            "image": {"filename": f"{stem}.jpg", "path": f"images/{stem}.jpg", "url": f"{origin_url}/image/{stem}.jpg"},
+            "audio": {"filename": f"{stem}.mp3", "url": f"{origin_url}/audio/{stem}.mp3"},
+        }
+    return docs
+
+
+class FakeSnapshot:
+    __slots__ = ("id", "_data", "reference")
+
+    def __init__(self, doc_id, data, reference=None):
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+
+def _field(data, path):
+    value = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array-contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), fields=None, order=(), limit=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._fields = fields
+        self._order = tuple(order)
+        self._limit = limit
+
+    def _copy(self, **changes):
+        state = {"filters": self._filters, "fields": self._fields, "order": self._order, "limit": self._limit}
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(order=self._order + ((field_path, str(direction).upper().startswith("DESC")),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def stream(self, transaction=None):
+        self._collection._db._rpc()
+        return self._rows()
+
+    def _matches(self, doc_id, data):
+        return data is not None and all(_OPS[op](_field(data, f), v) for f, op, v in self._filters)
+
+    def _rows(self):
+        db = self._collection._db
+        with db._lock:
+            rows = [(doc_id, data) for doc_id, data in self._collection._docs.items()
+                    if self._matches(doc_id, data)]
+        for f, descending in reversed(self._order):
+            rows = [r for r in rows if _field(r[1], f) is not None]
+            rows.sort(key=lambda r: _field(r[1], f), reverse=descending)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        db.count_reads(max(1, len(rows)))
+        for doc_id, data in rows:
+            if self._fields is not None:
+                data = {f: data[f] for f in self._fields if f in data}
+            yield FakeSnapshot(doc_id, copy.deepcopy(data), self._collection.document(doc_id))
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        """Deliver the matching documents once, then every change to them, from a background thread.
+
+        Order and limit are ignored; a document that stops matching is
+        delivered as REMOVED.
+        """
+        col = self._collection
+        with col._db._lock:
+            snapshot = [FakeSnapshot(k, copy.deepcopy(v), col.document(k)) for k, v in col._docs.items()
+                        if self._matches(k, v)]
+            listener = (self._matches, callback)
+            col._listeners.append(listener)
+        col._db.count_reads(max(1, len(snapshot)))
+        changes = [_change("ADDED", s) for s in snapshot]
+        threading.Thread(target=callback, args=(snapshot, changes, time.time()), daemon=True).start()
+        return types.SimpleNamespace(unsubscribe=lambda: col._unsubscribe(listener))
+
+
+class AsyncFakeQuery:
+    """`AsyncQuery` look-alike over a FakeQuery: `stream()` is an async iterator."""
+
+    def __init__(self, query):
+        self._query = query
+
+    def where(self, *args, **kwargs):
+        return AsyncFakeQuery(self._query.where(*args, **kwargs))
+
+    def select(self, field_paths):
+        return AsyncFakeQuery(self._query.select(field_paths))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return AsyncFakeQuery(self._query.order_by(field_path, direction))
+
+    def limit(self, count):
+        return AsyncFakeQuery(self._query.limit(count))
+
+    async def stream(self, transaction=None):
+        await self._query._collection._db._rpc_async()
+        for snapshot in self._query._rows():
+            yield snapshot
+
+    async def get(self, transaction=None):
+        return [snapshot async for snapshot in self.stream()]
+
+
+class FakeDocument:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection.id}/{self.id}"
+
+    def get(self, field_paths=None, transaction=None):
+        db = self._collection._db
+        db._rpc()
+        db.count_reads(1)
+        with db._lock:
+            data = self._collection._docs.get(self.id)
+        return FakeSnapshot(self.id, copy.deepcopy(data), self)
+
+    def set(self, data, merge=False):
+        self._collection._db._rpc()
+        self._collection._write(self.id, data, merge=merge)
+
+    def update(self, data):
+        self._collection._db._rpc()
+        self._collection._write(self.id, data, must_exist=True)
+
+    def delete(self):
+        self._collection._db._rpc()
+        self._collection._write(self.id, None)
+
+    def on_snapshot(self, callback):
+        """Deliver this document once (even if missing), then every change to it."""
+        col = self._collection
+
+        def deliver(docs, changes, read_time):
+            for change in changes:
+                removed = change.type.name == "REMOVED"
+                callback([FakeSnapshot(self.id, None, self) if removed else change.document], changes, read_time)
+
+        with col._db._lock:
+            snapshot = FakeSnapshot(self.id, copy.deepcopy(col._docs.get(self.id)), self)
+            listener = (lambda doc_id, data: doc_id == self.id and data is not None, deliver)
+            col._listeners.append(listener)
+        col._db.count_reads(1)
+        threading.Thread(target=callback, args=([snapshot], [_change("ADDED", snapshot)], time.time()),
+                         daemon=True).start()
+        return types.SimpleNamespace(unsubscribe=lambda: col._unsubscribe(listener))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(self)
+        self._db = db
+        self.id = name
+        self._docs = {}
+        self._listeners = []
+        self._auto_id = 0
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            with self._db._lock:
+                self._auto_id += 1
+                doc_id = f"auto{self._auto_id:08d}"
+        return FakeDocument(self, doc_id)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def _unsubscribe(self, listener):
+        with self._db._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _write(self, doc_id, data, merge=False, must_exist=False):
+        db = self._db
+        with db._lock:
+            current = self._docs.get(doc_id)
+            if must_exist and current is None:
+                raise KeyError(f"No document to update: {self.id}/{doc_id}")
+            if data is None:
+                kind = "REMOVED"
+                self._docs.pop(doc_id, None)
+                new = current
+            else:
+                kind = "ADDED" if current is None else "MODIFIED"
+                new = copy.deepcopy(current) if (merge or must_exist) and current else {}
+                for key, value in data.items():
+                    if "." in key and must_exist:
+                        target = new
+                        parts = key.split(".")
+                        for part in parts[:-1]:
+                            target = target.setdefault(part, {})
+                        target[parts[-1]] = _transform(target.get(parts[-1]), value)
+                    else:
+                        new[key] = _transform(new.get(key), value)
+                self._docs[doc_id] = new
+            listeners = list(self._listeners)
+            db.writes += 1
+        for matches, callback in listeners:
+            before, after = matches(doc_id, current), matches(doc_id, new if data is not None else None)
+            if before and not after:
+                change = _change("REMOVED", FakeSnapshot(doc_id, copy.deepcopy(current), self.document(doc_id)))
+            elif after:
+                change = _change("ADDED" if not before else kind,
+                                 FakeSnapshot(doc_id, copy.deepcopy(new), self.document(doc_id)))
+            else:
+                continue
+            callback([], [change], time.time())
+
+
+def _transform(current, value):
+    """The stored value for a write of `value`; applies `firestore.Increment` to `current`."""
+    if type(value).__name__ == "Increment":
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    return copy.deepcopy(value)
+
+
+def _change(kind, snapshot):
+    return types.SimpleNamespace(type=types.SimpleNamespace(name=kind), document=snapshot)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append((ref, "set", data, merge))
+
+    def update(self, ref, data):
+        self._ops.append((ref, "update", data, False))
+
+    def delete(self, ref):
+        self._ops.append((ref, "delete", None, False))
+
+    def commit(self):
+        self._db._rpc()
+        with self._db._lock:
+            missing = [ref.path for ref, op, _, _ in self._ops
+                       if op == "update" and ref.id not in ref._collection._docs]
+        if missing:
+            raise KeyError(f"No document to update: {missing[0]}")
+        for ref, op, data, merge in self._ops:
+            if op == "delete":
+                ref._collection._write(ref.id, None)
+            else:
+                ref._collection._write(ref.id, data, merge=merge, must_exist=op == "update")
+        self._db.commits += 1
+        self._ops = []
+
+
+class FakeFirestore:
+    """`firestore.Client` look-alike holding `{collection: {doc_id: data}}` in memory.
+
+    `latency` seconds are slept per RPC to model the network round trip.
+    """
+
+    def __init__(self, collections=None, latency=0.0):
+        self._lock = threading.RLock()
+        self._collections = {}
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+        self.rpcs = 0
+        for name, docs in (collections or {}).items():
+            self.collection(name)._docs.update(copy.deepcopy(docs))
+
+    def collection(self, name):
+        with self._lock:
+            col = self._collections.get(name)
+            if col is None:
+                col = self._collections[name] = FakeCollection(self, name)
+            return col
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def async_client(self):
+        """`firestore.AsyncClient` look-alike over the same data (queries only)."""
+        return AsyncFakeFirestore(self)
+
+    def count_reads(self, n):
+        with self._lock:
+            self.reads += n
+
+    def counters(self):
+        with self._lock:
+            return {"reads": self.reads, "writes": self.writes, "commits": self.commits, "rpcs": self.rpcs}
+
+    def _rpc(self):
+        with self._lock:
+            self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def _rpc_async(self):
+        with self._lock:
+            self.rpcs += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class AsyncFakeFirestore:
+    def __init__(self, db):
+        self._db = db
+
+    def collection(self, name):
+        return AsyncFakeQuery(self._db.collection(name))
@@ -0,0 +1,100 @@
+"""GLB bytes and resident models of a category page: preloaded vs loaded on targetFound.
+
+Renders `/?category=<c>` for every category and device class against the
+fake Firestore, with the GLBs under static/models (data.json names), and
+reads the page's model manifest. Per category and device class:
+
+    models            models with a GLB
+    preload_bytes     GLB bytes an <a-asset-item> per model fetched before the scene started
+    preload_ms        the same at `--mbps`, capped by the a-assets timeout (`--assets-timeout`)
+    on_demand_bytes   GLB bytes fetched before the scene starts now: none
+    prefetch_bytes    bytes fetched in the background once AR is running
+    first_model_ms    median fetch time of a model at `--mbps` on its first targetFound
+    resident_bytes    GLB bytes kept decoded: every model before, the LRU limit now
+
+    python bench/model_loading.py --mbps 10
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from fake_firestore import CATEGORIES, FakeFirestore  # noqa: E402
+
+DEVICE_CLASSES = ("low", "mid", "high")
+MANIFEST = re.compile(r"const modelManifest = (.*);")
+
+
+def local_catalog():
+    """{doc_id: data} for the data.json models that have a GLB under static/models."""
+    models_dir = os.path.join(REPO_ROOT, "static", "models")
+    docs = {}
+    for category, names in CATEGORIES.items():
+        for name in names:
+            if os.path.exists(os.path.join(models_dir, f"{name}.glb")):
+                # a few scanned often, so the page has models to prefetch
+                activations = len(docs) % 4
+                docs[f"m{len(docs):04d}"] = {"name": name, "category": category, "activations": activations,
+                                             "model": {"filename": f"{name}.glb"},
+                                             "targetCard": {"filename": f"{name}.png"}}
+    return docs
+
+
+def transfer_ms(size, mbps):
+    return size * 8 / (mbps * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mbps", type=float, default=10.0, help="download bandwidth of the modelled phone")
+    parser.add_argument("--assets-timeout", type=float, default=3000, help="a-assets timeout, ms")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    os.environ.update(CATALOG_SNAPSHOT_POLICY="off", CATEGORY_INDEX="off", TIMING_LOG="off")
+    docs = local_catalog()
+    db = FakeFirestore({"models": docs})
+    import firebase_admin.firestore
+    firebase_admin.firestore.client = lambda *a, **kw: db
+    import server
+    server.init_firebase = lambda: None
+    client = server.app.test_client()
+
+    runs = {}
+    for category in sorted({data["category"] for data in docs.values()}):
+        for device_class in DEVICE_CLASSES:
+            body = client.get(f"/?category={category}&quality={device_class}").get_data(as_text=True)
+            manifest = json.loads(MANIFEST.search(body).group(1))
+            sizes = [item["bytes"] or 0 for item in manifest["models"]]
+            if not sizes:
+                continue
+            limits = manifest["cache"]
+            preload = sum(sizes)
+            runs.setdefault(category, {})[device_class] = {
+                "models": len(sizes),
+                "preload_bytes": preload,
+                "preload_ms": round(min(transfer_ms(preload, args.mbps), args.assets_timeout)),
+                "on_demand_bytes": 0,
+                "prefetch_bytes": sum(item["bytes"] or 0 for item in manifest["models"] if item.get("prefetch")),
+                "first_model_ms": round(statistics.median(transfer_ms(size, args.mbps) for size in sizes)),
+                "resident_bytes": [preload, min(limits["bytes"],
+                                                sum(sorted(sizes, reverse=True)[:limits["models"]]))],
+            }
+
+    text = json.dumps({"benchmark": "model_loading", "settings": vars(args), "runs": runs}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    os._exit(0)  # the prefetch pool's threads would hold the interpreter open
+
+
+if __name__ == "__main__":
+    main()
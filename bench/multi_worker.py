@@ -0,0 +1,173 @@
+"""Several worker processes on one host, with and without SHARED_CACHE, fully offline.
+
+For each worker count, `N` processes boot server.py at the same time
+against one content-addressed asset directory and a local asset origin;
+each has its own fake Firestore holding the same catalog, like a real
+deployment where every worker talks to the same project. Per run:
+
+    firestore_reads   documents read from Firestore, summed over workers
+    origin_requests   asset downloads hitting the origin (duplicates show up here)
+    ready_s           slowest worker's time from start to a warm catalog
+    rss_mb            mean resident memory per worker once warm
+    propagation_s     after one catalog document changes, until every
+                      worker serves the new version
+
+    python bench/multi_worker.py --workers 1,2,4,8 --models 1000
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from asset_origin import AssetOrigin  # noqa: E402
+from fake_firestore import FakeFirestore, synthetic_catalog  # noqa: E402
+
+MODES = ("unshared", "shared")
+CHANGED_DOC = "m000000"
+CHANGED_NAME = "Renamed by bench"
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+def run_worker(args):
+    """One worker: boots, reports, then applies the catalog change when told to on stdin."""
+    import firebase_admin.firestore
+    db = FakeFirestore({"models": synthetic_catalog(args.models, args.origin,
+                                                     distinct_assets=args.distinct_assets)},
+                       latency=args.firestore_latency)
+    firebase_admin.firestore.client = lambda *a, **kw: db
+
+    import server
+    from asset_store import AssetStore
+    from asset_fetch import AssetPrefetcher
+    from mind_compiler import MindCompiler
+
+    start = time.perf_counter()
+    server.init_firebase = lambda: None
+    server.asset_store = AssetStore(os.path.join(args.dir, "cas"), os.path.join(args.dir, "asset_manifest.json"),
+                                    shared=server.shared_cache)
+    server.asset_prefetcher = AssetPrefetcher(server.asset_store)
+    server.mind_compiler = MindCompiler(args.dir, os.path.join(args.dir, "mind"), "/static/mind",
+                                        compile_fn=lambda paths, output: open(output, "wb").close())
+    server.start_warmup()
+    while not server.is_ready():
+        time.sleep(0.01)
+    ready = time.perf_counter() - start
+    while server.asset_prefetcher.report()["pending"]:
+        time.sleep(0.05)
+    reads = db.counters()["reads"]
+    print(json.dumps({"ready_s": round(ready, 3), "firestore_reads": reads, "rss_mb": round(rss_mb(), 1),
+                      "leader": bool(server.shared_cache and server.shared_cache.is_leader("catalog"))}),
+          flush=True)
+
+    def serves_change():
+        return any(m.name == CHANGED_NAME for models in server.catalog_cache.get().values() for m in models)
+
+    for line in sys.stdin:
+        if line.strip() == "change":
+            changed = time.perf_counter()
+            db.collection("models").document(CHANGED_DOC).update({"name": CHANGED_NAME})
+            while not serves_change() and time.perf_counter() - changed < 30:
+                time.sleep(0.005)
+            print(json.dumps({"propagation_s": round(time.perf_counter() - changed, 3),
+                              "firestore_reads": db.counters()["reads"] - reads}), flush=True)
+        elif line.strip() == "exit":
+            break
+    server.asset_prefetcher.shutdown(wait=False)
+    os._exit(0)  # skip atexit: the runs share a directory that is removed next
+
+
+def run(mode, workers, args, origin):
+    tmp = tempfile.mkdtemp(prefix="shared-bench-")
+    env = dict(os.environ, TIMING_LOG="off", CATALOG_SNAPSHOT_POLICY="off", CATEGORY_INDEX="off")
+    if mode == "shared":
+        env["SHARED_CACHE"] = os.path.join(tmp, "shared.sqlite3")
+    else:
+        env.pop("SHARED_CACHE", None)
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--dir", tmp, "--origin", origin.url,
+           "--models", str(args.models), "--distinct-assets", str(args.distinct_assets),
+           "--firestore-latency", str(args.firestore_latency)]
+    requests_before = origin.stats["requests"]
+    procs = [subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True) for _ in range(workers)]
+    try:
+        booted = [json.loads(p.stdout.readline()) for p in procs]
+        origin_requests = origin.stats["requests"] - requests_before
+        for p in procs:
+            p.stdin.write("change\n")
+            p.stdin.flush()
+        changed = [json.loads(p.stdout.readline()) for p in procs]
+        for p in procs:
+            p.stdin.write("exit\n")
+            p.stdin.flush()
+        for p in procs:
+            p.wait(timeout=30)
+    finally:
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "firestore_reads": sum(b["firestore_reads"] for b in booted),
+        "origin_requests": origin_requests,
+        "ready_s": max(b["ready_s"] for b in booted),
+        "rss_mb": round(sum(b["rss_mb"] for b in booted) / workers, 1),
+        "leaders": sum(b["leader"] for b in booted),
+        "propagation_s": max(c["propagation_s"] for c in changed),
+        "firestore_reads_on_change": sum(c["firestore_reads"] for c in changed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--models", type=int, default=1000)
+    parser.add_argument("--distinct-assets", type=int, default=200)
+    parser.add_argument("--firestore-latency", type=float, default=0.05, help="seconds per Firestore RPC")
+    parser.add_argument("--origin-latency", type=float, default=0.02, help="seconds per asset response")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--origin", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    origin = AssetOrigin(latency=args.origin_latency)
+    origin.start()
+    runs = {mode: {} for mode in MODES}
+    try:
+        for workers in [int(n) for n in args.workers.split(",")]:
+            for mode in MODES:
+                print(f"Benchmarking {workers} {mode} worker(s)...", file=sys.stderr)
+                runs[mode][workers] = run(mode, workers, args, origin)
+    finally:
+        origin.stop()
+
+    text = json.dumps({"benchmark": "multi_worker",
+                       "settings": {k: v for k, v in vars(args).items() if k not in ("worker", "dir", "origin", "out")},
+                       "runs": runs}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
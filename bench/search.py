@@ -0,0 +1,136 @@
+"""Latency of search_index.SearchIndex at catalog scale, checked against a budget.
+
+Per catalog size (synthetic models with data.json names and descriptions):
+
+    build_ms          indexing the whole catalog in one update (the first load)
+    update_us         median re-index of one changed document (a listener event)
+    query_us          median and p99 of `--queries` queries per kind:
+                        exact    a whole model name                   "police car 12"
+                        prefix   the first letters of a name          "pol"
+                        typo     a name word with two letters swapped  "polcie"
+                        words    a name word and one from its description "tiger stripes"
+                        common   a word most descriptions share        "fruit"
+                        miss     nothing matches                      "qzxv"
+    tokens            distinct tokens indexed
+
+Exits non-zero when any kind's p99 is over `--budget-ms`:
+
+    python bench/search.py --sizes 1000,10000,50000 --budget-ms 1
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from catalog_entry import ModelEntry  # noqa: E402
+from fake_firestore import DATA_PATH, synthetic_catalog  # noqa: E402
+from search_index import SearchIndex, tokenize  # noqa: E402
+
+
+def catalog(n):
+    """{doc_id: (data, entry)} as CatalogCache reports it, with data.json descriptions."""
+    with open(DATA_PATH, "r") as f:
+        descriptions = [item.get("description", "") for item in json.load(f)]
+    docs = synthetic_catalog(n, "http://127.0.0.1:9")
+    out = {}
+    for i, (doc_id, data) in enumerate(docs.items()):
+        data["description"] = descriptions[i % len(descriptions)]
+        out[doc_id] = (data, ModelEntry(doc_id, data["name"], data["category"]))
+    return out
+
+
+def swap(word, rng):
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def queries(docs, count, rng):
+    names = [data["name"] for data, _ in docs.values()]
+    name_words = [w for name in names[:200] for w in tokenize(name) if len(w) >= 5 and not w.isdigit()]
+    # a word of a model's name and one of its own description, as someone describing it would type
+    pairs = [(w, d) for data, _ in list(docs.values())[:200] for w in tokenize(data["name"]) if not w.isdigit()
+             for d in tokenize(data["description"]) if len(d) >= 5 and d != w]
+    return {
+        "exact": [rng.choice(names) for _ in range(count)],
+        "prefix": [rng.choice(name_words)[:3] for _ in range(count)],
+        "typo": [swap(rng.choice(name_words), rng) for _ in range(count)],
+        "words": [" ".join(rng.choice(pairs)) for _ in range(count)],
+        "common": ["fruit"] * count,
+        "miss": ["qzxv"] * count,
+    }
+
+
+def timed_us(fn, items):
+    out = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        out.append((time.perf_counter() - start) * 1e6)
+    return out
+
+
+def p99(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))]
+
+
+def run(size, args):
+    rng = random.Random(size)
+    docs = catalog(size)
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.update(docs)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    ids = rng.sample(list(docs), min(200, size))
+    update_us = timed_us(lambda doc_id: index.update({doc_id: docs[doc_id]}), ids)
+
+    results = {}
+    for kind, items in queries(docs, args.queries, rng).items():
+        latencies = timed_us(lambda q: index.search(q, args.limit), items)
+        results[kind] = {"median": round(statistics.median(latencies), 1), "p99": round(p99(latencies), 1)}
+    return {
+        "build_ms": round(build_ms, 1),
+        "update_us": round(statistics.median(update_us), 1),
+        "query_us": results,
+        "tokens": index.counts()[1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated catalog sizes")
+    parser.add_argument("--queries", type=int, default=500, help="queries per kind")
+    parser.add_argument("--limit", type=int, default=10, help="results per query")
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="p99 query budget")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    runs = {}
+    for size in [int(n) for n in args.sizes.split(",")]:
+        print(f"Benchmarking {size} models...", file=sys.stderr)
+        runs[size] = run(size, args)
+
+    over = [f"{size}/{kind}" for size, r in runs.items() for kind, q in r["query_us"].items()
+            if q["p99"] > args.budget_ms * 1000]
+    text = json.dumps({"benchmark": "search", "settings": {k: v for k, v in vars(args).items() if k != "out"},
+                       "runs": runs, "over_budget": over}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if over:
+        print("Over the p99 budget: " + ", ".join(over), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Import time and time-to-ready of a fresh server process, checked against budgets.
+
+    import    `import server` in a new interpreter with the real libraries,
+              `--repeat` times (median reported), plus the slowest modules
+              server.py imports directly, from `python -X importtime`
+    boot      a new process serving server.app on a local port against the
+              fake Firestore (`--firestore-latency` per RPC) and a local asset
+              origin: seconds from spawn until /healthz and /readyz answer 200,
+              and the warmup stages /readyz reports; once with the catalog
+              read from Firestore (`firestore`) and once served from a
+              catalog snapshot written beforehand (`snapshot`)
+
+Exits non-zero when the median import time is over `--import-budget` or
+time-to-ready is over `--ready-budget`, so it can gate CI:
+
+    python bench/startup.py --models 1000 --import-budget 0.5 --ready-budget 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from asset_origin import AssetOrigin  # noqa: E402
+from catalog_snapshot import write_snapshot  # noqa: E402
+from fake_firestore import FakeFirestore, synthetic_catalog  # noqa: E402
+
+IMPORT_SNIPPET = ("import json, time; t = time.perf_counter(); import server; "
+                  "print(json.dumps(time.perf_counter() - t))")
+
+
+def measure_import(repeat, top):
+    env = dict(os.environ, TIMING_LOG="off")
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=REPO_ROOT, env=env, check=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+        times.append(json.loads(out.strip().splitlines()[-1]))
+
+    # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+    trace = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], cwd=REPO_ROOT, env=env,
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    direct = []
+    for line in trace.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        # modules imported by server.py itself sit one level below it
+        if depth == 1 and cumulative.strip().isdigit():
+            direct.append((int(cumulative), name.strip()))
+    direct.sort(reverse=True)
+    return {
+        "median_s": round(statistics.median(times), 3),
+        "min_s": round(min(times), 3),
+        "max_s": round(max(times), 3),
+        "slowest_imports_ms": {name: round(us / 1000, 1) for us, name in direct[:top]},
+    }
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError:
+        return None, b""
+
+
+def measure_boot(args, origin_url, snapshot=None, timeout=120):
+    """Spawn a worker and time it; with `snapshot` (a path) it boots from that catalog snapshot."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--origin", origin_url,
+           "--models", str(args.models), "--distinct-assets", str(args.distinct_assets),
+           "--firestore-latency", str(args.firestore_latency)]
+    env = dict(os.environ, TIMING_LOG="off", CATALOG_SNAPSHOT_POLICY="prefer" if snapshot else "off",
+               CATEGORY_INDEX="off")
+    if snapshot:
+        env["CATALOG_SNAPSHOT"] = snapshot
+    spawned = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            env=env)
+    stderr = []
+    threading.Thread(target=lambda: stderr.extend(proc.stderr), daemon=True).start()
+    try:
+        line = proc.stdout.readline()
+        if not line:
+            proc.wait()
+            raise SystemExit("boot worker failed:\n" + "".join(stderr))
+        base = "http://127.0.0.1:%d" % json.loads(line)["port"]
+        result = {"listening_s": round(time.perf_counter() - spawned, 3)}
+        healthy = None
+        while time.perf_counter() - spawned < timeout:
+            if healthy is None and get(base + "/healthz")[0] == 200:
+                healthy = result["healthy_s"] = round(time.perf_counter() - spawned, 3)
+            status, body = get(base + "/readyz")
+            if status == 200:
+                result["ready_s"] = round(time.perf_counter() - spawned, 3)
+                result["readyz"] = json.loads(body)
+                return result
+            time.sleep(0.01)
+        raise SystemExit(f"not ready after {timeout}s:\n" + "".join(stderr))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run_worker(args):
+    """Serve server.app against the fakes; prints {"port": ...} once listening."""
+    tmp = tempfile.mkdtemp(prefix="startup-bench-")
+    try:
+        # patched before server.py is imported, like the real libraries would be loaded by the warmup
+        import firebase_admin.firestore
+        db = FakeFirestore({"models": synthetic_catalog(args.models, args.origin,
+                                                         distinct_assets=args.distinct_assets)},
+                           latency=args.firestore_latency)
+        firebase_admin.firestore.client = lambda *a, **kw: db
+
+        import server
+        from asset_store import AssetStore
+        from asset_fetch import AssetPrefetcher
+        from mind_compiler import MindCompiler
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        server.init_firebase = lambda: None
+        server.asset_store = AssetStore(os.path.join(tmp, "cas"), os.path.join(tmp, "asset_manifest.json"))
+        server.asset_prefetcher = AssetPrefetcher(server.asset_store)
+        server.mind_compiler = MindCompiler(tmp, os.path.join(tmp, "mind"), "/static/mind",
+                                            compile_fn=lambda paths, output: open(output, "wb").close())
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *a, **kw):
+                pass
+
+        httpd = make_server("127.0.0.1", 0, server.app, threaded=True, request_handler=QuietHandler)
+        server.start_warmup()
+        print(json.dumps({"port": httpd.server_port}), flush=True)
+        httpd.serve_forever()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=1000)
+    parser.add_argument("--distinct-assets", type=int, default=200)
+    parser.add_argument("--firestore-latency", type=float, default=0.05, help="seconds per Firestore RPC")
+    parser.add_argument("--origin-latency", type=float, default=0.02, help="seconds per asset response")
+    parser.add_argument("--repeat", type=int, default=5, help="import measurements")
+    parser.add_argument("--top", type=int, default=8, help="slowest direct imports to list")
+    parser.add_argument("--import-budget", type=float, default=1.0, help="seconds, median import")
+    parser.add_argument("--ready-budget", type=float, default=15.0, help="seconds from spawn to /readyz 200")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--origin", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    print("Measuring import time...", file=sys.stderr)
+    imports = measure_import(args.repeat, args.top)
+    origin = AssetOrigin(latency=args.origin_latency)
+    origin_url = origin.start()
+    tmp = tempfile.mkdtemp(prefix="startup-bench-")
+    try:
+        print("Measuring time to ready...", file=sys.stderr)
+        boot = {"firestore": measure_boot(args, origin_url)}
+        snapshot = os.path.join(tmp, "catalog.snapshot")
+        write_snapshot(snapshot, synthetic_catalog(args.models, origin_url, distinct_assets=args.distinct_assets), 1)
+        boot["snapshot"] = measure_boot(args, origin_url, snapshot)
+    finally:
+        origin.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    over = []
+    if imports["median_s"] > args.import_budget:
+        over.append(f"import {imports['median_s']}s > {args.import_budget}s")
+    for source, result in boot.items():
+        if result["ready_s"] > args.ready_budget:
+            over.append(f"ready from {source} {result['ready_s']}s > {args.ready_budget}s")
+    text = json.dumps({"benchmark": "startup",
+                       "settings": {k: v for k, v in vars(args).items() if k not in ("worker", "origin", "out")},
+                       "import": imports, "boot": boot, "over_budget": over}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if over:
+        print("Over budget: " + "; ".join(over), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Compare Flask's default static handler with the static_assets layer.
+
+Serves static/ both ways on local ports and fetches the page's big
+assets: the A-Frame/MindAR bundles, the largest GLB and one audio file.
+For each asset it reports bytes on the wire and time-to-first-byte for
+a first visit, for a repeat visit (a conditional GET, or no request at
+all when the response was immutable), and for a 64 KiB Range request.
+Output is JSON:
+
+    python bench/static_serving.py --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from flask import Flask, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import static_assets  # noqa: E402
+
+STATIC_ROOT = os.path.join(REPO_ROOT, "static")
+BUNDLES = ["aframe.min.js", "aframe-extras.min.js", "mindar-image-aframe.prod.js"]
+ACCEPT_ENCODING = "gzip, deflate, br"
+
+
+def pick_assets():
+    assets = [b for b in BUNDLES if os.path.isfile(os.path.join(STATIC_ROOT, b))]
+    for folder, exts in (("models", (".glb",)), ("audio", (".mp3", ".wav"))):
+        path = os.path.join(STATIC_ROOT, folder)
+        files = [f for f in os.listdir(path) if f.lower().endswith(exts)] if os.path.isdir(path) else []
+        if files:
+            assets.append(f"{folder}/" + max(files, key=lambda f: os.path.getsize(os.path.join(path, f))))
+    return assets
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(app):
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def fetch(session, url, headers):
+    start = time.perf_counter()
+    with session.get(url, headers=headers, stream=True, timeout=30) as resp:
+        ttfb = time.perf_counter() - start
+        wire = len(resp.raw.read(decode_content=False))
+        return {"status": resp.status_code, "ttfb_ms": ttfb * 1000, "wire_bytes": wire,
+                "total_ms": (time.perf_counter() - start) * 1000, "headers": resp.headers}
+
+
+def cacheable_without_request(headers):
+    cc = headers.get("Cache-Control", "")
+    return "immutable" in cc or ("max-age=" in cc and "no-cache" not in cc)
+
+
+def measure(session, url, repeat):
+    first = [fetch(session, url, {"Accept-Encoding": ACCEPT_ENCODING}) for _ in range(repeat)]
+    headers = first[0]["headers"]
+    if cacheable_without_request(headers):
+        revisit = {"requests": 0, "wire_bytes": 0, "ttfb_ms": 0.0}
+    else:
+        validators = {"Accept-Encoding": ACCEPT_ENCODING}
+        if headers.get("ETag"):
+            validators["If-None-Match"] = headers["ETag"]
+        elif headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = headers["Last-Modified"]
+        again = [fetch(session, url, validators) for _ in range(repeat)]
+        revisit = {"requests": 1, "status": again[0]["status"], "wire_bytes": again[0]["wire_bytes"],
+                   "ttfb_ms": round(statistics.median(r["ttfb_ms"] for r in again), 3)}
+    ranged = fetch(session, url, {"Range": "bytes=0-65535", "Accept-Encoding": ACCEPT_ENCODING})
+    return {
+        "status": first[0]["status"],
+        "content_encoding": headers.get("Content-Encoding"),
+        "cache_control": headers.get("Cache-Control"),
+        "wire_bytes": first[0]["wire_bytes"],
+        "ttfb_ms": round(statistics.median(r["ttfb_ms"] for r in first), 3),
+        "total_ms": round(statistics.median(r["total_ms"] for r in first), 3),
+        "repeat_visit": revisit,
+        "range": {"status": ranged["status"], "wire_bytes": ranged["wire_bytes"],
+                  "content_range": ranged["headers"].get("Content-Range")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="requests per measurement")
+    parser.add_argument("--sidecars", help="sidecar folder (default: build into a temporary folder)")
+    args = parser.parse_args()
+
+    sidecar_dir = args.sidecars or tempfile.mkdtemp(prefix="sidecars-")
+    assets = pick_assets()
+    exts = {os.path.splitext(a)[1].lower() for a in assets} & static_assets.COMPRESSIBLE_EXTS
+    for rel in assets:
+        # only what is measured, so a cold run doesn't compress the whole tree
+        if os.path.splitext(rel)[1].lower() in exts:
+            sub = os.path.dirname(rel)
+            static_assets.build_sidecars(os.path.join(STATIC_ROOT, sub), os.path.join(sidecar_dir, sub), exts)
+
+    before_app = Flask("before", static_folder=STATIC_ROOT)
+    after_app = Flask("after", static_folder=STATIC_ROOT)
+    layer = static_assets.StaticAssets(STATIC_ROOT, sidecar_dir)
+    after_app.view_functions["static"] = lambda filename: layer.serve(filename, request)
+
+    before_server, before_url = serve(before_app)
+    after_server, after_url = serve(after_app)
+    session = requests.Session()
+    results = {}
+    try:
+        for rel in assets:
+            results[rel] = {
+                "bytes": os.path.getsize(os.path.join(STATIC_ROOT, rel)),
+                "before": measure(session, f"{before_url}/static/{rel}", args.repeat),
+                "after": measure(session, after_url + layer.url(rel), args.repeat),
+            }
+    finally:
+        before_server.shutdown()
+        after_server.shutdown()
+
+    totals = {}
+    for side in ("before", "after"):
+        totals[side] = {
+            "first_visit_bytes": sum(r[side]["wire_bytes"] for r in results.values()),
+            "repeat_visit_requests": sum(r[side]["repeat_visit"]["requests"] for r in results.values()),
+            "repeat_visit_bytes": sum(r[side]["repeat_visit"]["wire_bytes"] for r in results.values()),
+            "ttfb_ms": round(sum(r[side]["ttfb_ms"] for r in results.values()), 3),
+        }
+    print(json.dumps({"benchmark": "static_serving", "repeat": args.repeat, "assets": results, "totals": totals},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
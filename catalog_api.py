@@ -0,0 +1,160 @@
+import base64
+import bisect
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# longer queries are refused: every term may run a typo lookup
+MAX_QUERY_LENGTH = 200
+
+
+class ApiError(ValueError):
+    """Bad query parameter; the message is returned to the client as a 400."""
+
+
+def flatten_catalog(models_by_category):
+    """Flat list of entries in API order (category, then .mind order) plus their sort keys."""
+    entries = []
+    keys = []
+    for category in sorted(models_by_category):
+        for m in models_by_category[category]:
+            entries.append(m)
+            keys.append((category, m.target_sort_key(), m.id))
+    # groups are sorted by target key only; add the id so ties page deterministically
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return [entries[i] for i in order], [keys[i] for i in order]
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise ApiError("invalid cursor")
+    if not isinstance(key, list) or len(key) != 3 or not all(isinstance(k, str) for k in key):
+        raise ApiError("invalid cursor")
+    return tuple(key)
+
+
+def parse_fields(fields):
+    """`id,name,image.local` -> [("id",), ("name",), ("image", "local")]; None means everything."""
+    if not fields:
+        return None
+    paths = []
+    for field in fields.split(","):
+        field = field.strip()
+        if field:
+            paths.append(tuple(p for p in field.split(".") if p))
+    return [p for p in paths if p] or None
+
+
+def project(item, paths):
+    if paths is None:
+        return item
+    out = {}
+    for path in paths:
+        src, dst = item, out
+        for i, part in enumerate(path):
+            if not isinstance(src, dict) or part not in src:
+                break
+            if i == len(path) - 1:
+                dst[part] = src[part]
+            else:
+                src = src[part]
+                dst = dst.setdefault(part, {})
+    return out
+
+
+def page(flat, keys, category=None, cursor=None, limit=DEFAULT_LIMIT):
+    """Slice of `flat` after `cursor`, optionally limited to one category.
+
+    Returns (entries, next_cursor). Cursors are the sort key of the last
+    entry returned, so pages stay consistent when entries are added or
+    removed in between.
+    """
+    if category is not None:
+        lo = bisect.bisect_left(keys, (category,))
+        hi = bisect.bisect_left(keys, (category + "\x00",))
+    else:
+        lo, hi = 0, len(keys)
+    if cursor is not None:
+        lo = max(lo, bisect.bisect_right(keys, decode_cursor(cursor), lo, hi))
+    end = min(hi, lo + limit)
+    next_cursor = encode_cursor(keys[end - 1]) if end < hi else None
+    return flat[lo:end], next_cursor
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if value is None or value == "":
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    if limit < 1:
+        raise ApiError("limit must be positive")
+    return min(limit, maximum)
+
+
+def parse_query(value):
+    query = (value or "").strip()
+    if not query:
+        raise ApiError("missing q")
+    if len(query) > MAX_QUERY_LENGTH:
+        raise ApiError(f"q must be at most {MAX_QUERY_LENGTH} characters")
+    return query
+
+
+def encode_body(payload):
+    """Compact JSON bytes and their strong ETag."""
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def choose_encoding(accept_encoding, available=None):
+    """Best content coding for an Accept-Encoding header, out of `available`.
+
+    `available` defaults to the codings `compress` can produce.
+    """
+    offered = {}
+    for item in (accept_encoding or "").split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip().lower()
+        q = 1.0
+        for param in parts[1:]:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if coding:
+            offered[coding] = q
+    if available is None:
+        available = (("br",) if brotli is not None else ()) + ("gzip",)
+    for coding in available:
+        if offered.get(coding, offered.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def compress(body, coding):
+    if coding == "br":
+        return brotli.compress(body, quality=5)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
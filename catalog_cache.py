@@ -0,0 +1,331 @@
+import sys
+import threading
+import time
+
+import metrics
+
+# counter for documents read; clients that are not Firestore name their own (`reads_metric`)
+READS_METRIC = "firestore_docs_read_total"
+
+
+class CatalogCache:
+    """Process-wide cache of the resolved `models` catalog.
+
+    The catalog is built once from a full collection read and then kept
+    fresh by an `on_snapshot` listener on the collection. When listeners are
+    not available (emulators, fakes, a dead watch stream) it falls back to
+    re-reading the collection once `ttl` seconds have passed. In both cases
+    only documents whose data actually changed are passed to `resolve` again.
+
+    `db_factory` returns a Firestore client (or anything with the same
+    `collection(...).stream()` / `on_snapshot(...)` surface), `resolve` turns
+    `(doc_id, data)` into a catalog entry and `group` turns a list of entries
+    into the `{category: [entry, ...]}` mapping served by `/`.
+
+    `seed` installs documents from elsewhere (an on-disk snapshot) before
+    the first read; `fallback()`, if given, returns such documents (or
+    None) and is used when a read fails with nothing loaded yet.
+    `on_change()` is called after every update of the catalog, after
+    `on_update(changed, removed)`, which gets just what the update changed:
+    `{doc_id: (data, entry)}` re-resolved and the ids removed. `query`, if
+    given, narrows what is read and listened to: it gets the collection
+    reference and returns a query (category_index reads one category).
+    """
+
+    def __init__(self, db_factory, resolve, group, collection="models",
+                 ttl=300, use_listener=True, clock=time.monotonic, fallback=None, query=None):
+        self._db_factory = db_factory
+        self._resolve = resolve
+        self._group = group
+        self._collection = collection
+        self._ttl = ttl
+        self._use_listener = use_listener
+        self._clock = clock
+        self._fallback = fallback
+        self._query = query
+        self.on_change = None
+        self.on_update = None
+
+        self._lock = threading.RLock()
+        self._docs = {}  # doc_id -> (data, entry)
+        self._grouped = None
+        self._loaded_at = None
+        self._refreshing = False
+        self._listener = None
+        self._listener_tried = False
+        self._listener_metric = READS_METRIC
+        self.source = None  # "firestore" or "snapshot", where the current catalog came from
+        self.generation = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "resolved": 0,
+            "removed": 0,
+            "errors": 0,
+        }
+
+    @property
+    def listening(self):
+        return self._listener is not None
+
+    @property
+    def loaded(self):
+        """True once a collection read has succeeded (an empty fallback catalog does not count)."""
+        with self._lock:
+            return self._grouped is not None and self._loaded_at is not None
+
+    def counts(self):
+        """(models, categories) in the cached catalog, without counting as a lookup."""
+        with self._lock:
+            grouped = self._grouped or {}
+            return sum(len(entries) for entries in grouped.values()), len(grouped)
+
+    def get(self):
+        """Return the grouped catalog, loading or refreshing it if needed."""
+        with self._lock:
+            if self._grouped is None or self._loaded_at is None:
+                self.stats["misses"] += 1
+                self._load()
+                return self._grouped
+            self.stats["hits"] += 1
+            if self._listener is not None or self._refreshing:
+                return self._grouped
+            if self._clock() - self._loaded_at < self._ttl:
+                return self._grouped
+            self._refreshing = True
+
+        # TTL expired: refresh in this request, other requests keep serving
+        # the stale catalog until the swap below.
+        try:
+            # a seeded catalog is replaced by the first read, which then starts the listener
+            if self.refresh() and self._use_listener and not self._listener_tried:
+                self._start_listener()
+        finally:
+            with self._lock:
+                self._refreshing = False
+        return self._grouped
+
+    def peek(self):
+        """(grouped, stale) without touching Firestore; grouped is None before the first load.
+
+        For callers that read the collection themselves (the ASGI app reads
+        it with the async client) and hand the documents to `load`.
+        """
+        with self._lock:
+            if self._grouped is None or self._loaded_at is None:
+                return None, True
+            self.stats["hits"] += 1
+            stale = self._listener is None and not self._refreshing and \
+                self._clock() - self._loaded_at >= self._ttl
+            return self._grouped, stale
+
+    def claim_refresh(self):
+        """Mark an outside refresh as running; False if one already is.
+
+        While it runs, `get` keeps serving the stale catalog instead of
+        reading the collection itself. `load` and `load_failed` release it.
+        """
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def load(self, docs, reads_metric=READS_METRIC):
+        """Apply a full collection read done elsewhere, then start the listener."""
+        with self._lock:
+            if self._grouped is None:
+                self.stats["misses"] += 1
+        metrics.inc(reads_metric, len(docs), source="catalog")
+        try:
+            with metrics.phase("resolve"):
+                self._apply_full(docs)
+        finally:
+            with self._lock:
+                self._refreshing = False
+        if self._use_listener and self._listener is None:
+            self._start_listener()
+
+    def load_failed(self, error):
+        """Count a failed outside read; the fallback, or an empty catalog, is served until one succeeds."""
+        with self._lock:
+            self.stats["errors"] += 1
+            self._refreshing = False
+            empty = self._grouped is None
+        print("Error reading models from Firestore:", error, file=sys.stderr)
+        if empty and not self._seed_fallback():
+            with self._lock:
+                if self._grouped is None:
+                    self._grouped = self._group([])
+
+    def seed(self, docs, stale=True):
+        """Serve `docs` (shaped like Firestore documents) until the first real read.
+
+        Ignored once a catalog is loaded. With `stale` the seeded catalog
+        counts as expired, so the next `get` (or the async reader) replaces
+        it from Firestore while it keeps being served; without it, it lasts
+        a full TTL. Returns whether the documents were applied.
+        """
+        with self._lock:
+            if self._grouped is not None and self._loaded_at is not None:
+                return False
+            # replaces an earlier seed; unchanged documents are not resolved again
+            seeded = {doc.id for doc in docs}
+            removed = [doc_id for doc_id in self._docs if doc_id not in seeded]
+            self._grouped = None
+            # set first, so on_change sees where the catalog came from
+            self.source = "snapshot"
+        self._apply_changes(docs, removed)
+        with self._lock:
+            self._loaded_at = self._clock() - (self._ttl if stale else 0)
+        return True
+
+    def documents(self):
+        """{doc_id: data} of the cached catalog, as last read."""
+        with self._lock:
+            return {doc_id: data for doc_id, (data, _) in self._docs.items()}
+
+    def refresh(self):
+        """Re-read the collection and re-resolve changed documents."""
+        try:
+            with metrics.phase("firestore"):
+                db = self._db_factory()
+                docs = list(self._source(db).stream())
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print("Error reading models from Firestore:", e, file=sys.stderr)
+            return False
+        metrics.inc(getattr(db, "reads_metric", READS_METRIC), len(docs), source="catalog")
+        with metrics.phase("resolve"):
+            self._apply_full(docs)
+        return True
+
+    def _seed_fallback(self):
+        if self._fallback is None:
+            return False
+        try:
+            docs = self._fallback()
+        except Exception as e:
+            print("Error loading fallback catalog:", e, file=sys.stderr)
+            return False
+        if docs is None:
+            return False
+        applied = self.seed(docs)
+        if applied:
+            print(f"Serving the catalog snapshot ({len(docs)} document(s)) until Firestore answers",
+                  file=sys.stderr)
+        return applied
+
+    def touch(self):
+        """Bump the generation after cached entries were updated in place."""
+        with self._lock:
+            self.generation += 1
+
+    def invalidate(self):
+        """Drop the cached catalog so the next `get` reloads it."""
+        with self._lock:
+            removed, self._docs = list(self._docs), {}
+            self._grouped = None
+            self._loaded_at = None
+            self.generation += 1
+        self._notify_update({}, removed)
+
+    def close(self):
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            try:
+                listener.unsubscribe()
+            except Exception:
+                pass
+
+    def restart_listener(self):
+        """Re-subscribe through `db_factory`, e.g. after it started returning another client."""
+        self.close()
+        if self._use_listener:
+            self._start_listener()
+
+    def _load(self):
+        if not self.refresh():
+            # serve the snapshot, retrying on the next request once it expires;
+            # without one serve an empty catalog, retrying on the next request
+            if not self._seed_fallback():
+                self._grouped = self._group([])
+                self._loaded_at = None
+            return
+        if self._use_listener and self._listener is None:
+            self._start_listener()
+
+    def _source(self, db):
+        col = db.collection(self._collection)
+        return self._query(col) if self._query is not None else col
+
+    def _start_listener(self):
+        self._listener_tried = True
+        try:
+            db = self._db_factory()
+            self._listener_metric = getattr(db, "reads_metric", READS_METRIC)
+            self._listener = self._source(db).on_snapshot(self._on_snapshot)
+        except Exception as e:
+            self._listener = None
+            print(f"Notice: catalog listener unavailable, using {self._ttl}s TTL refresh - {e}",
+                  file=sys.stderr)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        metrics.inc(self._listener_metric, len(changes), source="listener")
+        upserts = []
+        removed = []
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                removed.append(doc.id)
+            else:
+                upserts.append(doc)
+        self._apply_changes(upserts, removed)
+
+    def _apply_full(self, docs):
+        seen = {doc.id for doc in docs}
+        with self._lock:
+            removed = [doc_id for doc_id in self._docs if doc_id not in seen]
+            self.source = "firestore"
+        self._apply_changes(docs, removed)
+        with self._lock:
+            self._loaded_at = self._clock()
+
+    def _apply_changes(self, upserts, removed):
+        resolved = {}
+        for doc in upserts:
+            data = doc.to_dict() or {}
+            with self._lock:
+                current = self._docs.get(doc.id)
+            if current is not None and current[0] == data:
+                continue
+            resolved[doc.id] = (data, self._resolve(doc.id, data))
+
+        with self._lock:
+            removed = [doc_id for doc_id in removed if doc_id in self._docs]
+            if not resolved and not removed and self._grouped is not None:
+                return
+            for doc_id in removed:
+                del self._docs[doc_id]
+            self._docs.update(resolved)
+            self._grouped = self._group([entry for _, entry in self._docs.values()])
+            self.generation += 1
+            self.stats["refreshes"] += 1
+            self.stats["resolved"] += len(resolved)
+            self.stats["removed"] += len(removed)
+        self._notify_update(resolved, removed)
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                print("Error in catalog on_change:", e, file=sys.stderr)
+
+    def _notify_update(self, changed, removed):
+        if self.on_update is not None and (changed or removed):
+            try:
+                self.on_update(changed, removed)
+            except Exception as e:
+                print("Error in catalog on_update:", e, file=sys.stderr)
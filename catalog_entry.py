@@ -0,0 +1,125 @@
+import os
+import sys
+from urllib.parse import quote_plus
+
+SCENE_VIEWER = "https://arvr.google.com/scene-viewer/1.0?file="
+SCENE_INTENT = "intent://arvr.google.com/scene-viewer/1.0?file="
+SCENE_INTENT_TAIL = ("&mode=ar_preferred#Intent;scheme=https;package=com.google.android.googlequicksearchbox;"
+                     "action=android.intent.action.VIEW;end")
+
+
+def scene_links(src, host_url):
+    """(abs_src, scene_link, intent_link) for a model `src` served to `host_url`."""
+    model_src = src or ""
+    abs_src = host_url.rstrip("/") + model_src if model_src.startswith("/") else model_src
+    if not abs_src:
+        return abs_src, None, None
+    quoted = quote_plus(abs_src)
+    return abs_src, SCENE_VIEWER + quoted + "&mode=ar_preferred", SCENE_INTENT + quoted + SCENE_INTENT_TAIL
+
+
+class AssetRef:
+    """One asset of a model (targetCard, image, audio or the 3D model itself).
+
+    `url`, `filename` and `path` come from the Firestore document, `local`
+    is the path the page should load. Any other document fields are kept
+    in `extra` so the JSON handed to the page is unchanged.
+    """
+
+    __slots__ = ("url", "filename", "path", "local", "extra")
+
+    def __init__(self, url=None, filename=None, path=None, local=None, extra=None):
+        self.url = url
+        self.filename = filename
+        self.path = path
+        self.local = local
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        extra = {k: v for k, v in data.items() if k not in ("url", "filename", "path", "local")}
+        return cls(data.get("url"), data.get("filename"), data.get("path"), data.get("local"), extra or None)
+
+    def get(self, key, default=None):
+        if key in self.__slots__:
+            value = getattr(self, key)
+            return default if value is None else value
+        return (self.extra or {}).get(key, default)
+
+    def to_dict(self, with_local=True):
+        out = dict(self.extra) if self.extra else {}
+        for key in ("url", "filename", "path"):
+            value = getattr(self, key)
+            if value is not None:
+                out[key] = value
+        if with_local:
+            out["local"] = self.local
+        return out
+
+
+class ModelEntry:
+    """Resolved catalog entry for one `models` document.
+
+    Category strings are interned, since every entry of a category carries
+    the same one. Scene Viewer links depend on the request host and are
+    computed on first use per host, then kept until `src` changes.
+    `activations` counts the `/activate` posts recorded for the model.
+    """
+
+    __slots__ = ("id", "name", "category", "model", "targetCard", "image", "audio", "activations", "_src",
+                 "_links")
+
+    def __init__(self, id, name, category, model=None, targetCard=None, image=None, audio=None, src=None,
+                 activations=0):
+        self.id = id
+        self.name = name
+        self.category = sys.intern(category)
+        self.model = model or AssetRef()
+        self.targetCard = targetCard or AssetRef()
+        self.image = image or AssetRef()
+        self.audio = audio or AssetRef()
+        self.activations = activations
+        self._src = src
+        self._links = None
+
+    @property
+    def src(self):
+        return self._src
+
+    @src.setter
+    def src(self, value):
+        self._src = value
+        self._links = None
+
+    def target_sort_key(self):
+        """Sort key matching the .mind target order: target filename, then name."""
+        fn = self.targetCard.filename or ""
+        fn = os.path.basename(fn).lower()
+        return fn or self.name.lower()
+
+    def links(self, host_url):
+        """(abs_src, scene_link, intent_link) for a request to `host_url`."""
+        links = self._links
+        if links is not None and links[0] == host_url:
+            return links[1]
+        value = scene_links(self._src, host_url)
+        # a single slot: one process almost always serves one host
+        self._links = (host_url, value)
+        return value
+
+    def to_dict(self, host_url=None):
+        """JSON-safe form for templates and APIs; adds link fields when `host_url` is given."""
+        out = {
+            "id": self.id,
+            "name": self.name,
+            "category": self.category,
+            "model": self.model.to_dict(with_local=False),
+            "targetCard": self.targetCard.to_dict(),
+            "image": self.image.to_dict(),
+            "audio": self.audio.to_dict(),
+            "src": self._src,
+        }
+        if host_url is not None:
+            out["abs_src"], out["scene_link"], out["intent_link"] = self.links(host_url)
+        return out
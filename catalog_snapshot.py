@@ -0,0 +1,325 @@
+"""On-disk snapshot of the Firestore `models` collection, for booting without Firestore.
+
+    snapshots = CatalogSnapshots("cache/catalog.snapshot")
+    snap = snapshots.load()                 # None if missing or corrupt
+    catalog_cache.seed(snap.documents())    # serve the last-known catalog right away
+    snapshots.schedule(catalog_cache.documents())   # after each refresh, written in the background
+
+    python catalog_snapshot.py export [--out PATH]   # read Firestore, write a snapshot
+    python catalog_snapshot.py verify [PATH]         # check a snapshot, print its summary
+
+File layout, little-endian, read through mmap so only the header is
+parsed up front:
+
+    header   magic "LRNCATS\\0", format version u16, flags u16, document
+             count u32, generation u64, created (unix seconds) f64, index
+             offset u64, sha256 of everything after the header (32 bytes)
+    records  per document: u32 length + UTF-8 JSON `[doc_id, data]`
+    index    document count x u64 record offsets
+
+The generation goes up by one every time a snapshot with different
+content is written. Firestore values that JSON cannot hold are stored as
+strings (timestamps as ISO 8601); the catalog only reads plain fields.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+MAGIC = b"LRNCATS\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHHIQdQ32s")
+LENGTH = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "catalog.snapshot")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class SnapshotDoc:
+    """A stored document, shaped like a Firestore DocumentSnapshot (`id`, `to_dict()`)."""
+
+    __slots__ = ("id", "_data")
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class Snapshot:
+    """An open snapshot file; records are decoded from the mapping when asked for."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise SnapshotError(f"{path}: truncated header")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _flags, count, generation, created, index_offset, digest = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not a catalog snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{path}: format version {version}, expected {FORMAT_VERSION}")
+        if index_offset + count * OFFSET.size != size:
+            raise SnapshotError(f"{path}: truncated ({size} bytes, index ends at "
+                                f"{index_offset + count * OFFSET.size})")
+        self.count = count
+        self.generation = generation
+        self.created = created
+        self.digest = digest.hex()
+        self._index_offset = index_offset
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+    def record(self, i):
+        """(doc_id, data) of the i-th document."""
+        offset, = OFFSET.unpack_from(self._map, self._index_offset + i * OFFSET.size)
+        length, = LENGTH.unpack_from(self._map, offset)
+        doc_id, data = json.loads(self._map[offset + LENGTH.size:offset + LENGTH.size + length])
+        return doc_id, data
+
+    def documents(self):
+        return [SnapshotDoc(*self.record(i)) for i in range(self.count)]
+
+    def verify(self, records=True):
+        """Check the digest and, with `records`, every record; raises SnapshotError, returns a summary dict."""
+        actual = hashlib.sha256(self._map[HEADER.size:]).hexdigest()
+        if actual != self.digest:
+            raise SnapshotError(f"{self.path}: checksum mismatch")
+        if not records:
+            return self.summary()
+        ids = set()
+        for i in range(self.count):
+            try:
+                doc_id, data = self.record(i)
+            except (ValueError, struct.error) as e:
+                raise SnapshotError(f"{self.path}: record {i} unreadable - {e}")
+            if not isinstance(doc_id, str) or not isinstance(data, dict):
+                raise SnapshotError(f"{self.path}: record {i} is not [id, {{...}}]")
+            if doc_id in ids:
+                raise SnapshotError(f"{self.path}: duplicate document {doc_id}")
+            ids.add(doc_id)
+        return self.summary()
+
+    def summary(self):
+        return {
+            "path": self.path,
+            "format": FORMAT_VERSION,
+            "generation": self.generation,
+            "created": datetime.datetime.fromtimestamp(self.created, datetime.timezone.utc).isoformat(),
+            "age_s": round(time.time() - self.created, 1),
+            "documents": self.count,
+            "bytes": os.path.getsize(self.path),
+            "sha256": self.digest,
+        }
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def encode_body(docs):
+    """(records + index bytes, document count) for `{doc_id: data}`.
+
+    Documents are sorted by id, so equal catalogs encode to identical
+    bytes and the header checksum doubles as a content digest.
+    """
+    body = bytearray()
+    offsets = []
+    for doc_id in sorted(docs):
+        record = json.dumps([doc_id, docs[doc_id]], separators=(",", ":"), sort_keys=True,
+                            default=_encode, ensure_ascii=False).encode("utf-8")
+        offsets.append(HEADER.size + len(body))
+        body += LENGTH.pack(len(record)) + record
+    for offset in offsets:
+        body += OFFSET.pack(offset)
+    return bytes(body), len(offsets)
+
+
+def write_snapshot(path, docs, generation, created=None, encoded=None):
+    """Atomically write `{doc_id: data}` (or its `encode_body` result) as a snapshot at `path`."""
+    body, count = encoded or encode_body(docs)
+    index_offset = HEADER.size + len(body) - count * OFFSET.size
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, generation,
+                         time.time() if created is None else created, index_offset,
+                         hashlib.sha256(body).digest())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp creates it private
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return len(header) + len(body)
+
+
+class CatalogSnapshots:
+    """Loads the snapshot at `path` and rewrites it, debounced, as the catalog changes.
+
+    `schedule(docs)` returns at once; the write happens on a timer thread
+    `delay` seconds after the first call of a burst, with the latest docs,
+    so a burst of listener updates costs one write. Catalogs equal to the stored one are not rewritten.
+    """
+
+    def __init__(self, path, delay=2.0):
+        self.path = path
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = None
+        self._generation = None
+        self._digest = None
+        self.stats = {"writes": 0, "unchanged": 0, "errors": 0}
+
+    def load(self):
+        """The current snapshot, verified, or None if there is none or it is unusable."""
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            snap = Snapshot(self.path)
+            # the checksum covers every record; decoding them is left to the caller
+            snap.verify(records=False)
+        except (OSError, SnapshotError) as e:
+            print("Notice: ignoring catalog snapshot -", e, file=sys.stderr)
+            return None
+        with self._lock:
+            self._generation = snap.generation
+            self._digest = snap.digest
+        return snap
+
+    def schedule(self, docs):
+        """Write `{doc_id: data}` after `delay` seconds unless newer docs arrive first."""
+        with self._lock:
+            self._pending = dict(docs)
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the pending catalog now; returns the generation written, or None."""
+        with self._lock:
+            docs, self._pending = self._pending, None
+            self._timer = None
+        if docs is None:
+            return None
+        try:
+            encoded = encode_body(docs)
+        except (TypeError, ValueError) as e:
+            print("Error encoding catalog snapshot:", e, file=sys.stderr)
+            return None
+        digest = hashlib.sha256(encoded[0]).hexdigest()
+        with self._lock:
+            if digest == self._digest:
+                self.stats["unchanged"] += 1
+                return None
+            generation = self._current_generation() + 1
+        try:
+            write_snapshot(self.path, docs, generation, encoded=encoded)
+        except OSError as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print("Error writing catalog snapshot:", e, file=sys.stderr)
+            return None
+        with self._lock:
+            self._generation = generation
+            self._digest = digest
+            self.stats["writes"] += 1
+        return generation
+
+    def close(self):
+        with self._lock:
+            timer = self._timer
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+
+    def _current_generation(self):
+        if self._generation is None:
+            try:
+                snap = Snapshot(self.path)
+                self._generation = snap.generation
+                snap.close()
+            except (OSError, SnapshotError):
+                self._generation = 0
+        return self._generation
+
+
+def export(path, collection="models"):
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serviceaccount.json")
+        firebase_admin.initialize_app(credentials.Certificate(cred_path))
+    docs = {doc.id: doc.to_dict() or {} for doc in firestore.client().collection(collection).stream()}
+    snapshots = CatalogSnapshots(path)
+    snapshots.schedule(docs)
+    generation = snapshots.flush()
+    if generation is None:
+        print(f"Catalog unchanged, {path} kept", file=sys.stderr)
+    else:
+        print(f"Wrote {path}: {len(docs)} document(s), generation {generation}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and verify offline catalog snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="read the Firestore collection into a snapshot")
+    p_export.add_argument("--out", default=os.environ.get("CATALOG_SNAPSHOT", DEFAULT_PATH))
+    p_export.add_argument("--collection", default="models")
+    p_verify = sub.add_parser("verify", help="check a snapshot and print its summary")
+    p_verify.add_argument("path", nargs="?", default=os.environ.get("CATALOG_SNAPSHOT", DEFAULT_PATH))
+    p_verify.add_argument("--list", action="store_true", help="also print every document id")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export(args.out, args.collection)
+        return
+    try:
+        snap = Snapshot(args.path)
+        summary = snap.verify()
+    except (OSError, SnapshotError) as e:
+        raise SystemExit(f"Invalid snapshot: {e}")
+    if args.list:
+        summary["ids"] = [snap.record(i)[0] for i in range(snap.count)]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
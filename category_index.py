@@ -0,0 +1,521 @@
+"""Normalized category keys on `models` documents and the `meta/categories` summary.
+
+Documents were filed under "animal", "Animals", "animals " and so on, so
+every reader had to lowercase the category or query all the spellings.
+Each document now carries `categoryKey`, the one normalized spelling, and
+a summary document lists every category:
+
+    meta/categories  {"version": 1, "total": 220, "categories": [
+                         {"key": "animals", "name": "Animals", "count": 12,
+                          "targets": ["Beagle.png", ...]},     # .mind order
+                         ...], "updatedAt": <server timestamp>}
+
+With those, one category is served from the summary plus
+`where("categoryKey", "==", key)`, and a page costs reads in proportion
+to its category, not to the catalog (`CategoryCatalog`, server.py's
+CATALOG_MODE=category).
+
+    python category_index.py migrate [--dry-run]   # backfill categoryKey, then rewrite the summary
+    python category_index.py summary [--dry-run]   # rewrite the summary from the current documents
+    python category_index.py show                  # print the stored summary
+
+server.py keeps both current after every catalog change (`IndexMaintainer`).
+"""
+import argparse
+import collections
+import collections.abc
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+import metrics
+from catalog_cache import CatalogCache, READS_METRIC
+
+COLLECTION = "models"
+KEY_FIELD = "categoryKey"
+SUMMARY_COLLECTION = "meta"
+SUMMARY_DOC = "categories"
+SUMMARY_VERSION = 1
+DEFAULT_CATEGORY = "uncategorized"
+MAX_BATCH_WRITES = 500  # Firestore limit per batch
+# fields the summary and the backfill need; migrate reads only these
+INDEX_FIELDS = ["name", "category", KEY_FIELD, "targetCard"]
+
+
+def category_key(value):
+    """'  Animals ' -> 'animals'; a missing or blank category -> 'uncategorized'."""
+    return " ".join(str(value or "").split()).casefold() or DEFAULT_CATEGORY
+
+
+def doc_key(data):
+    """The category a document is served under: its stored key, or its normalized category."""
+    return data.get(KEY_FIELD) or category_key(data.get("category"))
+
+
+def key_map(values):
+    """{raw category: key} for a set of raw categories.
+
+    A singular is folded into its plural when both are in use, so
+    "Animal" and "animals" end up under one key.
+    """
+    keys = {value: category_key(value) for value in values}
+    present = set(keys.values())
+    out = {}
+    for value, key in keys.items():
+        for suffix in ("s", "es"):
+            if key + suffix in present:
+                key += suffix
+                break
+        out[value] = key
+    return out
+
+
+def target_filename(data):
+    """Basename of the target card, as the .mind compiler sees it; '' without one."""
+    card = data.get("targetCard") or {}
+    if not isinstance(card, dict):
+        return ""
+    filename = card.get("filename") or os.path.basename(unquote(urlparse(card.get("url") or "").path))
+    return os.path.basename(filename or "")
+
+
+def target_sort_key(data):
+    """catalog_entry.ModelEntry.target_sort_key for a raw document."""
+    return target_filename(data).lower() or str(data.get("name") or "unknown").strip().lower()
+
+
+def plan(docs):
+    """({doc_id: key}, [(doc_id, key)] whose stored categoryKey is missing or wrong) for `{doc_id: data}`."""
+    mapping = key_map({data.get("category") for data in docs.values()})
+    keys = {doc_id: mapping[data.get("category")] for doc_id, data in docs.items()}
+    backfill = [(doc_id, key) for doc_id, key in sorted(keys.items()) if docs[doc_id].get(KEY_FIELD) != key]
+    return keys, backfill
+
+
+def build_summary(docs, keys=None):
+    """The summary document (without `updatedAt`) for `{doc_id: data}`, keyed by `keys` or `doc_key`."""
+    groups = {}
+    for doc_id, data in docs.items():
+        key = keys[doc_id] if keys is not None else doc_key(data)
+        groups.setdefault(key, []).append(data)
+    categories = []
+    for key in sorted(groups):
+        members = sorted(groups[key], key=target_sort_key)
+        # the most used spelling is the display name; ties go to the first alphabetically
+        spellings = collections.Counter(" ".join(str(d.get("category") or "").split()) for d in members)
+        name = min(spellings.items(), key=lambda kv: (-kv[1], kv[0]))[0] or key.capitalize()
+        categories.append({"key": key, "name": name, "count": len(members),
+                           "targets": [target_filename(d) for d in members]})
+    return {"version": SUMMARY_VERSION, "total": len(docs), "categories": categories}
+
+
+def summary_ref(db):
+    return db.collection(SUMMARY_COLLECTION).document(SUMMARY_DOC)
+
+
+def read_summary(db):
+    """The stored summary, or None if there is none."""
+    snap = summary_ref(db).get()
+    return _summary_data(snap)
+
+
+def write_summary(db, summary):
+    from firebase_admin import firestore
+    summary_ref(db).set(dict(summary, updatedAt=firestore.SERVER_TIMESTAMP))
+
+
+def apply_backfill(db, backfill, collection=COLLECTION):
+    """Write `categoryKey` for `[(doc_id, key)]` in batches; returns the number of batches."""
+    col = db.collection(collection)
+    batches = 0
+    for i in range(0, len(backfill), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for doc_id, key in backfill[i:i + MAX_BATCH_WRITES]:
+            batch.update(col.document(doc_id), {KEY_FIELD: key})
+        batch.commit()
+        batches += 1
+    return batches
+
+
+def _summary_data(snap):
+    if snap is None or not getattr(snap, "exists", True):
+        return None
+    data = snap.to_dict()
+    if not data or data.get("version") != SUMMARY_VERSION:
+        return None
+    return data
+
+
+def _same_summary(a, b):
+    strip = lambda s: {k: v for k, v in (s or {}).items() if k != "updatedAt"}  # noqa: E731
+    return a is not None and b is not None and strip(a) == strip(b)
+
+
+class IndexMaintainer:
+    """Keeps `categoryKey` and the summary in step with a full catalog.
+
+    `schedule(docs)` returns at once; `delay` seconds after the first call
+    of a burst the latest `{doc_id: data}` is diffed: missing or stale keys
+    are backfilled and the summary is rewritten if it changed. The
+    backfill comes back through the listener as one more change, which
+    then finds nothing to write.
+    """
+
+    def __init__(self, db_factory, collection=COLLECTION, delay=5.0):
+        self._db_factory = db_factory
+        self._collection = collection
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = None
+        self._summary = None  # last summary stored or seen
+        self.stats = {"backfilled": 0, "summaries": 0, "unchanged": 0, "errors": 0}
+
+    def schedule(self, docs):
+        with self._lock:
+            self._pending = dict(docs)
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            docs, self._pending = self._pending, None
+            self._timer = None
+        if docs is None:
+            return
+        keys, backfill = plan(docs)
+        summary = build_summary(docs, keys)
+        try:
+            db = self._db_factory()
+            if backfill:
+                apply_backfill(db, backfill, self._collection)
+            if self._summary is None:
+                self._summary = read_summary(db)
+                metrics.inc(READS_METRIC, 1, source="summary")
+            if _same_summary(summary, self._summary):
+                changed = False
+            else:
+                write_summary(db, summary)
+                changed = True
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print("Error updating the category index:", e, file=sys.stderr)
+            return
+        with self._lock:
+            self.stats["backfilled"] += len(backfill)
+            if changed:
+                self._summary = summary
+                self.stats["summaries"] += 1
+            else:
+                self.stats["unchanged"] += 1
+        if backfill or changed:
+            print(f"Category index: {len(backfill)} categoryKey(s) backfilled, summary "
+                  f"{'rewritten' if changed else 'unchanged'} ({len(summary['categories'])} categories)",
+                  file=sys.stderr)
+
+    def close(self):
+        """Drop a pending update: it is derived data, the next leader's first read redoes it."""
+        with self._lock:
+            timer, self._timer, self._pending = self._timer, None, None
+        if timer is not None:
+            timer.cancel()
+
+
+class CategoryView(collections.abc.Mapping):
+    """`{category key: [entry, ...]}` over a CategoryCatalog.
+
+    The keys come from the summary; a category's documents are read the
+    first time it is looked up, so listing categories or picking one
+    reads nothing else.
+    """
+
+    def __init__(self, catalog, keys):
+        self._catalog = catalog
+        self._keys = keys
+        self._key_set = frozenset(keys)
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        return self._catalog.category(key)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def loaded_items(self):
+        """(key, entries) of the categories already read, without reading any other."""
+        return self._catalog.loaded_items()
+
+
+class CategoryCatalog:
+    """The catalog read one category at a time, in place of a full CatalogCache.
+
+    The summary document names the categories; each category asked for
+    gets its own CatalogCache over `where("categoryKey", "==", key)`,
+    kept fresh by a listener on that query (or its TTL), and the summary
+    by a listener on its document. `get()` returns a CategoryView.
+
+    It has the members of CatalogCache server.py uses (`get`, `generation`,
+    `loaded`, `counts`, `source`, `listening`, `stats`, `seed`, `touch`,
+    `close`, `on_update`, forwarded from the category caches). Documents
+    need `categoryKey`: run `category_index.py migrate`
+    before switching a deployment to it. `fallback()` returns documents
+    (the catalog snapshot) to serve when Firestore can't be read.
+    """
+
+    def __init__(self, db_factory, resolve, group, collection=COLLECTION,
+                 ttl=300, use_listener=True, clock=time.monotonic, fallback=None):
+        self._db_factory = db_factory
+        self._resolve = resolve
+        self._group = group
+        self._collection = collection
+        self._ttl = ttl
+        self._use_listener = use_listener
+        self._clock = clock
+        self._fallback = fallback
+
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._summary = None  # {key: {"name", "count", "targets"}}
+        self._keys = ()
+        self._loaded_at = None
+        self._listener = None
+        self._categories = {}  # key -> CatalogCache
+        self._summary_stats = {"summary_reads": 0, "summary_errors": 0}
+        self.source = None
+        self.generation = 0
+        self.on_update = None
+
+    @property
+    def listening(self):
+        return self._listener is not None
+
+    @property
+    def loaded(self):
+        with self._lock:
+            return self._summary is not None and self._loaded_at is not None
+
+    @property
+    def stats(self):
+        """The per-category caches' counters summed, plus summary reads and errors."""
+        with self._lock:
+            caches = list(self._categories.values())
+            out = dict(self._summary_stats)
+        for cache in caches:
+            for name, value in cache.stats.items():
+                out[name] = out.get(name, 0) + value
+        return out
+
+    def counts(self):
+        """(models, categories) according to the summary."""
+        with self._lock:
+            summary = self._summary or {}
+            return sum(c["count"] for c in summary.values()), len(summary)
+
+    def get(self):
+        """The CategoryView, reading the summary if needed."""
+        with self._lock:
+            fresh = self._summary is not None and self._loaded_at is not None and \
+                (self._listener is not None or self._clock() - self._loaded_at < self._ttl)
+        if not fresh and self._load_lock.acquire(blocking=self._summary is None):
+            # first load: everyone waits for it; a TTL refresh: one request reads, others serve the old one
+            try:
+                self._refresh_summary()
+            finally:
+                self._load_lock.release()
+        with self._lock:
+            return CategoryView(self, self._keys)
+
+    def category(self, key):
+        """Entries of category `key`, read on first use; [] for a key the summary doesn't list."""
+        with self._lock:
+            if self._summary is None or key not in self._summary:
+                return []
+            cache = self._categories.get(key)
+            if cache is None:
+                cache = self._categories[key] = self._category_cache(key)
+        return cache.get().get(key, [])
+
+    def loaded_items(self):
+        with self._lock:
+            caches = [(key, self._categories[key]) for key in self._keys if key in self._categories]
+        return [(key, cache.get().get(key, [])) for key, cache in caches]
+
+    def seed(self, docs, stale=True):
+        """Serve `docs` (the snapshot) as summary and categories until Firestore is read."""
+        with self._lock:
+            if self.source == "firestore":
+                return False
+        by_key = {}
+        for doc in docs:
+            by_key.setdefault(doc_key(doc.to_dict() or {}), []).append(doc)
+        summary = build_summary({doc.id: doc.to_dict() or {} for doc in docs})
+        self._apply_summary(summary, "snapshot", stale)
+        for key, members in by_key.items():
+            with self._lock:
+                cache = self._categories.get(key)
+                if cache is None:
+                    cache = self._categories[key] = self._category_cache(key)
+            cache.seed(members, stale=stale)
+        return True
+
+    def touch(self):
+        with self._lock:
+            self.generation += 1
+
+    def close(self):
+        with self._lock:
+            listener, self._listener = self._listener, None
+            caches = list(self._categories.values())
+        if listener is not None:
+            try:
+                listener.unsubscribe()
+            except Exception:
+                pass
+        for cache in caches:
+            cache.close()
+
+    def _category_cache(self, key):
+        def fallback():
+            docs = self._fallback() if self._fallback is not None else None
+            if docs is None:
+                return None
+            return [doc for doc in docs if doc_key(doc.to_dict() or {}) == key]
+
+        cache = CatalogCache(self._db_factory, self._resolve, self._group, self._collection,
+                             ttl=self._ttl, use_listener=self._use_listener, clock=self._clock,
+                             fallback=fallback, query=lambda col: col.where(KEY_FIELD, "==", key))
+        cache.on_change = self.touch
+        cache.on_update = self._forward_update
+        return cache
+
+    def _forward_update(self, changed, removed):
+        if self.on_update is not None:
+            self.on_update(changed, removed)
+
+    def _refresh_summary(self):
+        try:
+            with metrics.phase("firestore"):
+                db = self._db_factory()
+                summary = read_summary(db)
+            metrics.inc(READS_METRIC, 1, source="summary")
+            if summary is None:
+                raise LookupError(f"no {SUMMARY_COLLECTION}/{SUMMARY_DOC} summary document; "
+                                  "run `python category_index.py migrate`")
+        except Exception as e:
+            with self._lock:
+                self._summary_stats["summary_errors"] += 1
+                empty = self._summary is None
+            print("Error reading the category summary:", e, file=sys.stderr)
+            if empty:
+                docs = self._fallback() if self._fallback is not None else None
+                if docs is None or not self.seed(docs):
+                    with self._lock:
+                        self._summary = {}
+                        self._keys = ()
+            return False
+        with self._lock:
+            self._summary_stats["summary_reads"] += 1
+        self._apply_summary(summary, "firestore")
+        if self._use_listener and self._listener is None:
+            try:
+                self._listener = summary_ref(db).on_snapshot(self._on_snapshot)
+            except Exception as e:
+                print(f"Notice: summary listener unavailable, using {self._ttl}s TTL refresh - {e}",
+                      file=sys.stderr)
+        return True
+
+    def _on_snapshot(self, docs, changes, read_time):
+        metrics.inc(READS_METRIC, 1, source="listener")
+        summary = _summary_data(docs[0] if docs else None)
+        if summary is not None:
+            self._apply_summary(summary, "firestore")
+
+    def _apply_summary(self, summary, source, stale=False):
+        categories = {c["key"]: {"name": c.get("name"), "count": c.get("count", 0), "targets": c.get("targets", [])}
+                      for c in summary.get("categories", [])}
+        with self._lock:
+            self._loaded_at = self._clock() - (self._ttl if stale else 0)
+            self.source = source
+            if categories == self._summary:
+                return
+            self._summary = categories
+            self._keys = tuple(sorted(categories))
+            gone = [key for key in self._categories if key not in categories]
+            caches = [self._categories.pop(key) for key in gone]
+            self.generation += 1
+        for cache in caches:
+            cache.close()
+            self._forward_update({}, list(cache.documents()))
+
+
+def _init_db():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serviceaccount.json")
+        firebase_admin.initialize_app(credentials.Certificate(cred_path))
+    return firestore.client()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain categoryKey and the meta/categories summary.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_migrate = sub.add_parser("migrate", help="backfill categoryKey on every model, then rewrite the summary")
+    p_migrate.add_argument("--dry-run", action="store_true", help="print the plan without writing")
+    p_summary = sub.add_parser("summary", help="rewrite the summary from the current documents")
+    p_summary.add_argument("--dry-run", action="store_true", help="print the summary without writing")
+    sub.add_parser("show", help="print the stored summary")
+    args = parser.parse_args(argv)
+
+    db = _init_db()
+    if args.command == "show":
+        summary = read_summary(db)
+        if summary is None:
+            raise SystemExit(f"No {SUMMARY_COLLECTION}/{SUMMARY_DOC} summary document")
+        print(json.dumps(summary, indent=2, default=str))
+        return
+
+    docs = {doc.id: doc.to_dict() or {} for doc in db.collection(COLLECTION).select(INDEX_FIELDS).stream()}
+    if args.command == "summary":
+        # the keys the per-category queries match: what is stored, before or after migrate
+        keys, backfill = None, []
+    else:
+        keys, backfill = plan(docs)
+        spellings = collections.Counter((docs[doc_id].get("category"), key) for doc_id, key in backfill)
+        for (raw, key), n in sorted(spellings.items(), key=lambda kv: (kv[0][1], str(kv[0][0]))):
+            print(f"{'Would set' if args.dry_run else 'Setting'} categoryKey '{key}' on {n} model(s) "
+                  f"with category {raw!r}")
+    summary = build_summary(docs, keys)
+    for c in summary["categories"]:
+        print(f"  {c['key']:24} {c['count']:>6} model(s)  ({c['name']})")
+
+    if args.dry_run:
+        batches = -(-len(backfill) // MAX_BATCH_WRITES)
+        print(f"Dry run: {len(backfill)} document(s) to update in {batches} batch(es), "
+              f"summary of {len(summary['categories'])} categories not written.")
+        return
+    batches = apply_backfill(db, backfill) if backfill else 0
+    write_summary(db, summary)
+    print(f"Done. {len(backfill)} document(s) updated in {batches} batch(es), {len(docs) - len(backfill)} "
+          f"already keyed; summary written with {len(summary['categories'])} categories, {len(docs)} model(s).")
+    print(f"Firestore: 1 query / {len(docs)} reads, {len(backfill) + 1} writes.")
+
+
+if __name__ == "__main__":
+    main()
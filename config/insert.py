@@ -1,6 +1,6 @@
 # language: python
 import os
-import time
+import sys
 from pathlib import Path
 from typing import List, Dict, Optional
 
@@ -8,6 +8,9 @@ from google.cloud import storage
 from google.cloud import firestore
 from google.oauth2 import service_account
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from uploader import Uploader  # noqa: E402
+
 # --- CONFIG: update these ---
 SERVICE_ACCOUNT_PATH = r"C:\path\to\serviceAccount.json"  # <-- set path to your service account JSON
 LOCAL_ASSETS_DIR = r"d:\laragon\www\LeARn\assets"         # <-- set folder that contains .glb and .jpg files
@@ -54,62 +57,83 @@ def init_clients(service_account_path: str, bucket_name: str):
     bucket = storage_client.bucket(bucket_name)
     return storage_client, bucket, firestore_client
 
-def find_local_file(base_dir: Path, name: str, ext_choices: List[str]) -> Optional[Path]:
+IMAGE_EXTS = ["jpg", "jpeg", "png", "webp"]
+MODEL_EXTS = ["glb", "gltf", "obj", "fbx"]
+AUDIO_EXTS = ["mp3", "wav", "ogg", "m4a"]
+IN_QUERY_LIMIT = 30      # values per Firestore "in" filter
+MAX_BATCH_WRITES = 500   # Firestore limit per batch
+
+def index_assets(base_dir: Path) -> Dict[str, Dict[str, Path]]:
+    """One pass over the assets folder: {lowercase stem: {lowercase ext: path}}."""
+    index: Dict[str, Dict[str, Path]] = {}
+    with os.scandir(base_dir) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            index.setdefault(stem.lower(), {}).setdefault(ext.lstrip('.').lower(), Path(entry.path))
+    return index
+
+def pick_file(files: Dict[str, Path], ext_choices: List[str]) -> Optional[Path]:
     for ext in ext_choices:
-        p = base_dir / f"{name}.{ext}"
-        if p.exists():
-            return p
-    # try case-insensitive search
-    for p in base_dir.iterdir():
-        if p.is_file() and p.stem.lower() == name.lower() and p.suffix.lstrip('.').lower() in [e.lower() for e in ext_choices]:
-            return p
+        if ext in files:
+            return files[ext]
     return None
 
-def upload_blob(bucket, source_path: Path, dest_path: str) -> str:
-    blob = bucket.blob(dest_path)
-    blob.upload_from_filename(str(source_path))
-    # make public URL pattern for Firebase Storage isn't directly public; return gs path or storage path string
-    # We store the storage path string (same as console path), matching your existing convention like "images/123_name.jpg"
-    return dest_path
-
-def ensure_not_exists(firestore_client, collection: str, name: str) -> bool:
-    # returns True if doc with same name exists
-    q = firestore_client.collection(collection).where("name", "==", name).limit(1).stream()
-    for _ in q:
-        return True
-    return False
+def existing_names(firestore_client, collection: str, names: List[str]) -> set:
+    """Names that already have a document, in one "in" query per IN_QUERY_LIMIT names."""
+    found = set()
+    col = firestore_client.collection(collection)
+    for i in range(0, len(names), IN_QUERY_LIMIT):
+        chunk = names[i:i + IN_QUERY_LIMIT]
+        for doc in col.where("name", "in", chunk).select(["name"]).stream():
+            found.add((doc.to_dict() or {}).get("name"))
+    return found
 
 def create_model_docs(bucket, firestore_client, local_dir: Path, names: List[str]):
+    # We store the storage path string (same as console path), matching the existing convention like "images/<hash>_name.jpg"
+    names = list(dict.fromkeys(names))
+    exists = existing_names(firestore_client, FIRESTORE_COLLECTION, names)
+    assets = index_assets(local_dir)
+
+    # pair files and start every upload before writing anything
+    uploader = Uploader(bucket)
+    pending = []
     for name in names:
-        print(f"Processing: {name}")
-        # check existing
-        if ensure_not_exists(firestore_client, FIRESTORE_COLLECTION, name):
+        if name in exists:
             print(f"  -> Document with name '{name}' already exists in '{FIRESTORE_COLLECTION}', skipping.")
             continue
-
-        # find files
-        img_file = find_local_file(local_dir, name, ["jpg", "jpeg", "png", "webp"])
-        model_file = find_local_file(local_dir, name, ["glb", "gltf", "obj", "fbx"])
+        files = assets.get(name.lower(), {})
+        img_file = pick_file(files, IMAGE_EXTS)
+        model_file = pick_file(files, MODEL_EXTS)
+        audio_file = None if name in AUDIO_MAP else pick_file(files, AUDIO_EXTS)
         if not model_file:
             print(f"  ! No 3D model found for {name}, skipping.")
             continue
         if not img_file:
             print(f"  ! No image found for {name}, continuing without image field.")
-
-        timestamp_ms = int(time.time() * 1000)
-        image_path = None
-        model_path = None
-        if img_file:
-            dest_img = f"images/{timestamp_ms}_{img_file.name}"
-            upload_blob(bucket, img_file, dest_img)
-            image_path = dest_img
-
-        if model_file:
-            dest_model = f"3D/{timestamp_ms}_{model_file.name}"
-            upload_blob(bucket, model_file, dest_model)
-            model_path = dest_model
-
-        audio_path = AUDIO_MAP.get(name)
+        pending.append((
+            name,
+            uploader.submit(model_file, "3D"),
+            uploader.submit(img_file, "images") if img_file else None,
+            uploader.submit(audio_file, "audio") if audio_file else None,
+        ))
+
+    # documents are created in batches as their uploads finish
+    col = firestore_client.collection(FIRESTORE_COLLECTION)
+    batch = firestore_client.batch()
+    in_batch = 0
+    created = 0
+    for name, model_future, img_future, audio_future in pending:
+        model_result = model_future.result()
+        if not model_result.ok:
+            print(f"  ! Upload of {os.path.basename(model_result.local_path)} failed, skipping {name}.")
+            continue
+        img_result = img_future.result() if img_future else None
+        audio_result = audio_future.result() if audio_future else None
+        image_path = img_result.path if img_result and img_result.ok else None
+        model_path = model_result.path
+        audio_path = AUDIO_MAP.get(name) or (audio_result.path if audio_result and audio_result.ok else None)
 
         doc_payload = {
             "name": name,
@@ -125,10 +149,22 @@ def create_model_docs(bucket, firestore_client, local_dir: Path, names: List[str
         if audio_path:
             doc_payload["audio"] = audio_path
 
-        # create doc
-        doc_ref = firestore_client.collection(FIRESTORE_COLLECTION).document()
-        doc_ref.set(doc_payload)
-        print(f"  -> Created doc {doc_ref.id} with model={model_path} image={image_path} audio={audio_path}")
+        doc_ref = col.document()
+        batch.set(doc_ref, doc_payload)
+        in_batch += 1
+        print(f"  -> Queued doc {doc_ref.id} for {name} with model={model_path} image={image_path} audio={audio_path}")
+        if in_batch == MAX_BATCH_WRITES:
+            batch.commit()
+            created += in_batch
+            batch = firestore_client.batch()
+            in_batch = 0
+    if in_batch:
+        batch.commit()
+        created += in_batch
+
+    uploader.shutdown()
+    uploader.report()
+    print(f"Created {created} document(s); {len(exists)} name(s) already existed.")
 
 def main():
     sa = Path(SERVICE_ACCOUNT_PATH)
@@ -0,0 +1,306 @@
+"""Offline optimization of the GLB library into lightweight variants for mobile AR.
+
+For each source model and device class this welds and deduplicates
+vertices, drops unreferenced vertices and unused attributes, decimates
+meshes above the class's triangle budget, downsizes textures, and
+rescales the model to a normalized size using the bounds that
+`glb_scanner` computes. A class whose variant comes out no smaller
+than the source is served the source. Variants are content-addressed
+files in OUT_DIR with a manifest that `server.py` reads to choose a
+variant per request:
+
+    python glb_optimizer.py                      # static/models -> static/models_opt
+    python glb_optimizer.py --source static/cas  # also downloaded models
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from glb_scanner import load_mesh
+from pipeline_manifest import (MANIFEST_NAME, ManifestView, file_sha256, read_manifest, scanned, source_key,
+                               write_json_atomic)
+
+SOURCE_DIRS = ["static/models"]
+OUT_DIR = "static/models_opt"
+PIPELINE_VERSION = 1
+
+# triangle budget per mesh and longest texture edge for each device class
+DEVICE_CLASSES = {
+    "low": {"max_faces": 5000, "max_texture": 512},
+    "mid": {"max_faces": 20000, "max_texture": 1024},
+    "high": {"max_faces": None, "max_texture": 2048},
+}
+# longest edge of the normalized model, in model units
+NORMALIZED_SIZE = 1.0
+
+
+class ModelVariants(ManifestView):
+    """Server-side view of the optimizer manifest: picks a variant per device class."""
+
+    def __init__(self, out_dir, url_prefix, check_interval=5.0):
+        super().__init__(out_dir, url_prefix, check_interval)
+        self._by_src = {}
+
+    def _load(self):
+        # a variant no smaller than its source is never served, even from a manifest written before that rule
+        self._by_src = {"/" + key: {c: v for c, v in m["variants"].items() if v["bytes"] < m["bytes"]}
+                        for key, m in load_manifest(self.out_dir).items()}
+
+    def variant(self, src, device_class):
+        """Manifest entry (`file`, `bytes`, `sha256`, ...) of the variant of `src` for `device_class`, or None."""
+        variants = self._by_src.get(src) if src else None
+        return variants.get(device_class) if variants else None
+
+    def pick(self, src, device_class):
+        """Served URL of the variant of `src` for `device_class`, or None to serve the source."""
+        v = self.variant(src, device_class)
+        return f"{self.url_prefix}/{v['file']}" if v else None
+
+
+def device_class_for(headers, override=None):
+    """Device class of a request from Save-Data, Device-Memory and the User-Agent."""
+    if override in DEVICE_CLASSES:
+        return override
+    if headers.get("Save-Data", "").lower() == "on":
+        return "low"
+    try:
+        memory = float(headers.get("Device-Memory", ""))
+    except ValueError:
+        memory = None
+    if memory is not None:
+        return "low" if memory <= 2 else "mid" if memory <= 4 else "high"
+    ua = headers.get("User-Agent", "")
+    if "Mobi" in ua or "Android" in ua or "iPhone" in ua:
+        return "mid"
+    return "high"
+
+
+def _triangles(scene):
+    return int(sum(len(g.faces) for g in scene.geometry.values() if hasattr(g, "faces")))
+
+
+def _decimate(mesh, max_faces):
+    """Quadric decimation down to `max_faces`, keeping UVs; returns False when it was not possible."""
+    if max_faces is None or len(mesh.faces) <= max_faces:
+        return True
+    import numpy as np
+    import trimesh
+    try:
+        from fast_simplification import replay_simplification, simplify
+    except ImportError:
+        return False
+    vertices = np.ascontiguousarray(mesh.vertices, dtype=np.float64)
+    faces = np.ascontiguousarray(mesh.faces, dtype=np.int32)
+    uv = getattr(mesh.visual, "uv", None)
+    # UV seams are open borders once vertices are welded; keeping borders in place keeps the texture on
+    _, _, collapses = simplify(vertices, faces, target_count=max_faces, return_collapses=True,
+                               preserve_border=uv is not None)
+    points, triangles, mapping = replay_simplification(vertices, faces, collapses)
+    material = getattr(mesh.visual, "material", None)
+    mesh.vertices, mesh.faces = points, triangles
+    if uv is not None:
+        # each remaining vertex takes the UV of the nearest original vertex collapsed into it
+        original = np.flatnonzero(mapping >= 0)
+        distance = np.linalg.norm(vertices[original] - points[mapping[original]], axis=1)
+        order = original[np.lexsort((distance, mapping[original]))]
+        _, first = np.unique(mapping[order], return_index=True)
+        new_uv = np.zeros((len(points), 2))
+        new_uv[mapping[order[first]]] = uv[order[first]]
+        mesh.visual = trimesh.visual.TextureVisuals(uv=new_uv, material=material)
+    return True
+
+
+def _shrink_textures(mesh, max_texture, seen):
+    material = getattr(mesh.visual, "material", None)
+    if material is None or id(material) in seen:
+        return
+    seen.add(id(material))
+    for attr in ("baseColorTexture", "metallicRoughnessTexture", "normalTexture",
+                 "occlusionTexture", "emissiveTexture", "image"):
+        image = getattr(material, attr, None)
+        if image is None or not hasattr(image, "size") or max(image.size) <= max_texture:
+            continue
+        img = image.copy()
+        img.thumbnail((max_texture, max_texture))
+        setattr(material, attr, img)
+
+
+def optimize_scene(path, device_class):
+    """Load `path` and return (glb_bytes, stats) for one device class."""
+    import numpy as np
+    import trimesh
+
+    settings = DEVICE_CLASSES[device_class]
+    scene = load_mesh(path, force_mesh=False)
+    if isinstance(scene, trimesh.Trimesh):
+        scene = trimesh.Scene(scene)
+    faces_before = _triangles(scene)
+    skipped = []
+    seen_materials = set()
+    for name, mesh in scene.geometry.items():
+        if not isinstance(mesh, trimesh.Trimesh):
+            continue
+        mesh.merge_vertices()
+        mesh.update_faces(mesh.nondegenerate_faces())
+        mesh.update_faces(mesh.unique_faces())
+        mesh.remove_unreferenced_vertices()
+        # vertex colors are unused once a texture is applied; custom attributes never are
+        if getattr(mesh.visual, "uv", None) is not None:
+            mesh.vertex_attributes.pop("color", None)
+        for key in [k for k in mesh.vertex_attributes if k.startswith("_")]:
+            mesh.vertex_attributes.pop(key, None)
+        mesh.metadata.pop("extras", None)
+        if not _decimate(mesh, settings["max_faces"]):
+            skipped.append(name)
+        _shrink_textures(mesh, settings["max_texture"], seen_materials)
+
+    # normalized scale: longest edge NORMALIZED_SIZE, centered on x/z, resting on y=0
+    bounds = scene.bounds
+    extents = bounds[1] - bounds[0]
+    scale = NORMALIZED_SIZE / float(max(extents)) if max(extents) > 0 else 1.0
+    center = (bounds[0] + bounds[1]) / 2.0
+    transform = np.eye(4)
+    transform[:3, :3] *= scale
+    transform[:3, 3] = -np.array([center[0], bounds[0][1], center[2]]) * scale
+    scene.apply_transform(transform)
+
+    data = scene.export(file_type="glb")
+    return data, {
+        "triangles_before": faces_before,
+        "triangles": _triangles(scene),
+        "scale": scale,
+        "decimation_skipped": skipped,
+    }
+
+
+def optimize_file(path, out_dir, classes):
+    """Build every variant of one source file. Runs in a worker process.
+
+    Returns (variants, classes served the source, seconds): a variant no
+    smaller than the source would only cost those devices more bytes.
+    """
+    start = time.perf_counter()
+    source_bytes = os.path.getsize(path)
+    variants = {}
+    source_classes = []
+    for device_class in classes:
+        data, stats = optimize_scene(path, device_class)
+        if len(data) >= source_bytes:
+            source_classes.append(device_class)
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        filename = f"{digest}.glb"
+        dest = os.path.join(out_dir, filename)
+        if not os.path.exists(dest):
+            tmp = dest + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, dest)
+        variants[device_class] = dict(stats, file=filename, bytes=len(data), sha256=digest)
+    return variants, source_classes, time.perf_counter() - start
+
+
+def load_manifest(out_dir):
+    return read_manifest(out_dir, PIPELINE_VERSION).get("models", {})
+
+
+def _files_exist(model, out_dir):
+    return all(os.path.exists(os.path.join(out_dir, v["file"])) for v in model.get("variants", {}).values())
+
+
+def run(source_dirs=SOURCE_DIRS, out_dir=OUT_DIR, classes=None, workers=None):
+    classes = classes or list(DEVICE_CLASSES)
+    os.makedirs(out_dir, exist_ok=True)
+    previous = load_manifest(out_dir)
+    models = {}
+    todo = []
+    for source_dir in source_dirs:
+        if not os.path.isdir(source_dir):
+            continue
+        for root, _, files in os.walk(source_dir):
+            for name in sorted(files):
+                if not name.lower().endswith(".glb"):
+                    continue
+                path = os.path.join(root, name)
+                key = source_key(path)
+                sha = file_sha256(path)
+                prev = previous.get(key)
+                built = set(prev.get("variants", {})) | set(prev.get("source_classes", ())) if prev else set()
+                if prev and prev.get("sha256") == sha and built >= set(classes) and _files_exist(prev, out_dir):
+                    models[key] = prev
+                else:
+                    todo.append((key, path, sha))
+
+    errors = {}
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or min(len(todo), os.cpu_count() or 1)) as pool:
+            futures = {pool.submit(optimize_file, path, out_dir, classes): (key, path, sha)
+                       for key, path, sha in todo}
+            for fut in as_completed(futures):
+                key, path, sha = futures[fut]
+                try:
+                    variants, source_classes, seconds = fut.result()
+                except Exception as e:
+                    errors[key] = f"{type(e).__name__}: {e}"
+                    continue
+                models[key] = {"sha256": sha, "bytes": os.path.getsize(path), "variants": variants,
+                               "source_classes": source_classes, "seconds": round(seconds, 3)}
+    # models under folders this run did not scan (`--source static/cas` alone) keep their variants
+    for key, prev in previous.items():
+        if key not in models and not scanned(key, source_dirs) and _files_exist(prev, out_dir):
+            models[key] = prev
+
+    write_json_atomic(os.path.join(out_dir, MANIFEST_NAME),
+                      {"version": PIPELINE_VERSION, "classes": DEVICE_CLASSES, "models": models})
+
+    live = {v["file"] for m in models.values() for v in m["variants"].values()} | {MANIFEST_NAME}
+    for name in os.listdir(out_dir):
+        if name not in live:
+            os.remove(os.path.join(out_dir, name))
+    return models, errors, len(todo)
+
+
+def print_report(models, errors, built):
+    print(f"{'model':40} {'class':5} {'bytes':>10} {'saved':>7} {'tris':>8} {'saved':>7}")
+    totals = {}
+    for key in sorted(models):
+        m = models[key]
+        for device_class, v in m["variants"].items():
+            saved_bytes = 1 - v["bytes"] / m["bytes"] if m["bytes"] else 0
+            before = v["triangles_before"]
+            saved_tris = 1 - v["triangles"] / before if before else 0
+            print(f"{os.path.basename(key)[:40]:40} {device_class:5} {v['bytes']:>10} {saved_bytes:>6.0%} "
+                  f"{v['triangles']:>8} {saved_tris:>6.0%}")
+            t = totals.setdefault(device_class, [0, 0])
+            t[0] += m["bytes"]
+            t[1] += v["bytes"]
+        for device_class in m.get("source_classes", ()):
+            print(f"{os.path.basename(key)[:40]:40} {device_class:5} {'source':>10} {0:>6.0%}")
+            t = totals.setdefault(device_class, [0, 0])
+            t[0] += m["bytes"]
+            t[1] += m["bytes"]
+    for device_class, (before, after) in totals.items():
+        print(f"{device_class}: {before} -> {after} bytes ({1 - after / before if before else 0:.0%} saved)")
+    for key, error in sorted(errors.items()):
+        print(f"Error optimizing {key}: {error}", file=sys.stderr)
+    print(f"Optimized {built - len(errors)} model(s), {len(models) - (built - len(errors))} unchanged, "
+          f"{len(errors)} failed", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build lightweight GLB variants per device class.")
+    parser.add_argument("--source", action="append", help="source folder (repeatable)")
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--classes", default=",".join(DEVICE_CLASSES))
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    classes = [c for c in args.classes.split(",") if c in DEVICE_CLASSES]
+    models, errors, built = run(args.source or SOURCE_DIRS, args.out, classes, args.workers)
+    print_report(models, errors, built)
+
+
+if __name__ == "__main__":
+    main()
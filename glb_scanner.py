@@ -0,0 +1,215 @@
+"""Incremental, parallel scanner for the GLB model library.
+
+Mesh analysis (`trimesh.load`) runs in a process pool, and results are
+cached by file path + mtime + size (optionally sha256), so a re-run only
+loads models that changed. `scan.py` and `mdlrdr.py` are entry points to
+this module:
+
+    python glb_scanner.py --layout combined   # what scan.py writes
+    python glb_scanner.py --layout flat       # what mdlrdr.py writes
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline_manifest import file_sha256, write_json_atomic
+
+GLB_FOLDER = "assets/glb"
+THUMB_FOLDER = "assets/thumb"
+SOUND_FOLDER = "assets/sounds"
+OUTPUT_PATH = "glb_model_info.json"
+CACHE_PATH = "cache/glb_scan_cache.json"
+AUDIO_EXTS = {".wav", ".mp3", ".ogg", ".flac", ".m4a", ".aac"}
+CACHE_VERSION = 1
+
+
+def load_mesh(path, force_mesh=True):
+    import trimesh  # heavy; only workers and the optimizer need it
+    if force_mesh:
+        return trimesh.load(path, force="mesh")
+    return trimesh.load(path)
+
+
+def analyze_glb(path, force_mesh=True):
+    """Bounds/size/center of one model. Runs in a worker process."""
+    start = time.perf_counter()
+    mesh = load_mesh(path, force_mesh)
+    info = {
+        "bounds": mesh.bounds.tolist() if getattr(mesh, "bounds", None) is not None else None,
+        "size": mesh.extents.tolist() if getattr(mesh, "extents", None) is not None else None,
+        "center": mesh.centroid.tolist() if getattr(mesh, "centroid", None) is not None else None,
+    }
+    return info, time.perf_counter() - start
+
+
+def _load_cache(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def _fingerprint(path, use_sha):
+    st = os.stat(path)
+    fp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    if use_sha:
+        fp["sha256"] = file_sha256(path)
+    return fp
+
+
+def _cache_key(name, force_mesh):
+    return f"{name}|{'mesh' if force_mesh else 'scene'}"
+
+
+def _unchanged(cached, fp, force_mesh):
+    if cached is None or cached.get("force_mesh") != force_mesh:
+        return False
+    if "sha256" in fp:
+        return cached.get("sha256") == fp["sha256"] and cached.get("size") == fp["size"]
+    return cached.get("mtime_ns") == fp["mtime_ns"] and cached.get("size") == fp["size"]
+
+
+def scan_glb_folder(folder=GLB_FOLDER, cache_path=CACHE_PATH, workers=None, force_mesh=True,
+                    use_sha=False, on_result=None):
+    """Analyze every .glb in `folder`, reusing cached results for unchanged files.
+
+    Returns (model_info, errors, summary) where model_info maps filename to
+    its bounds/size/center, errors maps filename to the load error and
+    summary holds counts and timings. `on_result(filename, info, error)` is
+    called in sorted filename order once everything is known.
+    """
+    start = time.perf_counter()
+    if not os.path.isdir(folder):
+        return {}, {}, {"files": 0, "cached": 0, "analyzed": 0, "failed": 0, "load_seconds": 0.0,
+                        "slowest": None, "seconds": 0.0}
+
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith(".glb"))
+    cache = _load_cache(cache_path)
+    new_cache = {}
+    results = {}
+    todo = []
+    for name in names:
+        path = os.path.join(folder, name)
+        fp = _fingerprint(path, use_sha)
+        cached = cache.get(_cache_key(name, force_mesh))
+        if _unchanged(cached, fp, force_mesh):
+            new_cache[_cache_key(name, force_mesh)] = cached
+            results[name] = (cached.get("info"), cached.get("error"))
+        else:
+            todo.append((name, path, fp))
+
+    load_seconds = 0.0
+    slowest = None
+    if todo:
+        max_workers = workers or min(len(todo), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(analyze_glb, path, force_mesh): (name, fp) for name, path, fp in todo}
+            for fut in as_completed(futures):
+                name, fp = futures[fut]
+                try:
+                    info, seconds = fut.result()
+                    error = None
+                    load_seconds += seconds
+                    if slowest is None or seconds > slowest[1]:
+                        slowest = (name, seconds)
+                except Exception as e:
+                    info, error = None, f"{type(e).__name__}: {e}"
+                results[name] = (info, error)
+                # failures are cached too, so a broken file isn't reloaded until it changes
+                new_cache[_cache_key(name, force_mesh)] = dict(fp, force_mesh=force_mesh, info=info, error=error)
+
+    # keep the other load mode's entries (scan.py and mdlrdr.py share the cache)
+    other = {k: v for k, v in cache.items() if v.get("force_mesh") != force_mesh and k.split("|", 1)[0] in names}
+    write_json_atomic(cache_path, {"version": CACHE_VERSION, "files": dict(other, **new_cache)}, indent=None)
+
+    model_info = {}
+    errors = {}
+    for name in names:
+        info, error = results[name]
+        if error is None:
+            model_info[name] = info
+        else:
+            errors[name] = error
+        if on_result is not None:
+            on_result(name, info, error)
+
+    summary = {
+        "files": len(names),
+        "cached": len(names) - len(todo),
+        "analyzed": len(todo),
+        "failed": len(errors),
+        "load_seconds": round(load_seconds, 3),
+        "slowest": slowest[0] if slowest else None,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return model_info, errors, summary
+
+
+def list_files(folder, exts=None):
+    if not os.path.isdir(folder):
+        return []
+    out = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.startswith("."):
+            continue
+        if exts is None or os.path.splitext(filename)[1].lower() in exts:
+            out.append(filename)
+    return out
+
+
+def print_summary(summary):
+    print(f"Scanned {summary['files']} GLB file(s) in {summary['seconds']:.2f}s: "
+          f"{summary['analyzed']} analyzed ({summary['load_seconds']:.2f}s of mesh loading), "
+          f"{summary['cached']} unchanged, {summary['failed']} failed", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan assets/glb and write glb_model_info.json.")
+    parser.add_argument("--layout", choices=["combined", "flat"], default="combined",
+                        help="combined: models/thumbs/sounds (scan.py); flat: models only (mdlrdr.py)")
+    parser.add_argument("--folder", default=GLB_FOLDER)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sha256", action="store_true", help="detect changes by content hash, not mtime")
+    args = parser.parse_args(argv)
+
+    if args.layout == "combined":
+        # filenames only on stdout
+        def report(name, info, error):
+            if error is None:
+                print(name)
+
+        model_info, _, summary = scan_glb_folder(args.folder, args.cache, args.workers, force_mesh=True,
+                                                 use_sha=args.sha256, on_result=report)
+        thumb_files = list_files(THUMB_FOLDER)
+        for filename in thumb_files:
+            print(filename)
+        sound_files = list_files(SOUND_FOLDER, AUDIO_EXTS)
+        for filename in sound_files:
+            print(filename)
+        out = {"models": model_info, "thumbs": thumb_files, "sounds": sound_files}
+    else:
+        def report(name, info, error):
+            if error is None:
+                print(f"{name}: size={info['size']}, center={info['center']}")
+            else:
+                print(f"Error loading {name}: {error}")
+
+        out, _, summary = scan_glb_folder(args.folder, args.cache, args.workers, force_mesh=False,
+                                          use_sha=args.sha256, on_result=report)
+
+    write_json_atomic(args.output, out)
+    print_summary(summary)
+    return out
+
+
+if __name__ == "__main__":
+    main()
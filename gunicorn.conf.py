@@ -0,0 +1,32 @@
+"""Production launcher settings for the threaded Flask app (server.py).
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py server:app
+
+Each worker starts its warmup (Firebase, catalog, asset downloads) as
+soon as it has imported the app, so it is warm before the load balancer
+sends it traffic; point the readiness probe at /readyz and the liveness
+probe at /healthz. The app is not preloaded in the master: the Firestore
+client's gRPC threads do not survive a fork.
+"""
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:" + os.environ.get("PORT", "5000"))
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+# workers share one asset manifest, one download per url and one Firestore catalog reader
+if workers > 1:
+    os.environ.setdefault("SHARED_CACHE", "cache/shared.sqlite3")
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+max_requests = int(os.environ.get("MAX_REQUESTS", "20000"))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    import server
+    server.start_warmup()
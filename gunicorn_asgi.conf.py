@@ -0,0 +1,30 @@
+"""Production launcher settings for the ASGI app (asgi_app.py).
+
+    pip install gunicorn uvicorn
+    gunicorn -c gunicorn_asgi.conf.py asgi_app:app
+
+One event loop per worker process, each with its own catalog cache and
+Firestore clients. SIGTERM (or SIGHUP for a rolling restart) stops
+accepting connections, lets in-flight requests finish for up to
+GRACEFUL_TIMEOUT seconds, and then runs the app's lifespan shutdown,
+which writes the pending activations.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:" + os.environ.get("PORT", "5000"))
+# the loop does the I/O waiting, so workers only need to cover the CPU cores
+workers = int(os.environ.get("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+# workers share one asset manifest, one download per url and one Firestore catalog reader
+if workers > 1:
+    os.environ.setdefault("SHARED_CACHE", "cache/shared.sqlite3")
+# recycle workers now and then so a slow leak cannot grow without bound
+max_requests = int(os.environ.get("MAX_REQUESTS", "20000"))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# behind a proxy, so request.host_url (used for the Scene Viewer links) is the public one
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+accesslog = "-"
@@ -0,0 +1,246 @@
+"""Responsive derivatives of the catalog's display images and target cards.
+
+For every source image this writes resized WebP (and AVIF, when Pillow
+was built with it) copies at a few widths, without metadata, and records
+the source dimensions and a tiny inline placeholder (LQIP). Derivatives
+are named after the source's sha256, so unchanged or duplicate images
+are never re-encoded. `server.py` reads the manifest to add `srcset`
+data to catalog entries:
+
+    python image_derivatives.py                      # static/images, static/targets, static/cas
+    python image_derivatives.py --source static/images --widths 96,192
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline_manifest import (MANIFEST_NAME, ManifestView, file_sha256, read_manifest, scanned, source_key,
+                               write_json_atomic)
+
+SOURCE_DIRS = ["static/images", "static/targets", "static/cas"]
+OUT_DIR = "static/images_opt"
+PIPELINE_VERSION = 1
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+# the scan card shows images at 96 CSS px (72 on phones); these cover 1x-4x screens
+WIDTHS = [96, 192, 384, 768]
+QUALITY = {"webp": 78, "avif": 55}
+PLACEHOLDER_WIDTH = 16
+# rendered width of the scan card image, for the `sizes` attribute
+CARD_SIZES = "(max-width: 600px) 72px, 96px"
+
+
+def available_formats():
+    """Encoders this Pillow build has, best first."""
+    from PIL import features
+    formats = []
+    if features.check("avif"):
+        formats.append("avif")
+    if features.check("webp"):
+        formats.append("webp")
+    return formats
+
+
+class ImageDerivatives(ManifestView):
+    """Server-side view of the derivatives manifest: srcset data per served image path."""
+
+    def __init__(self, out_dir, url_prefix, check_interval=5.0):
+        super().__init__(out_dir, url_prefix, check_interval)
+        self._by_src = {}
+
+    def _load(self):
+        self._by_src = {"/" + key: self._responsive(rec) for key, rec in load_manifest(self.out_dir).items()}
+
+    def responsive(self, local):
+        """{"srcset": {format: srcset}, "sizes", "width", "height", "placeholder"} for a served path, or None."""
+        return self._by_src.get(local) if local else None
+
+    def _responsive(self, rec):
+        srcset = {}
+        for fmt, variants in rec["variants"].items():
+            srcset[fmt] = ", ".join(f"{self.url_prefix}/{v['file']} {v['width']}w" for v in variants)
+        return {
+            "srcset": srcset,
+            "sizes": CARD_SIZES,
+            "width": rec["width"],
+            "height": rec["height"],
+            "placeholder": rec["placeholder"],
+        }
+
+
+def _prepare(img):
+    from PIL import ImageOps
+    img = ImageOps.exif_transpose(img)  # bake in the orientation before EXIF is dropped
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    return img.convert("RGBA" if has_alpha else "RGB")
+
+
+def _encode(img, fmt, quality):
+    buf = io.BytesIO()
+    options = {"method": 6} if fmt == "webp" else {}
+    # no exif/icc_profile/xmp arguments: the derivatives carry pixels only
+    img.save(buf, format=fmt.upper(), quality=quality, **options)
+    return buf.getvalue()
+
+
+def placeholder(img):
+    """A ~16px wide WebP as a data: URI, shown blurred while the real image loads."""
+    from PIL import Image
+    small = img.copy()
+    small.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH), Image.LANCZOS)
+    fmt = "webp" if "webp" in available_formats() else "jpeg"
+    if fmt == "jpeg":
+        small = small.convert("RGB")
+    data = _encode(small, fmt, 40)
+    return f"data:image/{fmt};base64," + base64.b64encode(data).decode("ascii")
+
+
+def build_derivatives(path, sha, out_dir, widths, formats):
+    """Encode every width/format of one source. Runs in a worker process."""
+    from PIL import Image
+
+    start = time.perf_counter()
+    with Image.open(path) as src:
+        img = _prepare(src)
+    width, height = img.size
+    # never upscale; a source narrower than the largest width is kept at its own width
+    targets = sorted({w for w in widths if w < width} | ({width} if width <= max(widths) else set()))
+    variants = {}
+    written = 0
+    for fmt in formats:
+        out = []
+        for w in targets:
+            filename = f"{sha[:16]}-{w}w.{fmt}"
+            dest = os.path.join(out_dir, filename)
+            if not os.path.exists(dest):
+                resized = img if w == width else img.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+                data = _encode(resized, fmt, QUALITY[fmt])
+                tmp = dest + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, dest)
+                written += 1
+            out.append({"file": filename, "width": w, "bytes": os.path.getsize(dest)})
+        variants[fmt] = out
+    rec = {"width": width, "height": height, "placeholder": placeholder(img), "variants": variants}
+    return rec, written, time.perf_counter() - start
+
+
+def load_manifest(out_dir):
+    return read_manifest(out_dir, PIPELINE_VERSION).get("images", {})
+
+
+def _files_exist(rec, out_dir):
+    return all(os.path.exists(os.path.join(out_dir, v["file"])) for vs in rec["variants"].values() for v in vs)
+
+
+def run(source_dirs=SOURCE_DIRS, out_dir=OUT_DIR, widths=WIDTHS, formats=None, workers=None):
+    formats = formats or available_formats()
+    os.makedirs(out_dir, exist_ok=True)
+    previous = load_manifest(out_dir)
+    previous_by_sha = {rec["sha256"]: rec for rec in previous.values()}
+    images = {}
+    todo = {}  # sha -> (path, [keys])
+    for source_dir in source_dirs:
+        if not os.path.isdir(source_dir):
+            continue
+        for root, _, files in os.walk(source_dir):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in IMAGE_EXTS:
+                    continue
+                path = os.path.join(root, name)
+                key = source_key(path)
+                sha = file_sha256(path)
+                prev = previous_by_sha.get(sha)
+                if prev and prev.get("widths") == list(widths) and set(prev["variants"]) == set(formats) and \
+                        _files_exist(prev, out_dir):
+                    images[key] = dict(prev, bytes=os.path.getsize(path))
+                elif sha in todo:
+                    todo[sha][1].append(key)
+                else:
+                    todo[sha] = (path, [key])
+
+    errors = {}
+    encoded = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or min(len(todo), os.cpu_count() or 1)) as pool:
+            futures = {pool.submit(build_derivatives, path, sha, out_dir, widths, formats): (sha, path, keys)
+                       for sha, (path, keys) in todo.items()}
+            for fut in as_completed(futures):
+                sha, path, keys = futures[fut]
+                try:
+                    rec, written, seconds = fut.result()
+                except Exception as e:
+                    for key in keys:
+                        errors[key] = f"{type(e).__name__}: {e}"
+                    continue
+                encoded += written
+                for key in keys:
+                    images[key] = dict(rec, sha256=sha, widths=list(widths), bytes=os.path.getsize(path),
+                                       seconds=round(seconds, 3))
+    # images under folders this run did not scan (`--source static/images` alone) keep their derivatives
+    for key, prev in previous.items():
+        if key not in images and not scanned(key, source_dirs) and _files_exist(prev, out_dir):
+            images[key] = prev
+
+    write_json_atomic(os.path.join(out_dir, MANIFEST_NAME),
+                      {"version": PIPELINE_VERSION, "widths": list(widths), "formats": formats, "images": images})
+
+    live = {v["file"] for rec in images.values() for vs in rec["variants"].values() for v in vs} | {MANIFEST_NAME}
+    for name in os.listdir(out_dir):
+        if name not in live:
+            os.remove(os.path.join(out_dir, name))
+    return images, errors, sum(len(keys) for _, keys in todo.values()), encoded
+
+
+def print_report(images, errors, built, encoded):
+    print(f"{'image':40} {'bytes':>9} " + " ".join(f"{fmt + '@' + str(w):>10}" for fmt, w in _columns(images)))
+    total_src = 0
+    total_small = 0
+    for key in sorted(images):
+        rec = images[key]
+        sizes = {(fmt, v["width"]): v["bytes"] for fmt, vs in rec["variants"].items() for v in vs}
+        print(f"{os.path.basename(key)[:40]:40} {rec['bytes']:>9} " +
+              " ".join(f"{sizes.get(col, ''):>10}" for col in _columns(images)))
+        smallest = min(sizes.values()) if sizes else rec["bytes"]
+        total_src += rec["bytes"]
+        total_small += smallest
+    if total_src:
+        print(f"Smallest derivatives total {total_small} bytes vs {total_src} bytes of sources "
+              f"({1 - total_small / total_src:.0%} saved)")
+    for key, error in sorted(errors.items()):
+        print(f"Error processing {key}: {error}", file=sys.stderr)
+    print(f"Processed {built} new source(s) ({encoded} file(s) encoded), "
+          f"{len(images) - built} unchanged, {len(errors)} failed", file=sys.stderr)
+
+
+def _columns(images):
+    cols = set()
+    for rec in images.values():
+        for fmt, vs in rec["variants"].items():
+            cols.update((fmt, v["width"]) for v in vs if v["width"] in WIDTHS)
+    return sorted(cols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build responsive WebP/AVIF derivatives of catalog images.")
+    parser.add_argument("--source", action="append", help="source folder (repeatable)")
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--widths", default=",".join(str(w) for w in WIDTHS))
+    parser.add_argument("--formats", default=None, help="comma-separated subset of avif,webp")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    widths = sorted({int(w) for w in args.widths.split(",") if w.strip()})
+    formats = available_formats()
+    if args.formats:
+        formats = [f for f in args.formats.split(",") if f in formats]
+    images, errors, built, encoded = run(args.source or SOURCE_DIRS, args.out, widths, formats, args.workers)
+    print_report(images, errors, built, encoded)
+
+
+if __name__ == "__main__":
+    main()
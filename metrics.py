@@ -0,0 +1,188 @@
+"""Request phase timers and Prometheus-format metrics, without a client library.
+
+    with metrics.phase("firestore"):        # per-request phase, plus a process-wide histogram
+        docs = list(col.stream())
+    metrics.inc("firestore_docs_read_total", len(docs))
+    metrics.observe("http_request_duration_seconds", 0.12, route="/", method="GET", status="200")
+    metrics.add_collector(fn)               # fn() yields (name, labels, value) at scrape time
+    metrics.render()                        # text exposition for /metrics
+
+The phases of the current request are kept in a context variable, so
+they work the same on request threads and on the ASGI event loop.
+server.py turns them into the Server-Timing header and a JSON log line
+per request.
+"""
+import bisect
+import contextlib
+import contextvars
+import sys
+import threading
+import time
+
+PREFIX = "learn_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_types = {}  # name -> (type, help, buckets)
+_values = {}  # (name, labels) -> float, for counters and gauges
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_collectors = []
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def describe(name, kind, help_text, buckets=DEFAULT_BUCKETS):
+    """Declare a metric: `kind` is counter, gauge or histogram."""
+    with _lock:
+        _types[name] = (kind, help_text, tuple(buckets))
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _values[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        buckets = _types.get(name, (None, None, DEFAULT_BUCKETS))[2]
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(buckets) + 3)  # buckets, +Inf, sum, count
+        hist[bisect.bisect_left(buckets, value)] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def add_collector(fn):
+    """Register `fn() -> iterable of (name, labels, value)`, sampled on every scrape."""
+    with _lock:
+        _collectors.append(fn)
+
+
+class RequestTimings:
+    """Phases of one request, in the order they first ran."""
+
+    __slots__ = ("start", "phases")
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total=None):
+        """Server-Timing header value: one entry per phase plus the total, in milliseconds."""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        parts.append(f"total;dur={(self.elapsed() if total is None else total) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def start_request(start=None):
+    """Begin collecting phases for the current request (a no-op if already begun)."""
+    timings = _current.get()
+    if timings is None:
+        timings = RequestTimings(start)
+        _current.set(timings)
+    return timings
+
+
+def current_request():
+    return _current.get()
+
+
+def finish_request():
+    _current.set(None)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a block: added to the current request's phases and to `phase_duration_seconds`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, seconds)
+        observe("phase_duration_seconds", seconds, phase=name)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        collectors = list(_collectors)
+    sampled = {}
+    for fn in collectors:
+        try:
+            for name, labels, value in fn():
+                sampled[_key(name, labels)] = value
+        except Exception as e:
+            print("Error collecting metrics:", e, file=sys.stderr)
+
+    with _lock:
+        values = dict(_values)
+        values.update(sampled)
+        histograms = {key: list(hist) for key, hist in _histograms.items()}
+        types = dict(_types)
+
+    by_name = {}
+    for (name, labels), value in values.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), hist in histograms.items():
+        by_name.setdefault(name, []).append((labels, hist))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text, buckets = types.get(name, ("untyped", None, DEFAULT_BUCKETS))
+        full = PREFIX + name
+        if help_text:
+            lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind != "histogram":
+                lines.append(f"{full}{_format_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), value[:-2]):
+                cumulative += count
+                lines.append(f"{full}_bucket{_format_labels(labels, [('le', _number(float(bound)))])} {cumulative}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {_number(value[-2])}")
+            lines.append(f"{full}_count{_format_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+describe("http_request_duration_seconds", "histogram", "Request latency by route, method and status.")
+describe("phase_duration_seconds", "histogram", "Time spent in each instrumented phase.")
+describe("firestore_docs_read_total", "counter", "Documents returned by Firestore reads.")
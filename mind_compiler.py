@@ -0,0 +1,157 @@
+import contextlib
+import hashlib
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_COMMAND = "node scripts/compile-mind.mjs {output} {inputs}"
+
+
+class MindCompiler:
+    """Builds MindAR `.mind` target files per category and caches them on disk.
+
+    The targets are compiled in the exact order the category's models are
+    served in, so `targetIndex` N on the page is always model N. Artifacts
+    are named after a key hashed from the ordered target contents, and a
+    category is only recompiled when a target image, the order or the
+    compiler changes.
+
+    `command` is a shell-style template with `{output}` and `{inputs}`
+    placeholders. Pass `compile_fn(paths, output_path)` instead to plug in
+    another compiler.
+    """
+
+    def __init__(self, static_root, out_dir, url_prefix, command=DEFAULT_COMMAND, compile_fn=None,
+                 cwd=None, timeout=900):
+        self.static_root = static_root
+        self.out_dir = out_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.command = command
+        self.compile_fn = compile_fn
+        self.cwd = cwd
+        self.timeout = timeout
+        os.makedirs(out_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mind-compile")
+        self._lock = threading.Lock()
+        self._scheduled = {}  # artifact name -> Future
+        self._failed = set()
+        self._hashes = {}  # path -> (mtime_ns, size, sha256)
+        self.on_compiled = None
+        # lock_for(name) -> context manager held around a compile, so worker processes
+        # sharing out_dir compile each artifact once (server.py passes a SharedCache lock)
+        self.lock_for = None
+
+    def target_paths(self, models):
+        """Local files of the models' target cards in served order, or None if any is missing."""
+        paths = []
+        for m in models:
+            local = m.targetCard.local or ""
+            if not local.startswith("/static/"):
+                return None
+            path = os.path.join(self.static_root, *local[len("/static/"):].split("/"))
+            if not os.path.isfile(path):
+                return None
+            paths.append(path)
+        return paths
+
+    def cache_key(self, paths):
+        h = hashlib.sha256()
+        if self.compile_fn is None:
+            compiler = self.command
+        else:
+            compiler = f"{self.compile_fn.__module__}.{self.compile_fn.__qualname__}"
+        h.update(compiler.encode("utf-8"))
+        for path in paths:
+            h.update(b"\0" + self._file_hash(path).encode("ascii"))
+        return h.hexdigest()
+
+    def lookup(self, category, models):
+        """Served URL of the category's .mind file, or None if it is not built yet.
+
+        A missing artifact is scheduled for compilation in the background;
+        `on_compiled(category)` is called once it lands.
+        """
+        if not models:
+            return None
+        paths = self.target_paths(models)
+        if paths is None:
+            return None
+        name = f"{category}-{self.cache_key(paths)[:20]}.mind"
+        if os.path.isfile(os.path.join(self.out_dir, name)):
+            return f"{self.url_prefix}/{name}"
+        with self._lock:
+            if name not in self._scheduled and name not in self._failed:
+                self._scheduled[name] = self._executor.submit(self._compile, category, name, paths)
+        return None
+
+    def compile(self, paths, output_path):
+        """Compile `paths` into `output_path` (atomically)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.out_dir, suffix=".mind.tmp")
+        os.close(fd)
+        try:
+            if self.compile_fn is not None:
+                self.compile_fn(paths, tmp_path)
+            else:
+                args = []
+                for part in shlex.split(self.command):
+                    if part == "{inputs}":
+                        args.extend(paths)
+                    else:
+                        args.append(part.replace("{output}", tmp_path))
+                subprocess.run(args, cwd=self.cwd, check=True, timeout=self.timeout,
+                               stdout=subprocess.DEVNULL)
+            if os.path.getsize(tmp_path) == 0:
+                raise RuntimeError("compiler produced an empty file")
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _compile(self, category, name, paths):
+        output = os.path.join(self.out_dir, name)
+        lock = self.lock_for(name) if self.lock_for is not None else contextlib.nullcontext()
+        try:
+            with lock:
+                # another worker process may have built it while we waited
+                if not os.path.isfile(output):
+                    self.compile(paths, output)
+                    print(f"Compiled {name} from {len(paths)} target(s)", file=sys.stderr)
+        except Exception as e:
+            # don't retry the same inputs on every request; a changed target gets a new name
+            with self._lock:
+                self._failed.add(name)
+            print(f"Warning: failed to compile {name} - {e}", file=sys.stderr)
+            return
+        finally:
+            with self._lock:
+                self._scheduled.pop(name, None)
+        self._prune(category, keep=name)
+        if self.on_compiled is not None:
+            self.on_compiled(category)
+
+    def _prune(self, category, keep):
+        for name in os.listdir(self.out_dir):
+            key = name[len(category) + 1:-len(".mind")]
+            if name != keep and name.startswith(category + "-") and name.endswith(".mind") \
+                    and len(key) == 20 and all(c in "0123456789abcdef" for c in key):
+                try:
+                    os.remove(os.path.join(self.out_dir, name))
+                except OSError:
+                    pass
+
+    def _file_hash(self, path):
+        st = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
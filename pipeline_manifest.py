@@ -0,0 +1,100 @@
+"""Files and manifests shared by the offline asset pipelines.
+
+glb_optimizer, image_derivatives and audio_pipeline each write
+content-addressed outputs plus a versioned MANIFEST_NAME into their
+output folder. Each one's server-side view (ModelVariants,
+ImageDerivatives, AudioVariants) is a ManifestView that re-reads the
+manifest when a pipeline run rewrites it:
+
+    class ModelVariants(ManifestView):
+        def _load(self):
+            self._by_src = {...load_manifest(self.out_dir)...}
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_json_atomic(path, data, indent=2):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def source_key(path):
+    """The manifest key of a source file or folder: its path relative to the working directory."""
+    return os.path.relpath(path, ".").replace(os.sep, "/")
+
+
+def scanned(key, source_dirs):
+    """Whether the source `key` lies in one of `source_dirs`, so this run decides whether it stays."""
+    for source_dir in source_dirs:
+        prefix = source_key(source_dir)
+        if prefix == "." or key.startswith(prefix + "/"):
+            return True
+    return False
+
+
+def read_manifest(out_dir, version):
+    """The manifest in `out_dir`, or {} when missing, unreadable or written by another pipeline version."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != version:
+        return {}
+    return data
+
+
+class ManifestView:
+    """Server-side view of a pipeline manifest; subclasses rebuild their lookups in `_load`.
+
+    The manifest is re-read when its mtime changes, checked at most every
+    `check_interval` seconds; `version` changes with it so callers can use
+    it in cache keys.
+    """
+
+    def __init__(self, out_dir, url_prefix, check_interval=5.0):
+        self.out_dir = out_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.check_interval = check_interval
+        self.version = 0
+        self._checked_at = 0.0
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self.version
+        self._checked_at = now
+        try:
+            mtime = os.stat(os.path.join(self.out_dir, MANIFEST_NAME)).st_mtime_ns
+        except OSError:
+            mtime = 0
+        if mtime != self.version:
+            self._load()
+            self.version = mtime
+        return self.version
+
+    def _load(self):
+        raise NotImplementedError
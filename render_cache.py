@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """Small LRU of values derived from the catalog, tagged with its generation.
+
+    `get(key, generation, build)` returns the cached value for `key` while
+    the catalog generation it was built from is still current, and calls
+    `build()` otherwise. Keys include the request host, which clients
+    control, so the number of entries is bounded.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (generation, value)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, generation, build):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == generation:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached[1]
+            self.stats["misses"] += 1
+        value = build()
+        with self._lock:
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def peek(self, key, generation):
+        """The cached value for `key` if it is current, else None; a miss is left for `get` to count."""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != generation:
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return cached[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
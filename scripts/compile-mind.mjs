@@ -0,0 +1,24 @@
+// Compile MindAR image targets into a .mind file, in the order given.
+//
+//   node scripts/compile-mind.mjs <output.mind> <target1.png> <target2.png> ...
+//
+// Used by mind_compiler.py on the server. Needs the mind-ar and canvas
+// packages (npm install --no-save mind-ar canvas).
+import { writeFile } from 'fs/promises';
+import { loadImage } from 'canvas';
+import { OfflineCompiler } from 'mind-ar/src/image-target/offline-compiler.js';
+
+const [output, ...inputs] = process.argv.slice(2);
+if (!output || inputs.length === 0) {
+  console.error('usage: compile-mind.mjs <output.mind> <target images...>');
+  process.exit(2);
+}
+
+const images = await Promise.all(inputs.map(p => loadImage(p)));
+const compiler = new OfflineCompiler();
+await compiler.compileImageTargets(images, progress => {
+  process.stderr.write(`\rcompiling ${inputs.length} target(s): ${progress.toFixed(0)}%`);
+});
+process.stderr.write('\n');
+await writeFile(output, compiler.exportData());
+console.log(`Wrote ${output}`);
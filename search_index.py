@@ -0,0 +1,417 @@
+"""In-memory search over model names and descriptions, for `/api/search`.
+
+    index = SearchIndex()
+    catalog_cache.on_update = index.update     # kept current document by document
+    index.search("beagel", limit=10)           # [(score, entry), ...], best first
+
+Names and descriptions are folded (accents stripped, casefolded) and
+split into word tokens. Three structures answer a query term:
+
+    postings   token -> {doc_id: weight}; a name token weighs NAME_WEIGHT,
+               a description token DESCRIPTION_WEIGHT. Each also has a
+               ranked copy (weight, then shorter name first), kept sorted
+               by bisection, or re-sorted after a bulk update
+    vocabulary every token, sorted, so a prefix is a bisect range
+               ("bea" finds "beagle" while the user is still typing)
+    trigrams   trigram -> tokens containing it; a term with no exact or
+               prefix match is compared by edit distance to the tokens
+               sharing enough trigrams with it ("beagel" finds "beagle")
+
+A document must match every query term (exact, prefix or typo); terms
+matching nothing at all are ignored. Scores add, per term, the route's
+factor times the token weight times its inverse document frequency, plus
+NAME_MATCH_BONUS for a name equal to the whole query.
+
+A query of several terms, the rarest matching at most INTERSECT_LIMIT
+documents, intersects the terms' postings and, when few documents are
+left, scores them all. Otherwise queries cost what they return rather
+than what they match: the ranked postings of the term that can score
+highest are read best first, each document is scored for the other
+terms, and reading stops once no document left could make the top
+`limit`.
+
+Re-indexing a document whose name and description did not change (an
+activation count going up) only swaps its entry.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+# factor per way a query term matched a token
+EXACT, PREFIX, FUZZY = 1.0, 0.6, 0.4
+# a name equal to the whole query gets this much added
+NAME_MATCH_BONUS = 10.0
+# tokens a prefix may expand to, per query term
+PREFIX_EXPANSIONS = 32
+# prefix matching starts at this many characters, except for the last term (typed so far)
+MIN_PREFIX = 2
+# typo tolerance: terms this long allow one edit, FUZZY_TWO_EDITS and longer two
+FUZZY_MIN_LENGTH = 3
+FUZZY_TWO_EDITS = 7
+# a multi-term query whose rarest term matches at most INTERSECT_LIMIT documents intersects the
+# terms' postings first, and scores every document left when there are at most EXHAUSTIVE_LIMIT
+INTERSECT_LIMIT = 4096
+EXHAUSTIVE_LIMIT = 128
+# above this many new or dropped tokens in one update the vocabulary is re-sorted instead
+RESORT_THRESHOLD = 64
+STOPWORDS = frozenset("a an and are as at by for from in is it its of on or the this to with".split())
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def fold(text):
+    """`text` without accents, casefolded."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """Word tokens of `text`, folded, stop words dropped."""
+    return [t for t in _TOKEN.findall(fold(text)) if t not in STOPWORDS]
+
+
+def trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between `a` and `b`, or limit + 1 once it is over `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = ca != cb
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _scaled(ranked, multiplier):
+    """A ranked posting as (-score, key, doc_id), still in order."""
+    for negative, key, doc_id in ranked:
+        yield negative * multiplier, key, doc_id
+
+
+class _Doc:
+    __slots__ = ("entry", "name", "description", "tokens", "key")
+
+    def __init__(self, entry, name, description, tokens):
+        self.entry = entry
+        self.name = name  # folded, tokens joined by single spaces
+        self.description = description
+        self.tokens = tokens
+        # tie-break: shorter names first ("Beagle" before "Beagle 12"), then alphabetical
+        self.key = (len(name), name, entry.id)
+
+
+class SearchIndex:
+    """The index over the catalog's documents; see the module docstring.
+
+    `update` takes the changes CatalogCache reports (`on_update`), so a
+    listener event re-indexes only the documents it carries. Searches and
+    updates may run on different threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}  # doc_id -> _Doc
+        self._names = {}  # folded name -> {doc_id}
+        self._postings = {}  # token -> {doc_id: weight}
+        self._ranked = {}  # token -> [(-weight, doc key, doc_id)], sorted
+        self._stale = set()  # tokens whose ranked list is re-sorted at the end of a bulk update
+        self._vocabulary = []  # sorted tokens
+        self._trigrams = {}  # trigram -> set of tokens
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def counts(self):
+        """(documents, tokens) indexed."""
+        with self._lock:
+            return len(self._docs), len(self._postings)
+
+    def update(self, changed, removed=()):
+        """Index `changed` ({doc_id: (data, entry)}) and drop the `removed` ids."""
+        added_tokens = set()
+        dropped_tokens = set()
+        # a full load re-sorts the postings it touched once; single changes keep them sorted
+        bulk = len(changed) + len(removed) > RESORT_THRESHOLD
+        with self._lock:
+            for doc_id in removed:
+                dropped_tokens.update(self._remove(doc_id, bulk))
+            for doc_id, (data, entry) in changed.items():
+                name = " ".join(_TOKEN.findall(fold(entry.name)))
+                description = data.get("description") or ""
+                current = self._docs.get(doc_id)
+                if current is not None and current.name == name and current.description == description:
+                    current.entry = entry
+                    continue
+                dropped_tokens.update(self._remove(doc_id, bulk))
+                added_tokens.update(self._add(doc_id, entry, name, description, bulk))
+            # a token emptied and then indexed again by the same update stays
+            dropped_tokens.difference_update(self._postings)
+            self._update_vocabulary(added_tokens, dropped_tokens)
+            docs = self._docs
+            for token in self._stale:
+                self._ranked[token] = sorted((-weight, docs[doc_id].key, doc_id)
+                                             for doc_id, weight in self._postings[token].items())
+            self._stale.clear()
+            self.generation += 1
+
+    def clear(self):
+        with self._lock:
+            for container in (self._docs, self._names, self._postings, self._ranked, self._stale, self._trigrams):
+                container.clear()
+            self._vocabulary = []
+            self.generation += 1
+
+    def search(self, query, limit=10, category=None):
+        """Up to `limit` (score, entry) pairs for `query`, best first; only `category`'s when given."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        whole = " ".join(_TOKEN.findall(fold(query)))
+        with self._lock:
+            total = len(self._docs) or 1
+            expansions = [self._expand(term, i == len(terms) - 1, total) for i, term in enumerate(terms)]
+            expansions = [e for e in expansions if e]
+            if not expansions:
+                return []
+            found = self._top(expansions, limit, category, whole)
+            return [(round(score, 4), self._docs[doc_id].entry) for score, doc_id in found]
+
+    # indexing
+
+    def _add(self, doc_id, entry, name, description, bulk):
+        weights = {}
+        for token in tokenize(description):
+            weights[token] = DESCRIPTION_WEIGHT
+        for token in tokenize(name):
+            weights[token] = weights.get(token, 0.0) + NAME_WEIGHT
+        doc = self._docs[doc_id] = _Doc(entry, name, description, tuple(weights))
+        new = []
+        for token, weight in weights.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                self._ranked[token] = []
+                new.append(token)
+            posting[doc_id] = weight
+            if bulk:
+                self._stale.add(token)
+            elif token not in self._stale:
+                bisect.insort(self._ranked[token], (-weight, doc.key, doc_id))
+        self._names.setdefault(name, set()).add(doc_id)
+        return new
+
+    def _remove(self, doc_id, bulk):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return []
+        same_name = self._names.get(doc.name)
+        if same_name is not None:
+            same_name.discard(doc_id)
+            if not same_name:
+                del self._names[doc.name]
+        emptied = []
+        for token in doc.tokens:
+            posting = self._postings.get(token)
+            if posting is None or doc_id not in posting:
+                continue
+            weight = posting.pop(doc_id)
+            if bulk:
+                self._stale.add(token)
+            elif token not in self._stale:
+                ranked = self._ranked[token]
+                i = bisect.bisect_left(ranked, (-weight, doc.key, doc_id))
+                if i < len(ranked) and ranked[i][2] == doc_id:
+                    del ranked[i]
+            if not posting:
+                del self._postings[token]
+                self._ranked.pop(token, None)
+                self._stale.discard(token)
+                emptied.append(token)
+        return emptied
+
+    def _update_vocabulary(self, added, dropped):
+        if len(added) + len(dropped) > RESORT_THRESHOLD:
+            self._vocabulary = sorted(self._postings)
+        else:
+            vocabulary = self._vocabulary
+            for token in dropped:
+                i = bisect.bisect_left(vocabulary, token)
+                if i < len(vocabulary) and vocabulary[i] == token:
+                    del vocabulary[i]
+            for token in added:
+                i = bisect.bisect_left(vocabulary, token)
+                if i == len(vocabulary) or vocabulary[i] != token:
+                    vocabulary.insert(i, token)
+        for token in dropped:
+            for gram in trigrams(token):
+                tokens = self._trigrams.get(gram)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[gram]
+        for token in added:
+            for gram in trigrams(token):
+                self._trigrams.setdefault(gram, set()).add(token)
+
+    # querying
+
+    def _expand(self, term, last, total):
+        """[(token, multiplier)] a query term matches: exact, by prefix, else by typo.
+
+        A document's score for the term is its best token's multiplier
+        times that token's weight in the document.
+        """
+        out = []
+
+        def add(token, factor):
+            out.append((token, factor * math.log(1.0 + total / len(self._postings[token]))))
+
+        if term in self._postings:
+            add(term, EXACT)
+        if len(term) >= MIN_PREFIX or last:
+            vocabulary = self._vocabulary
+            i = bisect.bisect_right(vocabulary, term)  # past the exact token
+            for token in vocabulary[i:i + PREFIX_EXPANSIONS]:
+                if not token.startswith(term):
+                    break
+                # closer completions count more: "cat" over "caterpillar" for "ca"
+                add(token, PREFIX * len(term) / len(token))
+        if not out and len(term) >= FUZZY_MIN_LENGTH:
+            limit = 2 if len(term) >= FUZZY_TWO_EDITS else 1
+            for token, distance in self._similar(term, limit):
+                add(token, FUZZY / distance)
+        return out
+
+    def _similar(self, term, limit):
+        """(token, distance) for indexed tokens within `limit` edits of `term`."""
+        grams = trigrams(term)
+        # each edit touches at most three trigrams
+        needed = max(1, len(grams) - 3 * limit)
+        shared = {}
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        out = []
+        for token, count in shared.items():
+            if count >= needed:
+                distance = edit_distance(term, token, limit)
+                if distance <= limit:
+                    out.append((token, distance))
+        return out
+
+    def _size(self, expansion):
+        return sum(len(self._postings[token]) for token, _ in expansion)
+
+    def _best(self, expansion):
+        """The highest score any document has for a term (ranked lists start with the top weight)."""
+        return max(multiplier * -self._ranked[token][0][0] for token, multiplier in expansion)
+
+    def _score(self, expansion, doc_id):
+        """A document's score for one term: its best token's, 0 if it has none of them."""
+        best = 0.0
+        for token, multiplier in expansion:
+            weight = self._postings[token].get(doc_id)
+            if weight is not None and multiplier * weight > best:
+                best = multiplier * weight
+        return best
+
+    def _matching(self, expansion, within=None):
+        """The ids of documents having any of a term's tokens (and in `within`, when given)."""
+        keys = [self._postings[token].keys() for token, _ in expansion]
+        if within is None:
+            return set().union(*keys)
+        return set().union(*[k & within for k in keys])
+
+    def _top(self, expansions, limit, category, whole):
+        """[(score, doc_id)] of the best documents matching every term, best first."""
+        expansions = sorted(expansions, key=self._size)
+        if len(expansions) > 1 and self._size(expansions[0]) <= INTERSECT_LIMIT:
+            found = self._intersect(expansions, limit, category, whole)
+            if found is not None:
+                return found
+        # reading the term that can score highest fills the top soonest and bounds the rest tightest
+        driver = max(expansions, key=lambda e: (self._best(e), -self._size(e)))
+        others = [e for e in expansions if e is not driver]
+        docs = self._docs
+
+        def matches(doc_id):
+            return category is None or docs[doc_id].entry.category == category
+
+        top = []  # the best `limit` so far, as sorted (-score, key, doc_id)
+
+        def keep(score, doc_id):
+            item = (-score, docs[doc_id].key, doc_id)
+            if len(top) < limit:
+                bisect.insort(top, item)
+            elif item < top[-1]:
+                bisect.insort(top, item)
+                top.pop()
+
+        # a name equal to the query is scored here, so the bonus needn't widen the bound below
+        named = self._names.get(whole, ())
+        for doc_id in named:
+            scores = [self._score(expansion, doc_id) for expansion in expansions]
+            if all(scores) and matches(doc_id):
+                keep(sum(scores) + NAME_MATCH_BONUS, doc_id)
+        # the most the other terms can add to a document's driver score
+        ceiling = sum(self._best(expansion) for expansion in others)
+        seen = set()
+        for negative, key, doc_id in heapq.merge(*[_scaled(self._ranked[token], multiplier)
+                                                   for token, multiplier in driver]):
+            # in (score, key) order: once the best this document could reach ranks below the
+            # last kept one, so does everything after it
+            if len(top) >= limit and (negative - ceiling, key) > top[-1][:2]:
+                break
+            if doc_id in seen or doc_id in named:
+                continue
+            # a document's first appearance carries its best driver score
+            seen.add(doc_id)
+            if not matches(doc_id):
+                continue
+            score = -negative
+            for expansion in others:
+                term_score = self._score(expansion, doc_id)
+                if not term_score:
+                    break
+                score += term_score
+            else:
+                keep(score, doc_id)
+        return [(-negative, doc_id) for negative, _, doc_id in top]
+
+    def _intersect(self, expansions, limit, category, whole):
+        """_top by scoring every document matching all terms; None when more than EXHAUSTIVE_LIMIT do."""
+        candidates = self._matching(expansions[0])
+        for expansion in expansions[1:]:
+            candidates = self._matching(expansion, candidates)
+        if len(candidates) > EXHAUSTIVE_LIMIT:
+            return None
+        docs = self._docs
+        named = self._names.get(whole, ())
+        ranked = []
+        for doc_id in candidates:
+            doc = docs[doc_id]
+            if category is None or doc.entry.category == category:
+                score = sum(self._score(expansion, doc_id) for expansion in expansions)
+                if doc_id in named:
+                    score += NAME_MATCH_BONUS
+                ranked.append((-score, doc.key, doc_id))
+        return [(-negative, doc_id) for negative, _, doc_id in heapq.nsmallest(limit, ranked)]
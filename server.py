@@ -1,20 +1,81 @@
 import sys
 import os
-from flask import Flask, render_template, request, jsonify
-import firebase_admin
-from firebase_admin import credentials, firestore
-import requests
-from urllib.parse import urlparse, unquote, quote_plus
+import atexit
+import hashlib
+import json
+import threading
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, make_response, Response
+from urllib.parse import urlparse, unquote
+from catalog_cache import CatalogCache
+from catalog_snapshot import CatalogSnapshots
+from category_index import CategoryCatalog, IndexMaintainer, category_key, doc_key
+from shared_cache import SharedCache, SharedCatalogClient
+from asset_fetch import AssetPrefetcher
+from asset_store import AssetStore
+from render_cache import RenderCache
+from search_index import SearchIndex
+from activation_queue import ActivationWriter
+from catalog_entry import AssetRef, ModelEntry, scene_links
+import catalog_api
+from mind_compiler import MindCompiler
+from glb_optimizer import ModelVariants, device_class_for
+from image_derivatives import ImageDerivatives
+from audio_pipeline import AudioVariants
+from static_assets import StaticAssets
+import metrics
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
+# how long fetch_all_models_grouped waits on asset downloads before serving remote urls
+ASSET_WAIT_TIMEOUT = float(os.environ.get("ASSET_WAIT_TIMEOUT", "10"))
+# with several worker processes, SHARED_CACHE names a host-wide SQLite database (shared_cache.py):
+# one asset manifest, one download per url and one Firestore reader for the catalog per host
+SHARED_CACHE = os.environ.get("SHARED_CACHE")
+shared_cache = SharedCache(os.path.join(app.root_path, SHARED_CACHE)) if SHARED_CACHE else None
+
+# downloaded targets/images/audio/models, content-addressed under static/cas
+asset_store = AssetStore(os.path.join(app.root_path, app.static_folder, "cas"),
+                         os.path.join(app.root_path, "cache", "asset_manifest.json"),
+                         url_prefix="/static/cas",
+                         revalidate_after=int(os.environ.get("ASSET_REVALIDATE_AFTER", "3600")),
+                         shared=shared_cache)
+atexit.register(asset_store.flush)
+asset_prefetcher = AssetPrefetcher(asset_store, max_workers=int(os.environ.get("ASSET_FETCH_WORKERS", "8")))
+
+# /static/ with fingerprinted urls, precompressed sidecars, Range and sendfile offload
+static_assets = StaticAssets(os.path.join(app.root_path, app.static_folder),
+                             os.path.join(app.root_path, "cache", "precompressed"),
+                             offload=os.environ.get("STATIC_OFFLOAD") or None,
+                             accel_prefix=os.environ.get("STATIC_ACCEL_PREFIX", "/internal-static/"))
+app.use_x_sendfile = static_assets.offload == "x-sendfile"
+app.view_functions["static"] = lambda filename: static_assets.serve(filename, request)
+app.jinja_env.globals["asset_url"] = static_assets.url
+
+# firebase_admin and the Firestore client library take ~0.35 s to import, so they are
+# loaded on first use (by the warmup thread, see start_warmup) instead of at import
+_firebase_lock = threading.Lock()
+_firebase_ready = False
+
 def init_firebase():
-    cred_path = os.path.join(os.path.dirname(__file__), "serviceaccount.json")
-    cred = credentials.Certificate(cred_path)
-    try:
-        firebase_admin.get_app()
-    except ValueError:
-        firebase_admin.initialize_app(cred)
+    """Initialize the default Firebase app; the credentials are read once per process."""
+    global _firebase_ready
+    if _firebase_ready:
+        return
+    with _firebase_lock:
+        if _firebase_ready:
+            return
+        import firebase_admin
+        from firebase_admin import credentials
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            cred_path = os.path.join(os.path.dirname(__file__), "serviceaccount.json")
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        _firebase_ready = True
 
 def _safe_filename_from_url(url, fallback):
     p = urlparse(url)
@@ -25,217 +86,756 @@ def _safe_filename_from_url(url, fallback):
     name = os.path.basename(name)
     return name
 
-def _download_if_needed(url, dest_dir, filename):
-    os.makedirs(dest_dir, exist_ok=True)
-    dest_path = os.path.join(dest_dir, filename)
-    if os.path.exists(dest_path):
-        return dest_path
-    resp = requests.get(url, stream=True, timeout=30)
-    resp.raise_for_status()
-    with open(dest_path, "wb") as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-    return dest_path
+def _resolve_asset(part, key, kind, subdir, url, filename, doc_id):
+    """Set part.<key> to the served path of an asset, fetching `url` into the asset store.
 
-def fetch_all_models_grouped():
+    Until a download lands the remote url is served instead. Documents
+    without a url fall back to /static/<subdir>/<filename>. Returns the
+    download future, or None when there is nothing to fetch.
+    """
+    if not url:
+        # assume path-based: build static path
+        setattr(part, key, f"/static/{subdir}/" + os.path.basename(filename) if filename else None)
+        return None
+    started = time.perf_counter()
+    local = asset_store.local_url(url)
+    setattr(part, key, local or url)
+    fut = asset_prefetcher.submit(url, {"id": doc_id, "kind": kind})
+    timings = metrics.current_request()
+    if timings is not None:
+        # Server-Timing only: a phase() histogram observation per asset costs more than the submit
+        timings.add("download", time.perf_counter() - started)
+
+    def _landed(f):
+        if f.cancelled():  # shutting down
+            return
+        result = f.result()
+        if result.ok and getattr(part, key) != result.local:
+            setattr(part, key, result.local)
+            # cached pages still point at the remote url
+            catalog_cache.touch()
+    fut.add_done_callback(_landed)
+    return fut
+
+def get_db():
     init_firebase()
-    db = firestore.client()
-    try:
-        docs = list(db.collection("models").stream())
-    except Exception as e:
-        print("Error reading models from Firestore:", e, file=sys.stderr)
-        docs = []
+    from firebase_admin import firestore
+    return firestore.client()  # firebase_admin keeps one client per app
+
+def get_async_db():
+    init_firebase()
+    from firebase_admin import firestore_async
+    return firestore_async.client()
+
+def activation_count(data):
+    """`activations` of a document; documents from before the counter count 1 if they were activated."""
+    count = data.get("activations")
+    if isinstance(count, (int, float)) and not isinstance(count, bool):
+        return int(count)
+    return 1 if data.get("activated") else 0
+
+def resolve_model_doc(doc_id, data, pending=None):
+    """Build the ModelEntry for one `models` document.
+
+    Asset downloads are handed to the prefetch pool and not waited on; their
+    futures are appended to `pending` for callers that want to wait.
+    """
+    if pending is None:
+        pending = []
+    name = data.get("name", "unknown").strip()
+    category = doc_key(data)
+
+    entry = ModelEntry(
+        doc_id, name, category,
+        model=AssetRef.from_dict(data.get("model")),  # 3D model
+        targetCard=AssetRef.from_dict(data.get("targetCard")),  # used by .mind ordering
+        image=AssetRef.from_dict(data.get("image")),  # display image to user
+        audio=AssetRef.from_dict(data.get("audio")),  # optional
+        activations=activation_count(data),
+    )
+    target, image, audio = entry.targetCard, entry.image, entry.audio
+
+    # Resolve targetCard (so the .mind mapping remains consistent)
+    if target.url and not target.filename:
+        target.filename = _safe_filename_from_url(target.url, f"{name}_target.png")
+    pending.append(_resolve_asset(target, "local", "target", "targets", target.url, target.filename, doc_id))
+
+    # Resolve image (display image)
+    if image.url and not image.filename:
+        image.filename = _safe_filename_from_url(image.url, f"{name}.jpg")
+    pending.append(_resolve_asset(image, "local", "image", "images", image.url, image.filename, doc_id))
 
+    # Resolve audio (so client loads from static)
+    if audio.url and not audio.filename:
+        audio.filename = _safe_filename_from_url(audio.url, f"{name}.mp3")
+    pending.append(_resolve_asset(audio, "local", "audio", "audio", audio.url, audio.filename, doc_id))
+
+    # Resolve 3D model src for template asset loading (prefer model.url)
+    pending.append(_resolve_asset(entry, "src", "model", "models", entry.model.url, entry.model.filename, doc_id))
+
+    return entry
+
+def group_model_entries(entries):
+    """Group entries by category, sorted by target filename (the .mind order)."""
     groups = {}
-    static_root = os.path.join(app.root_path, app.static_folder)
-    targets_dir = os.path.join(static_root, "targets")
-    images_dir = os.path.join(static_root, "images")
-    audio_dir = os.path.join(static_root, "audio")
-    models_3d_dir = os.path.join(static_root, "models")  # optional for 3D downloads
-
-    failed_download_ids = []
-
-    for doc in docs:
-        data = doc.to_dict() or {}
-        doc_id = doc.id
-        name = data.get("name", "unknown").strip()
-        category = (data.get("category") or "uncategorized").lower()
-
-        # --- model (3D) info ---
-        model_info = data.get("model") or {}
-        model_url = model_info.get("url")
-        model_filename = model_info.get("filename")
-
-        # --- targetCard (used by .mind ordering) ---
-        target = data.get("targetCard") or {}
-        target_filename = target.get("filename")
-        target_url = target.get("url")
-
-        # --- image (display image to user) ---
-        image = data.get("image") or {}
-        image_filename = image.get("filename")
-        image_url = image.get("url")
-
-        # --- audio (optional) ---
-        audio = data.get("audio") or {}
-        audio_filename = audio.get("filename")
-        audio_url = audio.get("url")
-
-        entry = {
-            "id": doc_id,
-            "name": name,
-            "category": category,
-            "model": model_info,
-            "targetCard": dict(target),  # copy
-            "image": dict(image),
-            "audio": dict(audio),
-        }
-
-        # Resolve & download targetCard to static/targets (so the .mind mapping remains consistent)
-        if target_url:
-            if not target_filename:
-                target_filename = _safe_filename_from_url(target_url, f"{name}_target.png")
-            try:
-                local_path = _download_if_needed(target_url, targets_dir, target_filename)
-                entry["targetCard"]["local"] = "/static/targets/" + os.path.basename(local_path)
-            except Exception as e:
-                failed_download_ids.append(doc_id)
-                print(f"Warning: failed to download target (id={doc_id}) {target_url} - {e}", file=sys.stderr)
-                entry["targetCard"]["local"] = target_url
-        else:
-            if target_filename:
-                # assume path-based: build static path
-                entry["targetCard"]["local"] = "/static/targets/" + os.path.basename(target_filename)
-            else:
-                entry["targetCard"]["local"] = None
-        entry["targetCard"]["filename"] = target_filename or entry["targetCard"].get("filename")
-
-        # Resolve & download image (display image) to static/images
-        if image_url:
-            if not image_filename:
-                image_filename = _safe_filename_from_url(image_url, f"{name}.jpg")
-            try:
-                local_img = _download_if_needed(image_url, images_dir, image_filename)
-                entry["image"]["local"] = "/static/images/" + os.path.basename(local_img)
-            except Exception as e:
-                failed_download_ids.append(doc_id)
-                print(f"Warning: failed to download image (id={doc_id}) {image_url} - {e}", file=sys.stderr)
-                entry["image"]["local"] = image_url
-        else:
-            if image_filename:
-                entry["image"]["local"] = "/static/images/" + os.path.basename(image_filename)
-            else:
-                entry["image"]["local"] = None
-        entry["image"]["filename"] = image_filename or entry["image"].get("filename")
-
-        # Resolve & download audio to static/audio (so client loads from static)
-        if audio_url:
-            if not audio_filename:
-                audio_filename = _safe_filename_from_url(audio_url, f"{name}.mp3")
-            try:
-                local_audio = _download_if_needed(audio_url, audio_dir, audio_filename)
-                entry["audio"]["local"] = "/static/audio/" + os.path.basename(local_audio)
-            except Exception as e:
-                # don't treat audio failure as fatal; keep original url for fallback
-                print(f"Notice: failed to download audio (id={doc_id}) {audio_url} - {e}", file=sys.stderr)
-                entry["audio"]["local"] = audio_url
-        else:
-            if audio_filename:
-                entry["audio"]["local"] = "/static/audio/" + os.path.basename(audio_filename)
-            else:
-                entry["audio"]["local"] = None
-        entry["audio"]["filename"] = audio_filename or entry["audio"].get("filename")
-
-        # Resolve 3D model src for template asset loading (prefer model.url)
-        model_src = None
-        if model_url:
-            model_src = model_url
-        elif model_filename:
-            model_src = "/static/models/" + os.path.basename(model_filename)
-        entry["src"] = model_src
-
-        groups.setdefault(category, []).append(entry)
+    for entry in entries:
+        groups.setdefault(entry.category, []).append(entry)
 
     # Sort each category by target filename (alphabetical), fallback to name
     for k in groups:
-        def sort_key(x):
-            fn = (x.get("targetCard") or {}).get("filename") or ""
-            fn = os.path.basename(fn).lower()
-            if fn:
-                return fn
-            return x.get("name", "").lower()
-        groups[k].sort(key=sort_key)
-
-    if failed_download_ids:
-        print("Failed to download (some) ids:", ", ".join(set(failed_download_ids)), file=sys.stderr)
-
-    # print loaded summary
+        groups[k].sort(key=ModelEntry.target_sort_key)
+
     if groups:
         for cat in sorted(groups.keys(), key=lambda x: x.lower()):
-            names = [m.get("name", "") for m in groups[cat]]
+            names = [m.name for m in groups[cat]]
             print(f"Category {cat.capitalize()} Loaded: {len(names)} model(s)", file=sys.stderr)
 
     return dict(sorted(groups.items(), key=lambda kv: kv[0].lower()))
 
+def fetch_all_models_grouped():
+    try:
+        with metrics.phase("firestore"):
+            docs = list(get_db().collection("models").stream())
+        metrics.inc("firestore_docs_read_total", len(docs), source="fetch_all")
+    except Exception as e:
+        print("Error reading models from Firestore:", e, file=sys.stderr)
+        # the last-known catalog rather than an empty page
+        docs = snapshot_documents() or []
+
+    pending = []
+    with metrics.phase("resolve"):
+        entries = [resolve_model_doc(doc.id, doc.to_dict() or {}, pending) for doc in docs]
+    with metrics.phase("download"):
+        asset_prefetcher.wait(pending, timeout=ASSET_WAIT_TIMEOUT)
+    failed = asset_prefetcher.report()["failed"]
+    if failed:
+        print("Failed to download (some) ids:", ", ".join(sorted({f["id"] for f in failed if f.get("id")})),
+              file=sys.stderr)
+    with metrics.phase("sort"):
+        return group_model_entries(entries)
+
+# last-known catalog on disk (catalog_snapshot.py), rewritten after every change:
+#   prefer    served at boot, if younger than CATALOG_SNAPSHOT_MAX_AGE, while Firestore is read
+#   fallback  served only when the first Firestore read fails
+#   only      the catalog never comes from Firestore (offline runs, tests)
+#   off       neither read nor written
+CATALOG_SNAPSHOT_POLICY = os.environ.get("CATALOG_SNAPSHOT_POLICY", "prefer")
+CATALOG_SNAPSHOT_MAX_AGE = float(os.environ.get("CATALOG_SNAPSHOT_MAX_AGE", str(7 * 86400)))
+catalog_snapshots = CatalogSnapshots(os.environ.get("CATALOG_SNAPSHOT")
+                                     or os.path.join(app.root_path, "cache", "catalog.snapshot"))
+
+def snapshot_documents(max_age=None):
+    """Documents of the catalog snapshot; None when off, missing, corrupt or older than `max_age`."""
+    if CATALOG_SNAPSHOT_POLICY == "off":
+        return None
+    snap = catalog_snapshots.load()
+    if snap is None:
+        return None
+    try:
+        age = time.time() - snap.created
+        if max_age is not None and age > max_age:
+            print(f"Notice: catalog snapshot is {age / 3600:.0f}h old, reading Firestore first", file=sys.stderr)
+            return None
+        return snap.documents()
+    finally:
+        snap.close()
+
+# with SHARED_CACHE the first worker to ask leads: it reads Firestore and publishes the catalog,
+# the others read and follow that copy; a follower takes over when the leader's lock is released
+shared_catalog = SharedCatalogClient(shared_cache, poll=float(os.environ.get("SHARED_CACHE_POLL", "0.5"))) \
+    if shared_cache is not None else None
+
+def catalog_db():
+    """Client catalog_cache reads `models` through: Firestore, or the shared catalog for followers."""
+    if shared_cache is None or shared_cache.leads("catalog"):
+        return get_db()
+    return shared_catalog
+
+def catalog_async_db():
+    if shared_cache is None or shared_cache.leads("catalog"):
+        return get_async_db()
+    return shared_catalog.async_client()
+
+# how the catalog is read (category_index.py):
+#   full      the whole `models` collection, kept fresh by a snapshot listener
+#   category  the meta/categories summary, then only the categories requested, one
+#             `categoryKey` query each; needs `python category_index.py migrate` first
+CATALOG_MODE = os.environ.get("CATALOG_MODE", "full")
+_catalog_args = dict(ttl=float("inf") if CATALOG_SNAPSHOT_POLICY == "only"
+                     else int(os.environ.get("CATALOG_TTL", "300")),
+                     use_listener=CATALOG_SNAPSHOT_POLICY != "only",
+                     fallback=snapshot_documents)
+if CATALOG_MODE == "category":
+    # every worker reads just what it serves, so SHARED_CACHE only shares assets here
+    catalog_cache = CategoryCatalog(get_db, resolve_model_doc, group_model_entries, **_catalog_args)
+else:
+    # process-wide catalog, kept fresh by a snapshot listener on `models`
+    catalog_cache = CatalogCache(catalog_db, resolve_model_doc, group_model_entries, **_catalog_args)
+
+# in full mode the worker reading Firestore also keeps categoryKey and meta/categories
+# current for CATALOG_MODE=category readers (CATEGORY_INDEX=off to leave them alone)
+category_index = IndexMaintainer(get_db) \
+    if CATALOG_MODE == "full" and os.environ.get("CATEGORY_INDEX", "maintain") != "off" else None
+
+def _catalog_changed():
+    if shared_cache is not None:
+        if not shared_cache.is_leader("catalog"):
+            return  # the leader publishes and snapshots for the whole host
+        shared_cache.publish_catalog(catalog_cache.documents())
+    if CATALOG_SNAPSHOT_POLICY not in ("off", "only"):
+        catalog_snapshots.schedule(catalog_cache.documents())
+    if category_index is not None and catalog_cache.source == "firestore":
+        category_index.schedule(catalog_cache.documents())
+
+def _take_over_catalog():
+    # runs on every poll of a follower: the leader's lock is free once it has exited
+    if shared_cache.is_leader("catalog") or not shared_cache.leads("catalog"):
+        return
+    print("Catalog leader gone: this worker reads Firestore now", file=sys.stderr)
+    threading.Thread(target=lambda: catalog_cache.refresh() and catalog_cache.restart_listener(),
+                     name="catalog-takeover", daemon=True).start()
+
+# /api/search over names and descriptions, re-indexed per changed document; in category
+# mode it covers the categories read so far
+search_index = SearchIndex()
+catalog_cache.on_update = search_index.update
+
+# a category-mode catalog is partial: it is neither published, snapshotted nor indexed
+if CATALOG_MODE == "full":
+    catalog_cache.on_change = _catalog_changed
+if shared_catalog is not None:
+    shared_catalog.on_poll = _take_over_catalog
+if CATALOG_SNAPSHOT_POLICY not in ("off", "only") and CATALOG_MODE == "full":
+    atexit.register(catalog_snapshots.close)
+if category_index is not None:
+    atexit.register(category_index.close)
+
+# activations are acknowledged immediately and written behind in coalesced batches
+activation_writer = ActivationWriter(get_db, window=float(os.environ.get("ACTIVATE_FLUSH_WINDOW", "2")))
+atexit.register(activation_writer.stop)
+
 # new endpoint to mark a model activated
 @app.route("/activate", methods=["POST"])
 def activate():
-    init_firebase()
-    db = firestore.client()
     data = request.get_json(silent=True) or {}
     doc_id = data.get("id")
     if not doc_id:
         return jsonify({"ok": False, "error": "missing id"}), 400
-    try:
-        ref = db.collection("models").document(doc_id)
-        ref.update({
-            "activated": True,
-            "updatedAt": firestore.SERVER_TIMESTAMP
-        })
-        return jsonify({"ok": True})
-    except Exception as e:
-        print("Error activating model", doc_id, e, file=sys.stderr)
-        return jsonify({"ok": False, "error": str(e)}), 500
+    if not isinstance(doc_id, str) or "/" in doc_id:
+        return jsonify({"ok": False, "error": "invalid id"}), 400
+    with metrics.phase("enqueue"):
+        activation_writer.enqueue(doc_id)
+    return jsonify({"ok": True, "queued": True}), 202
 
 @app.route("/test")
 def test():
     return render_template("test.html")
 
+# lightweight GLB variants built offline by glb_optimizer.py
+model_variants = ModelVariants(os.path.join(app.root_path, app.static_folder, "models_opt"),
+                               url_prefix="/static/models_opt")
+# variants are normalized to a 1-unit longest edge; raw models keep the old fixed scale
+RAW_MODEL_SCALE = "0.05 0.05 0.05"
+VARIANT_MODEL_SCALE = "1 1 1"
+
+# resized WebP/AVIF copies of images and target cards built offline by image_derivatives.py
+image_derivatives = ImageDerivatives(os.path.join(app.root_path, app.static_folder, "images_opt"),
+                                     url_prefix="/static/images_opt")
+
+# Opus/AAC clips and per-category sprites built offline by audio_pipeline.py
+audio_variants = AudioVariants(os.path.join(app.root_path, app.static_folder, "audio_opt"),
+                               url_prefix="/static/audio_opt")
+
+def enrich_models_for_links(models, host_url, device_class=None):
+    """JSON-safe dicts for the template, with absolute src and Scene Viewer links.
+
+    When the optimizer built a variant of a model for `device_class`, it
+    replaces the raw src. Images and target cards with derivatives get a
+    `responsive` field with their srcset and placeholder; transcoded audio
+    gets `compact` urls and its `sprite` offset.
+    """
+    out = []
+    for m in models:
+        entry = m.to_dict(host_url)
+        for key, ref in (("image", m.image), ("targetCard", m.targetCard)):
+            responsive = image_derivatives.responsive(ref.local)
+            if responsive:
+                entry[key]["responsive"] = responsive
+        for key in ("image", "targetCard", "audio"):
+            entry[key]["local"] = static_assets.versioned(entry[key].get("local"))
+        compact = audio_variants.clip(m.audio.local)
+        if compact:
+            entry["audio"]["compact"] = compact
+            offset = audio_variants.sprite_offset(m.category, m.audio.local)
+            if offset:
+                entry["audio"]["sprite"] = offset
+        variant = model_variants.pick(m.src, device_class) if device_class else None
+        if variant:
+            entry["src"] = variant
+            entry["abs_src"], entry["scene_link"], entry["intent_link"] = scene_links(variant, host_url)
+            entry["scale"] = VARIANT_MODEL_SCALE
+        else:
+            entry["src"] = static_assets.versioned(entry["src"])
+            entry["scale"] = RAW_MODEL_SCALE
+        out.append(entry)
+    return out
+
+# how many decoded GLBs the page keeps attached (and their byte budget), and how many of the most
+# activated models it fetches ahead of their targetFound, per device class
+MODEL_CACHE = {
+    "low": {"models": 2, "bytes": 16 << 20, "prefetch": 0},
+    "mid": {"models": 3, "bytes": 48 << 20, "prefetch": 1},
+    "high": {"models": 6, "bytes": 128 << 20, "prefetch": 2},
+}
+
+def _model_file(m, src, device_class):
+    """(bytes, content hash) of the GLB served at `src`, where known without fetching it."""
+    variant = model_variants.variant(m.src, device_class) if device_class else None
+    if variant:
+        return variant["bytes"], variant["sha256"]
+    rec = asset_store.lookup(m.model.url) if m.model.url else None
+    if rec and rec["local"] == m.src:
+        return rec["size"], rec["sha256"]
+    prefix = static_assets.url_prefix + "/"
+    if src and src.startswith(prefix):
+        rel = unquote(src.split("?", 1)[0][len(prefix):])
+        digest = static_assets.fingerprint(rel)
+        if digest:
+            return os.path.getsize(os.path.join(static_assets.root, rel)), digest
+    return None, None  # still remote: the page learns the size when it fetches it
+
+def model_manifest(models, entries, device_class):
+    """Per-category GLB manifest the page loads models from on `targetFound`.
+
+    One item per model with a src, by target index: `url` (as in the
+    enriched entry), `bytes` and `hash` when known, and `priority`, the
+    model's activation count. The `cache` limits decide how many decoded
+    models stay attached; the top `prefetch` activated models are marked
+    to be fetched while the page is idle.
+    """
+    cache = MODEL_CACHE.get(device_class, MODEL_CACHE["mid"])
+    items = []
+    for index, (m, entry) in enumerate(zip(models, entries)):
+        url = entry.get("src")
+        if not url:
+            continue
+        size, digest = _model_file(m, url, device_class)
+        items.append({"index": index, "id": m.id, "url": url, "bytes": size, "hash": digest,
+                      "priority": m.activations})
+    ranked = sorted((item for item in items if item["priority"] > 0), key=lambda item: -item["priority"])
+    for item in ranked[:cache["prefetch"]]:
+        item["prefetch"] = True
+    return {"models": items, "cache": {"models": cache["models"], "bytes": cache["bytes"]}}
+
+# .mind target files compiled from the downloaded target cards, in served order
+mind_compiler = MindCompiler(os.path.join(app.root_path, app.static_folder),
+                             os.path.join(app.root_path, app.static_folder, "mind"),
+                             url_prefix="/static/mind",
+                             command=os.environ.get("MIND_COMPILER", "node scripts/compile-mind.mjs {output} {inputs}"),
+                             cwd=app.root_path)
+mind_compiler.on_compiled = lambda category: catalog_cache.touch()
+if shared_cache is not None:
+    mind_compiler.lock_for = lambda name: shared_cache.lock("mind-" + name)
+
+# per-(category, host_url) link payloads and rendered pages, rebuilt when the catalog generation moves
+payload_cache = RenderCache()
+page_cache = RenderCache()
+
+def _render_index(models_by_category, current_category, host_url, device_class, generation):
+    current_models = models_by_category.get(current_category, [])
+
+    def enrich():
+        with metrics.phase("enrich"):
+            entries = enrich_models_for_links(current_models, host_url, device_class)
+            return entries, model_manifest(current_models, entries, device_class)
+    models, manifest = payload_cache.get((current_category, host_url, device_class), generation, enrich)
+    # hand-built static/<category>.mind until the compiled one is ready
+    with metrics.phase("mind"):
+        mind_src = mind_compiler.lookup(current_category, current_models) or f"static/{current_category}.mind"
+    with metrics.phase("render"):
+        body = render_template("index.html",
+                               categories=sorted(models_by_category.keys()),
+                               current_category=current_category,
+                               mind_src=mind_src,
+                               audio_sprite=audio_variants.sprite(current_category),
+                               models=models,
+                               model_manifest=manifest)
+    etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    return body, etag
+
 @app.route("/")
 def index():
     # load all models grouped by category
-    models_by_category = fetch_all_models_grouped()
-    categories = sorted(models_by_category.keys())
+    with metrics.phase("catalog"):
+        models_by_category = catalog_cache.get()
+    return index_response(models_by_category, catalog_cache.generation)
 
-    requested = request.args.get("category")
-    current_category = requested.lower() if requested and requested.lower() in models_by_category else (categories[0] if categories else "uncategorized")
-    current_models = models_by_category.get(current_category, [])
+def pick_category(models_by_category, requested):
+    """The category `/` shows for a `?category=` value: that one if it exists, else the first."""
+    requested = category_key(requested) if requested else None
+    if requested in models_by_category:
+        return requested
+    return min(models_by_category.keys(), default="uncategorized")
+
+def index_page(models_by_category, generation):
+    """`(key, generation, render)` of the `/` page for the current request, for `page_cache`."""
+    current_category = pick_category(models_by_category, request.args.get("category"))
+
+    host_url = request.host_url
+    device_class = device_class_for(request.headers, request.args.get("quality"))
+    generation = (generation, model_variants.refresh(), image_derivatives.refresh(), audio_variants.refresh())
+    return ((current_category, host_url, device_class), generation,
+            lambda: _render_index(models_by_category, current_category, host_url, device_class, generation))
+
+def index_response(models_by_category, generation):
+    """The `/` response for the current request, given an already loaded catalog."""
+    return page_response(*page_cache.get(*index_page(models_by_category, generation)))
+
+def page_response(body, etag):
+    """The `/` response for a rendered page."""
+    if request.if_none_match.contains(etag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(body)
+    resp.set_etag(etag)
+    # let browsers keep the page but check back, so a catalog change shows up immediately
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Vary"] = "User-Agent, Save-Data, Device-Memory"
+    resp.headers["Accept-CH"] = "Device-Memory, Save-Data"
+    return resp
+
+# flattened API order and encoded /api/models responses, per catalog generation
+api_cache = RenderCache(max_entries=256)
+
+@app.route("/api/models")
+def api_models():
+    with metrics.phase("catalog"):
+        models_by_category = catalog_cache.get()
+    generation = catalog_cache.generation
+    args = request.args
+    category = category_key(args.get("category")) if args.get("category") else None
+    fields = args.get("fields") or ""
+    cursor = args.get("cursor") or None
+    host_url = request.host_url
+    try:
+        limit = catalog_api.parse_limit(args.get("limit"))
+        paths = catalog_api.parse_fields(fields)
+
+        def build():
+            # one category is flattened on its own, so a category-mode catalog reads only that one
+            source = {category: models_by_category.get(category, [])} if category else models_by_category
+            flat, keys = api_cache.get(("flat", category), generation,
+                                       lambda: catalog_api.flatten_catalog(source))
+            entries, next_cursor = catalog_api.page(flat, keys, category, cursor, limit)
+            items = [catalog_api.project(m.to_dict(host_url), paths) for m in entries]
+            return catalog_api.encode_body({
+                "generation": generation,
+                "category": category,
+                "count": len(items),
+                "next_cursor": next_cursor,
+                "items": items,
+            })
+        body, etag = api_cache.get(("page", category, cursor, limit, fields, host_url), generation, build)
+    except catalog_api.ApiError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    coding = catalog_api.choose_encoding(request.headers.get("Accept-Encoding"))
+    # strong validators must differ per representation
+    tag = f"{etag}-{coding}" if coding else etag
+    if request.if_none_match.contains(tag):
+        resp = make_response("", 304)
+    else:
+        if coding:
+            data = api_cache.get(("coded", etag, coding), generation,
+                                 lambda: catalog_api.compress(body, coding))
+        else:
+            data = body
+        resp = make_response(data)
+        resp.headers["Content-Type"] = "application/json"
+        if coding:
+            resp.headers["Content-Encoding"] = coding
+    resp.set_etag(tag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/api/search")
+def api_search():
+    with metrics.phase("catalog"):
+        models_by_category = catalog_cache.get()
+    args = request.args
+    category = category_key(args.get("category")) if args.get("category") else None
+    try:
+        query = catalog_api.parse_query(args.get("q"))
+        limit = catalog_api.parse_limit(args.get("limit"), catalog_api.SEARCH_DEFAULT_LIMIT,
+                                        catalog_api.SEARCH_MAX_LIMIT)
+        paths = catalog_api.parse_fields(args.get("fields"))
+    except catalog_api.ApiError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if category is not None:
+        models_by_category.get(category)  # a category-mode catalog reads (and indexes) it now
+    with metrics.phase("search"):
+        results = search_index.search(query, limit, category)
+    host_url = request.host_url
+    items = [dict(catalog_api.project(m.to_dict(host_url), paths), score=score) for score, m in results]
+    body, etag = catalog_api.encode_body({
+        "generation": catalog_cache.generation,
+        "query": query,
+        "category": category,
+        "count": len(items),
+        "items": items,
+    })
+    if request.if_none_match.contains(etag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(body)
+        resp.headers["Content-Type"] = "application/json"
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+# per-request phase timings: Server-Timing header, latency histogram and a JSON log line
+TIMING_LOG = os.environ.get("TIMING_LOG", "slow")  # slow (>= SLOW_REQUEST_MS), all or off
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+
+@app.before_request
+def _start_timing():
+    # the ASGI app stamps the start before it awaits the catalog
+    metrics.start_request(request.environ.get("learn.request_start"))
+
+@app.after_request
+def _finish_timing(resp):
+    timings = metrics.current_request()
+    if timings is None:
+        return resp
+    total = timings.elapsed()
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.observe("http_request_duration_seconds", total,
+                    route=route, method=request.method, status=resp.status_code)
+    resp.headers["Server-Timing"] = timings.server_timing(total)
+    if TIMING_LOG == "all" or (TIMING_LOG == "slow" and total * 1000 >= SLOW_REQUEST_MS):
+        print(json.dumps({
+            "ts": round(time.time(), 3),
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": resp.status_code,
+            "ms": round(total * 1000, 2),
+            "phases": {name: round(seconds * 1000, 2) for name, seconds in timings.phases.items()},
+        }), file=sys.stderr)
+    return resp
+
+@app.teardown_request
+def _clear_timing(exc):
+    metrics.finish_request()
+
+def _collect():
+    """Counters the app already keeps, sampled when /metrics is scraped."""
+    for key, value in catalog_cache.stats.items():
+        yield "catalog_cache_events_total", {"event": key}, value
+    yield "catalog_generation", {}, catalog_cache.generation
+    yield "catalog_listening", {}, int(catalog_cache.listening)
+    for name, cache in (("payload", payload_cache), ("page", page_cache), ("api", api_cache)):
+        yield "render_cache_requests_total", {"cache": name, "result": "hit"}, cache.stats["hits"]
+        yield "render_cache_requests_total", {"cache": name, "result": "miss"}, cache.stats["misses"]
+    writer = activation_writer.metrics()
+    for key in ("enqueued", "coalesced", "written", "failed", "batches", "flushes"):
+        yield "activations_total", {"event": key}, writer[key]
+    yield "activation_queue_depth", {}, writer["queue_depth"]
+    yield "activation_flush_seconds_max", {}, writer["max_flush_seconds"]
+    yield "asset_downloads_pending", {}, asset_prefetcher.report()["pending"]
+    if shared_cache is not None:
+        yield "catalog_leader", {}, int(shared_cache.is_leader("catalog"))
+    if category_index is not None:
+        for key, value in category_index.stats.items():
+            yield "category_index_events_total", {"event": key}, value
+    for key, value in catalog_snapshots.stats.items():
+        yield "catalog_snapshot_writes_total", {"result": key}, value
+    documents, tokens = search_index.counts()
+    yield "search_index_documents", {}, documents
+    yield "search_index_tokens", {}, tokens
+
+for _name, _kind, _help in (
+        ("catalog_cache_events_total", "counter", "Catalog cache hits, misses, refreshes and resolved documents."),
+        ("catalog_generation", "gauge", "Current catalog generation."),
+        ("catalog_listening", "gauge", "1 while the Firestore snapshot listener is attached."),
+        ("render_cache_requests_total", "counter", "Rendered payload/page/API cache lookups by result."),
+        ("activations_total", "counter", "Activation write-behind events."),
+        ("activation_queue_depth", "gauge", "Documents waiting for the next activation flush."),
+        ("activation_flush_seconds_max", "gauge", "Slowest activation flush so far."),
+        ("asset_downloads_total", "counter", "Finished asset downloads by kind and result."),
+        ("asset_download_bytes_total", "counter", "Bytes downloaded into the asset store."),
+        ("asset_downloads_pending", "gauge", "Asset downloads in flight."),
+        ("catalog_snapshot_writes_total", "counter", "Catalog snapshot writes, skipped unchanged catalogs and errors."),
+        ("category_index_events_total", "counter", "categoryKey backfills and summary writes, skipped and failed."),
+        ("catalog_leader", "gauge", "1 in the worker that reads Firestore for the host (SHARED_CACHE)."),
+        ("shared_cache_docs_read_total", "counter", "Catalog documents read from the shared cache."),
+        ("search_index_documents", "gauge", "Documents in the /api/search index."),
+        ("search_index_tokens", "gauge", "Distinct name and description tokens in the /api/search index.")):
+    metrics.describe(_name, _kind, _help)
+metrics.add_collector(_collect)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# boot: Firebase, the catalog and its assets load in a background thread while the server
+# already accepts connections; /readyz answers 200 once the warm catalog is in
+IMPORT_BUDGET_S = float(os.environ.get("IMPORT_BUDGET_S", "1"))
+READY_BUDGET_S = float(os.environ.get("READY_BUDGET_S", "15"))
+WARMUP_ASSET_TIMEOUT = float(os.environ.get("WARMUP_ASSET_TIMEOUT", str(ASSET_WAIT_TIMEOUT * 3)))
+startup = {"state": "idle", "import_s": None, "ready_s": None, "stages": {}, "attempts": 0, "error": None}
+_warmup_lock = threading.Lock()
+
+def start_warmup(load_catalog=None):
+    """Warm this process in a background thread; later calls do nothing.
+
+    `load_catalog` fills catalog_cache and returns the grouped catalog
+    (default `catalog_cache.get` and the default category; the ASGI app
+    passes its async reader).
+    """
+    if startup["state"] != "idle":
+        return None
+    with _warmup_lock:
+        if startup["state"] != "idle":
+            return None
+        startup["state"] = "warming"
+    thread = threading.Thread(target=_warm, args=(load_catalog or _load_catalog,),
+                              name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+def _load_catalog():
+    models_by_category = catalog_cache.get()
+    # a category-mode catalog reads the category `/` shows by default here
+    models_by_category.get(pick_category(models_by_category, None))
+    return models_by_category
+
+def _stage(name, fn):
+    start = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        seconds = time.perf_counter() - start
+        startup["stages"][name] = round(startup["stages"].get(name, 0) + seconds, 3)
+        metrics.set_gauge("startup_seconds", seconds, stage=name)
+
+def _wait_for_downloads():
+    deadline = time.perf_counter() + WARMUP_ASSET_TIMEOUT
+    while asset_prefetcher.report()["pending"] and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    return asset_prefetcher.report()["pending"]
+
+def _warm(load_catalog):
+    models_by_category = None
+    try:
+        _stage("templates", lambda: app.jinja_env.get_template("index.html"))
+        if CATALOG_SNAPSHOT_POLICY in ("prefer", "only"):
+            only = CATALOG_SNAPSHOT_POLICY == "only"
+
+            def seed():
+                docs = snapshot_documents(None if only else CATALOG_SNAPSHOT_MAX_AGE)
+                # served right away; unless `only`, it stays stale so Firestore replaces it
+                if (docs is not None or only) and catalog_cache.seed(docs or [], stale=not only):
+                    return len(docs or [])
+                return None
+            seeded = _stage("snapshot", seed)
+            if seeded is not None:
+                models_by_category = catalog_cache.get() if only else None
+                _ready(seeded)
+        if CATALOG_SNAPSHOT_POLICY != "only":
+            # the slow imports and the credentials, off the request path; on failure the
+            # catalog read below fails too and falls back to the snapshot
+            try:
+                _stage("firebase", get_db)
+            except Exception as e:
+                print("Error initializing Firebase:", e, file=sys.stderr)
+            delay = 1
+            while True:
+                startup["attempts"] += 1
+                models_by_category = _stage("catalog", load_catalog)
+                if catalog_cache.loaded:
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+    except Exception as e:
+        startup["state"] = "failed"
+        startup["error"] = str(e) or type(e).__name__
+        print("Warmup failed:", startup["error"], file=sys.stderr)
+        return
+    if startup["state"] != "ready":
+        _ready(catalog_cache.counts()[0])
+
+    # pages serve remote asset urls until the downloads land, so traffic need not wait for them
+    pending = _stage("assets", _wait_for_downloads)
+    # schedules the .mind compiles now that the targets are local
+    # a category-mode catalog compiles what it has read; the rest compile on first view
+    groups = getattr(models_by_category, "loaded_items", models_by_category.items)()
+    _stage("mind", lambda: [mind_compiler.lookup(cat, models) for cat, models in groups])
+    print(f"Warmup done: assets settled in {startup['stages']['assets']:.2f}s, "
+          f"{pending} download(s) still pending", file=sys.stderr)
+
+def _ready(documents):
+    ready = time.perf_counter() - _IMPORT_STARTED
+    startup["ready_s"] = round(ready, 3)
+    startup["state"] = "ready"
+    metrics.set_gauge("startup_seconds", ready, stage="ready")
+    stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup["stages"].items())
+    print(f"Ready in {ready:.2f}s ({stages}): {documents} document(s) from {catalog_cache.source}",
+          file=sys.stderr)
+    if ready > READY_BUDGET_S:
+        print(f"Warning: startup took {ready:.2f}s, over the {READY_BUDGET_S:g}s budget", file=sys.stderr)
+
+def is_ready():
+    """The catalog has been read and the warmup is past it."""
+    return catalog_cache.loaded and startup["state"] != "warming"
+
+@app.before_request
+def _ensure_warmup():
+    # servers without a startup hook (flask run, plain WSGI containers) warm up on the first request
+    start_warmup()
+
+@app.route("/healthz")
+def healthz():
+    return jsonify({"ok": True, "uptime_s": round(time.perf_counter() - _IMPORT_STARTED, 3)})
+
+@app.route("/readyz")
+def readyz():
+    models, categories = catalog_cache.counts()
+    body = {
+        "ready": is_ready(),
+        "state": startup["state"],
+        "models": models,
+        "categories": categories,
+        "catalog_source": catalog_cache.source,
+        "catalog_mode": CATALOG_MODE,
+        "catalog_role": None if shared_cache is None else
+        ("leader" if shared_cache.is_leader("catalog") else "follower"),
+        "assets_pending": asset_prefetcher.report()["pending"],
+        "import_s": startup["import_s"],
+        "ready_s": startup["ready_s"],
+        "stages": startup["stages"],
+        "attempts": startup["attempts"],
+    }
+    if startup["error"]:
+        body["error"] = startup["error"]
+    resp = jsonify(body)
+    resp.status_code = 200 if body["ready"] else 503
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+metrics.describe("startup_seconds", "gauge", "Time spent in each warmup stage; `ready` is import to ready.")
+metrics.describe("ready", "gauge", "1 once /readyz reports ready.")
+metrics.add_collector(lambda: [("ready", {}, int(is_ready()))])
 
-    def enrich_models_for_links(models):
-        out = []
-        for m in models:
-            model_src = m.get("src", "")
-            if model_src and model_src.startswith("/"):
-                abs_src = request.host_url.rstrip("/") + model_src
-            else:
-                abs_src = model_src
-            scene_link = "https://arvr.google.com/scene-viewer/1.0?file=" + quote_plus(abs_src) + "&mode=ar_preferred"
-            intent_link = ("intent://arvr.google.com/scene-viewer/1.0?file=" + quote_plus(abs_src) +
-                           "&mode=ar_preferred#Intent;scheme=https;package=com.google.android.googlequicksearchbox;action=android.intent.action.VIEW;end")
-            entry = dict(m)
-            entry["abs_src"] = abs_src
-            entry["scene_link"] = scene_link
-            entry["intent_link"] = intent_link
-            out.append(entry)
-        return out
-
-    current_models_enriched = enrich_models_for_links(current_models)
-
-    return render_template("index.html",
-                           categories=categories,
-                           current_category=current_category,
-                           models=current_models_enriched)
+startup["import_s"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+metrics.set_gauge("startup_seconds", startup["import_s"], stage="import")
+if startup["import_s"] > IMPORT_BUDGET_S:
+    print(f"Warning: importing server.py took {startup['import_s']:.2f}s, over the {IMPORT_BUDGET_S:g}s budget",
+          file=sys.stderr)
 
 if __name__ == "__main__":
+    # under the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warmup()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,325 @@
+"""Host-wide cache shared by the worker processes of one deployment.
+
+    shared = SharedCache("cache/shared.sqlite3")
+    store = AssetStore(..., shared=shared)        # one asset manifest for every worker
+    with shared.download_lock(url): ...           # one process downloads a url at a time
+    if shared.leads("catalog"):                   # the one worker that reads Firestore...
+        shared.publish_catalog(docs)              # ...publishes every catalog change
+    SharedCatalogClient(shared)                   # the others read it as if it were Firestore
+
+Everything lives in one SQLite database in WAL mode, so readers never
+wait for the writer and a write is one short transaction. Every catalog
+publish bumps a generation number; followers poll it (a single-row read)
+and fetch only the documents changed since the generation they have.
+
+Locks are `flock`s on files next to the database. They are released by
+the kernel when a process dies, so a crashed downloader or leader never
+wedges the others; whoever asks next takes over.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import types
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): SharedCache refuses to start, the app runs unshared
+    fcntl = None
+
+from catalog_snapshot import SnapshotDoc
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS assets (url TEXT PRIMARY KEY, record TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS catalog (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data TEXT,                      -- NULL once the document was removed
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (collection, doc_id)
+);
+CREATE INDEX IF NOT EXISTS catalog_generation ON catalog (collection, generation);
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class FileLock:
+    """Exclusive `flock` on `path`, across processes and threads (each acquire opens its own fd)."""
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def acquire(self, timeout=None):
+        """Take the lock; False if `timeout` seconds pass first (0: don't wait, None: wait forever)."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX if deadline is None else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        os.close(fd)
+                        return False
+                    time.sleep(0.02)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def __enter__(self):
+        # past the timeout the caller proceeds unlocked: a duplicate download beats a stuck worker
+        self.acquire(self.timeout)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SharedCache:
+    """The SQLite database at `path`; see the module docstring."""
+
+    def __init__(self, path, lock_timeout=120):
+        if fcntl is None:
+            raise RuntimeError("SHARED_CACHE needs fcntl.flock, which this platform lacks")
+        self.path = path
+        self.lock_dir = os.path.splitext(path)[0] + ".locks"
+        self.lock_timeout = lock_timeout
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._local = threading.local()
+        self._leases = {}  # name -> FileLock held for the life of the process
+        self._lease_lock = threading.Lock()
+        conn = self._conn()
+        # the first process to get here creates the schema; WAL mode is stored in the file
+        with self.lock("schema"):
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        # one connection per thread and process: sqlite connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _bump(conn, key):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, 1) "
+                     "ON CONFLICT (key) DO UPDATE SET value = value + 1", (key,))
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    # locks
+
+    def lock(self, name, timeout=None):
+        """FileLock for `name` (a short identifier); use it as a context manager."""
+        return FileLock(os.path.join(self.lock_dir, name + ".lock"), timeout)
+
+    def download_lock(self, url):
+        return self.lock("dl-" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:20], self.lock_timeout)
+
+    def leads(self, name):
+        """True if this process holds (or just took) the lease `name`; it is kept until exit."""
+        with self._lease_lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease.locked:
+                return True
+            lease = self.lock("lead-" + name)
+            if not lease.acquire(timeout=0):
+                return False
+            self._leases[name] = lease
+            return True
+
+    def is_leader(self, name):
+        with self._lease_lock:
+            lease = self._leases.get(name)
+            return lease is not None and lease.locked
+
+    # assets
+
+    def asset(self, url):
+        row = self._conn().execute("SELECT record FROM assets WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def assets(self):
+        return {url: json.loads(record) for url, record in self._conn().execute("SELECT url, record FROM assets")}
+
+    def put_asset(self, url, rec):
+        self._transaction(lambda conn: conn.execute(
+            "INSERT INTO assets (url, record) VALUES (?, ?) "
+            "ON CONFLICT (url) DO UPDATE SET record = excluded.record", (url, _dumps(rec))))
+
+    def drop_assets(self, urls):
+        self._transaction(lambda conn: conn.executemany("DELETE FROM assets WHERE url = ?", [(u,) for u in urls]))
+
+    def import_assets(self, records):
+        """Seed the shared manifest from a per-process one; only while it is still empty."""
+        def seed(conn):
+            if conn.execute("SELECT 1 FROM assets LIMIT 1").fetchone():
+                return 0
+            conn.executemany("INSERT INTO assets (url, record) VALUES (?, ?)",
+                             [(url, _dumps(rec)) for url, rec in records.items()])
+            return len(records)
+        return self._transaction(seed)
+
+    # catalog
+
+    def catalog_generation(self, collection="models"):
+        return self._meta("catalog:" + collection)
+
+    def publish_catalog(self, docs, collection="models"):
+        """Store the full `{doc_id: data}` catalog; returns the new generation, or None if unchanged."""
+        encoded = {doc_id: _dumps(data) for doc_id, data in docs.items()}
+
+        def publish(conn):
+            current = dict(conn.execute("SELECT doc_id, data FROM catalog WHERE collection = ?", (collection,)))
+            upserts = [(doc_id, data) for doc_id, data in encoded.items() if current.get(doc_id) != data]
+            removed = [doc_id for doc_id, data in current.items() if data is not None and doc_id not in encoded]
+            generation = self._meta("catalog:" + collection)
+            if not upserts and not removed and generation:
+                return None
+            generation = self._bump(conn, "catalog:" + collection)
+            conn.executemany("INSERT INTO catalog (collection, doc_id, data, generation) VALUES (?, ?, ?, ?) "
+                             "ON CONFLICT (collection, doc_id) DO UPDATE SET data = excluded.data, "
+                             "generation = excluded.generation",
+                             [(collection, doc_id, data, generation) for doc_id, data in upserts])
+            conn.executemany("UPDATE catalog SET data = NULL, generation = ? WHERE collection = ? AND doc_id = ?",
+                             [(generation, collection, doc_id) for doc_id in removed])
+            return generation
+        return self._transaction(publish)
+
+    def read_catalog(self, since=0, collection="models"):
+        """(generation, {doc_id: data}, [removed ids]) for changes after generation `since`."""
+        conn = self._conn()
+        # one read transaction, so the generation matches the rows
+        conn.execute("BEGIN")
+        try:
+            generation = self._meta("catalog:" + collection)
+            rows = conn.execute("SELECT doc_id, data FROM catalog WHERE collection = ? AND generation > ?",
+                                (collection, since)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        upserts = {doc_id: json.loads(data) for doc_id, data in rows if data is not None}
+        removed = [doc_id for doc_id, data in rows if data is None]
+        return generation, upserts, removed
+
+
+class SharedCatalogClient:
+    """The shared catalog behind the slice of the Firestore client CatalogCache uses.
+
+    `collection(name).stream()` waits up to `wait` seconds for the leader's
+    first publish, then returns the stored documents; `on_snapshot` polls
+    the generation every `poll` seconds and delivers changes like a
+    Firestore listener. `on_poll()`, if set, runs on every poll (server.py
+    uses it to take over when the leader is gone).
+    """
+
+    reads_metric = "shared_cache_docs_read_total"
+
+    def __init__(self, shared, poll=0.5, wait=30):
+        self.shared = shared
+        self.poll = poll
+        self.wait = wait
+        self.on_poll = None
+        self._generations = {}  # collection -> generation of the last stream()
+
+    def collection(self, name):
+        return _SharedCollection(self, name)
+
+    def async_client(self):
+        """The same reads for `firestore_async`-style callers (asgi_app.AsyncCatalog)."""
+        return types.SimpleNamespace(collection=lambda name: _AsyncSharedCollection(self.collection(name)),
+                                     reads_metric=self.reads_metric)
+
+
+class _SharedCollection:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def stream(self):
+        shared = self._client.shared
+        deadline = time.monotonic() + self._client.wait
+        while shared.catalog_generation(self._name) == 0:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"no catalog in the shared cache after {self._client.wait}s")
+            time.sleep(0.05)
+        generation, docs, _ = shared.read_catalog(0, self._name)
+        self._client._generations[self._name] = generation
+        return [SnapshotDoc(doc_id, data) for doc_id, data in docs.items()]
+
+    def on_snapshot(self, callback):
+        stop = threading.Event()
+        since = self._client._generations.get(self._name, 0)
+
+        def run():
+            nonlocal since
+            while not stop.wait(self._client.poll):
+                if self._client.on_poll is not None:
+                    self._client.on_poll()
+                try:
+                    if self._client.shared.catalog_generation(self._name) == since:
+                        continue
+                    since, docs, removed = self._client.shared.read_catalog(since, self._name)
+                except sqlite3.Error as e:
+                    print("Error polling the shared catalog:", e, file=sys.stderr)
+                    continue
+                changes = [_change("MODIFIED", SnapshotDoc(doc_id, data)) for doc_id, data in docs.items()]
+                changes += [_change("REMOVED", SnapshotDoc(doc_id, None)) for doc_id in removed]
+                if changes and not stop.is_set():
+                    callback(None, changes, time.time())
+
+        threading.Thread(target=run, name="shared-catalog-poll", daemon=True).start()
+        return types.SimpleNamespace(unsubscribe=stop.set)
+
+
+class _AsyncSharedCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def stream(self):
+        import asyncio
+        for doc in await asyncio.to_thread(self._collection.stream):
+            yield doc
+
+
+def _change(kind, doc):
+    return types.SimpleNamespace(type=types.SimpleNamespace(name=kind), document=doc)
@@ -0,0 +1,227 @@
+"""Static file serving for the app: fingerprinted urls, precompressed sidecars, Range and sendfile.
+
+`StaticAssets.serve` replaces Flask's default `static` endpoint:
+
+- `asset_url("aframe.min.js")` in templates returns `/static/aframe.min.js?v=<content hash>`.
+  A request whose `v` matches the file's current hash, and anything
+  under the content-addressed folders (cas, models_opt, ...), is sent
+  with `Cache-Control: public, max-age=31536000, immutable`. Everything
+  else is `no-cache`, so it is revalidated with its ETag.
+- `.br`/`.gz` sidecars built by `python static_assets.py` are served
+  to clients that accept them. Range requests always get the identity
+  bytes, with correct 206/416 handling from werkzeug.
+- Files go out through `wsgi.file_wrapper`, which gunicorn turns into
+  sendfile(2). With STATIC_OFFLOAD=x-accel the body is left to nginx
+  through `X-Accel-Redirect`; map the two internal locations to the
+  static folder and the sidecar folder:
+
+      location /internal-static/static/       { internal; alias /srv/app/static/; }
+      location /internal-static/precompressed/ { internal; alias /srv/app/cache/precompressed/; }
+
+  STATIC_OFFLOAD=x-sendfile sets `X-Sendfile` instead (Apache
+  mod_xsendfile, lighttpd).
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+from urllib.parse import quote
+
+from flask import Response, abort, send_file
+from werkzeug.security import safe_join
+
+import catalog_api
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz sidecars are built without it
+    brotli = None
+
+IMMUTABLE_DIRS = ("cas/", "models_opt/", "images_opt/", "audio_opt/", "mind/")
+COMPRESSIBLE_EXTS = {".js", ".css", ".json", ".svg", ".html", ".txt", ".glb", ".gltf", ".wav", ".mind"}
+SIDECAR_EXTS = {"br": ".br", "gzip": ".gz"}
+# sidecars that save less than this are not worth a second representation
+MIN_SAVINGS = 0.05
+IMMUTABLE = "public, max-age=31536000, immutable"
+OFFLOAD_MODES = ("x-accel", "x-sendfile")
+
+for _type, _ext in (("model/gltf-binary", ".glb"), ("model/gltf+json", ".gltf"), ("image/webp", ".webp"),
+                    ("image/avif", ".avif"), ("audio/mp4", ".m4a"), ("audio/ogg", ".ogg"),
+                    ("application/octet-stream", ".mind")):
+    mimetypes.add_type(_type, _ext)
+
+
+class StaticAssets:
+    def __init__(self, root, sidecar_dir, url_prefix="/static", offload=None, accel_prefix="/internal-static/"):
+        if offload and offload not in OFFLOAD_MODES:
+            raise ValueError(f"unknown static offload mode {offload!r}")
+        self.root = root
+        self.sidecar_dir = sidecar_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.offload = offload or None
+        self.accel_prefix = "/" + accel_prefix.strip("/") + "/"
+        self._lock = threading.Lock()
+        self._hashes = {}  # rel -> (mtime_ns, size, short sha256)
+
+    def fingerprint(self, rel):
+        """Short content hash of a file under the static root, or None if it does not exist."""
+        path = safe_join(self.root, rel)
+        try:
+            st = os.stat(path) if path else None
+        except OSError:
+            st = None
+        if st is None:
+            return None
+        with self._lock:
+            cached = self._hashes.get(rel)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()[:12]
+        with self._lock:
+            self._hashes[rel] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def url(self, rel):
+        """Fingerprinted url of a file under the static root (for templates)."""
+        rel = rel.lstrip("/")
+        fp = self.fingerprint(rel)
+        url = f"{self.url_prefix}/{quote(rel)}"
+        return f"{url}?v={fp}" if fp else url
+
+    def versioned(self, url):
+        """Add the fingerprint to a served /static/ url; other urls are returned unchanged."""
+        prefix = self.url_prefix + "/"
+        if not url or not url.startswith(prefix) or "?" in url:
+            return url
+        rel = url[len(prefix):]
+        if rel.startswith(IMMUTABLE_DIRS):
+            return url  # already content-addressed
+        fp = self.fingerprint(rel)
+        return f"{url}?v={fp}" if fp else url
+
+    def sidecar_path(self, rel, coding):
+        return os.path.join(self.sidecar_dir, *rel.split("/")) + SIDECAR_EXTS[coding]
+
+    def serve(self, rel, request):
+        path = safe_join(self.root, rel)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        v = request.args.get("v")
+        immutable = rel.startswith(IMMUTABLE_DIRS) or (v is not None and v == self.fingerprint(rel))
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        coding = None
+        compressible = os.path.splitext(rel)[1].lower() in COMPRESSIBLE_EXTS
+        # a byte range always refers to the identity representation
+        if compressible and "Range" not in request.headers:
+            src_mtime = os.stat(path).st_mtime_ns
+            fresh = tuple(c for c in SIDECAR_EXTS if _mtime(self.sidecar_path(rel, c)) >= src_mtime)
+            coding = catalog_api.choose_encoding(request.headers.get("Accept-Encoding"), fresh) if fresh else None
+        file_path = self.sidecar_path(rel, coding) if coding else path
+
+        if self.offload == "x-accel":
+            resp = Response(status=200, mimetype=mimetype)
+            if coding:
+                internal = "precompressed/" + rel + SIDECAR_EXTS[coding]
+            else:
+                internal = "static/" + rel
+            resp.headers["X-Accel-Redirect"] = self.accel_prefix + quote(internal)
+        else:
+            # x-sendfile mode is app.use_x_sendfile; send_file adds the header itself
+            resp = send_file(file_path, mimetype=mimetype, conditional=True, etag=True, max_age=None)
+        if coding:
+            resp.headers["Content-Encoding"] = coding
+        if compressible:
+            resp.vary.add("Accept-Encoding")
+        resp.headers["Cache-Control"] = IMMUTABLE if immutable else "no-cache"
+        return resp
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _compress(data, coding):
+    if coding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def build_sidecars(root, sidecar_dir, exts=COMPRESSIBLE_EXTS):
+    """Write .br/.gz next to a mirror of `root` for every compressible file; returns per-file stats."""
+    codings = [c for c in SIDECAR_EXTS if c != "br" or brotli is not None]
+    report = {}
+    live = set()
+    for dirpath, _, files in os.walk(root):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in exts:
+                continue
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            src_mtime = os.stat(path).st_mtime_ns
+            size = os.path.getsize(path)
+            stats = {"bytes": size}
+            data = None
+            for coding in codings:
+                dest = os.path.join(sidecar_dir, *rel.split("/")) + SIDECAR_EXTS[coding]
+                if _mtime(dest) >= src_mtime:
+                    stats[coding] = os.path.getsize(dest)
+                    live.add(dest)
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                packed = _compress(data, coding)
+                if len(packed) > size * (1 - MIN_SAVINGS):
+                    continue
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = dest + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(packed)
+                os.replace(tmp, dest)
+                live.add(dest)
+                stats[coding] = len(packed)
+            report[rel] = stats
+    # drop sidecars of deleted files and ones that stopped paying off
+    for dirpath, _, files in os.walk(sidecar_dir):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if path not in live:
+                os.remove(path)
+    return report
+
+
+def print_report(report):
+    print(f"{'file':48} {'bytes':>10} {'br':>10} {'gzip':>10}")
+    before = after = 0
+    for rel in sorted(report):
+        stats = report[rel]
+        print(f"{rel[-48:]:48} {stats['bytes']:>10} {stats.get('br', ''):>10} {stats.get('gzip', ''):>10}")
+        before += stats["bytes"]
+        after += min(stats.get("br", stats["bytes"]), stats.get("gzip", stats["bytes"]))
+    if before:
+        print(f"Best encodings: {before} -> {after} bytes ({1 - after / before:.0%} saved)")
+    if brotli is None:
+        print("Notice: brotli is not installed, only .gz sidecars were built", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build precompressed .br/.gz sidecars for static files.")
+    parser.add_argument("--root", default="static")
+    parser.add_argument("--out", default="cache/precompressed")
+    args = parser.parse_args(argv)
+    print_report(build_sidecars(args.root, args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import firebase_admin
 from firebase_admin import credentials, firestore, storage
 from pathlib import Path
@@ -7,6 +8,7 @@ import os
 SERVICE_ACCOUNT = "serviceaccount.json"
 BUCKET_NAME = "learn-9fd4e.firebasestorage.app"  # same bucket used previously
 PREFIX = "targets/"
+MAX_BATCH_WRITES = 500  # Firestore limit per batch
 
 def init_firebase():
     cred = credentials.Certificate(SERVICE_ACCOUNT)
@@ -29,48 +31,106 @@ def make_download_url(bucket_name: str, blob):
         return blob.public_url
     return f"gs://{bucket_name}/{blob.name}"
 
-def main():
-    db, bucket = init_firebase()
-    print("Listing blobs under", PREFIX)
-    blobs = list(bucket.list_blobs(prefix=PREFIX))
-    if not blobs:
-        print("No blobs found under", PREFIX)
-        return
+def name_key(name):
+    return str(name or "").strip().casefold()
+
+def target_name(blob_name):
+    """("Cat.png", "cat") for "targets/<timestamp or hash>_Cat.png"."""
+    fname = Path(blob_name).name
+    # original filename after the timestamp/hash prefix (if present)
+    orig_fname = fname.split("_", 1)[1] if "_" in fname else fname
+    return orig_fname, name_key(Path(orig_fname).stem)
 
-    updated_docs = 0
-    skipped = 0
-    for blob in blobs:
-        # blob.name example: "targets/1761717104851_Cat.png"
-        fname = Path(blob.name).name  # "1761717104851_Cat.png"
-        # original filename after timestamp (if present)
-        if "_" in fname:
-            orig_fname = fname.split("_", 1)[1]
-        else:
-            orig_fname = fname
-        model_name = Path(orig_fname).stem  # "Cat"
-
-        url = make_download_url(bucket.name, blob)
+def build_model_index(db):
+    """All model docs, read once, as {normalized name: [(doc_id, current targetCard)]}."""
+    index = {}
+    reads = 0
+    for doc in db.collection("models").select(["name", "targetCard"]).stream():
+        reads += 1
+        data = doc.to_dict() or {}
+        index.setdefault(name_key(data.get("name")), []).append((doc.id, data.get("targetCard")))
+    return index, reads
+
+def plan_updates(blobs, bucket_name, index):
+    """Diff the cards the blobs imply against the index.
+
+    Returns (changes, unchanged, unmatched): changes is a list of
+    (doc_id, model_name, target_card); documents whose card is already
+    right are only counted.
+    """
+    # several uploads of the same target: the most recently written blob wins
+    latest = {}
+    for blob in sorted(blobs, key=lambda b: (b.updated is not None, b.updated or 0, b.name)):
+        orig_fname, key = target_name(blob.name)
+        latest[key] = (blob, orig_fname)
+
+    changes = []
+    unchanged = 0
+    unmatched = []
+    for key, (blob, orig_fname) in sorted(latest.items()):
+        docs = index.get(key)
+        if not docs:
+            unmatched.append(blob.name)
+            continue
         target_card = {
             "filename": orig_fname,
             "path": blob.name,
-            "url": url
+            "url": make_download_url(bucket_name, blob)
         }
+        for doc_id, current in docs:
+            if current == target_card:
+                unchanged += 1
+            else:
+                changes.append((doc_id, Path(orig_fname).stem, target_card))
+    return changes, unchanged, unmatched
 
-        docs = list(db.collection("models").where("name", "==", model_name).stream())
-        if not docs:
-            print(f"No model document with name='{model_name}' -> skipping (blob {blob.name})")
-            skipped += 1
-            continue
-
-        for doc in docs:
-            db.collection("models").document(doc.id).update({
+def apply_updates(db, changes):
+    col = db.collection("models")
+    batches = 0
+    for i in range(0, len(changes), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for doc_id, _, target_card in changes[i:i + MAX_BATCH_WRITES]:
+            batch.update(col.document(doc_id), {
                 "targetCard": target_card,
                 "updatedAt": firestore.SERVER_TIMESTAMP
             })
-            print(f"Updated model '{model_name}' (doc {doc.id}) -> targetCard {orig_fname}")
-            updated_docs += 1
+        batch.commit()
+        batches += 1
+    return batches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Point models' targetCard at the blobs under targets/.")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without writing")
+    args = parser.parse_args(argv)
+
+    db, bucket = init_firebase()
+    print("Listing blobs under", PREFIX)
+    blobs = list(bucket.list_blobs(prefix=PREFIX))
+    if not blobs:
+        print("No blobs found under", PREFIX)
+        return
+
+    index, reads = build_model_index(db)
+    changes, unchanged, unmatched = plan_updates(blobs, bucket.name, index)
+
+    for blob_name in unmatched:
+        print(f"No model document matching '{target_name(blob_name)[0]}' -> skipping (blob {blob_name})")
+    for doc_id, model_name, target_card in changes:
+        verb = "Would update" if args.dry_run else "Updating"
+        print(f"{verb} model '{model_name}' (doc {doc_id}) -> targetCard {target_card['path']}")
+
+    if args.dry_run:
+        batches = -(-len(changes) // MAX_BATCH_WRITES)
+    else:
+        batches = apply_updates(db, changes) if changes else 0
 
-    print(f"Done. Updated {updated_docs} model docs. Skipped {skipped} blobs with no matching model.")
+    # the old per-blob loop: one query per blob (billed at least one read each) and one write per match
+    old_reads = sum(max(1, len(index.get(target_name(b.name)[1], ()))) for b in blobs)
+    old_writes = sum(len(index.get(target_name(b.name)[1], ())) for b in blobs)
+    print(f"Done. {len(changes)} model docs {'to update' if args.dry_run else 'updated'} in {batches} batch(es), "
+          f"{unchanged} already up to date, {len(unmatched)} blobs with no matching model.")
+    print(f"Firestore: 1 query / {reads} reads (vs {len(blobs)} queries / {old_reads} reads), "
+          f"{len(changes)} writes (vs {old_writes}).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
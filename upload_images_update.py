@@ -1,10 +1,9 @@
 import os
 import json
-import time
-from typing import Optional
 import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud import storage
+from uploader import Uploader
 
 # CONFIG
 SERVICE_ACCOUNT_PATH = r"D:\laragon\www\LeARn\serviceaccount.json"
@@ -25,26 +24,6 @@ def init_firestore():
 def init_storage_client():
     return storage.Client.from_service_account_json(SERVICE_ACCOUNT_PATH)
 
-def upload_image(storage_client: storage.Client, local_path: str, dest_folder="images") -> Optional[dict]:
-    if not os.path.isfile(local_path):
-        print("Missing local image:", local_path)
-        return None
-    bucket = storage_client.bucket(BUCKET_NAME)
-    filename = os.path.basename(local_path)
-    dest_name = f"{dest_folder}/{int(time.time()*1000)}_{filename}"
-    blob = bucket.blob(dest_name)
-    try:
-        blob.upload_from_filename(local_path)
-        try:
-            blob.make_public()
-            url = blob.public_url
-        except Exception:
-            url = blob.generate_signed_url(expiration=int(time.time()) + 3600 * 24 * 365)
-        return {"filename": filename, "path": dest_name, "url": url}
-    except Exception as e:
-        print(f"Upload failed for {local_path}: {e}")
-        return None
-
 def main():
     db = init_firestore()
     storage_client = init_storage_client()
@@ -67,16 +46,27 @@ def main():
         print("No Thumb entries found in data.json")
         return
 
-    # upload images and produce mapping name -> uploaded image object
-    uploaded_map = {}
+    # upload images concurrently and produce mapping name -> uploaded image object
+    uploader = Uploader(storage_client.bucket(BUCKET_NAME), make_public=True)
+    to_upload = []
     for name, thumb in name_to_thumb.items():
         local_img = os.path.join(ASSETS_IMAGES_DIR, thumb)
-        uploaded = upload_image(storage_client, local_img)
-        if uploaded:
-            uploaded_map[name] = uploaded
-            print("Uploaded image for", name, "->", uploaded["path"])
+        if os.path.isfile(local_img):
+            to_upload.append((name, local_img))
+        else:
+            print("Missing local image:", local_img)
+            print("Skipped image for", name)
+    results = uploader.upload_many([p for _, p in to_upload], "images")
+    uploader.shutdown()
+    uploaded_map = {}
+    for (name, _), result in zip(to_upload, results):
+        if result.ok:
+            uploaded_map[name] = result.as_ref()
+            note = " (unchanged)" if result.skipped else ""
+            print(f"Uploaded image for {name} -> {result.path}{note}")
         else:
             print("Skipped image for", name)
+    uploader.report()
 
     if not uploaded_map:
         print("No images uploaded; nothing to update.")
@@ -1,9 +1,8 @@
-import time
-import mimetypes
 from pathlib import Path
 
 import firebase_admin
 from firebase_admin import credentials, firestore, storage
+from uploader import Uploader
 
 # Init Firebase app (uses serviceaccount.json in project root)
 SERVICE_ACCOUNT = "serviceaccount.json"
@@ -35,23 +34,19 @@ def upload_and_update_targets(dir_path: Path = TARGETS_DIR):
     updated = 0
     created = 0
 
-    for f in files:
+    # upload everything concurrently; unchanged files keep their existing object
+    uploader = Uploader(bucket, make_public=True)
+    results = uploader.upload_many(files, "targets")
+    uploader.shutdown()
+    uploader.report()
+
+    for f, result in zip(files, results):
         total += 1
         orig_name = f.name  # e.g. "Cat.png"
-        upload_name = f"targets/{int(time.time() * 1000)}_{orig_name}"
-        mime = mimetypes.guess_type(str(f))[0] or "application/octet-stream"
-
-        blob = bucket.blob(upload_name)
-        print(f"Uploading {orig_name} -> {upload_name} ...")
-        blob.upload_from_filename(str(f), content_type=mime)
-
-        # Make public (simpler) and get URL
-        try:
-            blob.make_public()
-            url = blob.public_url
-        except Exception:
-            # fallback: signed url (short-lived) if ACL not allowed; still proceed
-            url = blob.generate_signed_url(expiration=3600)
+        if not result.ok:
+            continue
+        upload_name = result.path
+        url = result.url
 
         # Try to find matching Firestore docs by 'filename' or 'name'
         docs = list(db.collection("targets").where("filename", "==", orig_name).stream())
@@ -80,9 +75,6 @@ def upload_and_update_targets(dir_path: Path = TARGETS_DIR):
             print(f"Created new Firestore doc for '{orig_name}'")
             created += 1
 
-        # small delay to ensure unique timestamps for upload_name
-        time.sleep(0.05)
-
     print(f"Done. Processed {total} files. Updated {updated} docs. Created {created} docs.")
 
 if __name__ == "__main__":
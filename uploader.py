@@ -0,0 +1,160 @@
+"""Concurrent, skip-unchanged uploads to Firebase Storage / GCS.
+
+Shared by config/insert.py, upload_images_update.py and upload_targets.py.
+Object names are `<prefix>/<md5[:16]>_<filename>`: the same bytes always
+map to the same object, so re-running a script finds the existing blob,
+compares its MD5/CRC32C with the local file and skips it. Large files
+(GLBs, audio) go up as chunked resumable uploads.
+
+To run against a local fake-GCS server (e.g. fsouza/fake-gcs-server), build
+the client with `emulator_client("http://localhost:4443")`.
+"""
+import base64
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import google_crc32c
+except ImportError:  # MD5 alone is enough to detect changes
+    google_crc32c = None
+
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+CHUNK_SIZE = 8 * 1024 * 1024  # must be a multiple of 256 KiB
+SIGNED_URL_SECONDS = 3600 * 24 * 365
+
+
+def emulator_client(endpoint, project="test"):
+    """storage.Client talking to a local fake-GCS server instead of Google."""
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import storage
+    return storage.Client(project=project, credentials=AnonymousCredentials(),
+                          client_options={"api_endpoint": endpoint})
+
+
+def file_checksums(path):
+    """(md5, crc32c) of a file, base64-encoded the way GCS reports them."""
+    md5 = hashlib.md5()
+    crc = google_crc32c.Checksum() if google_crc32c is not None else None
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+            if crc is not None:
+                crc.update(chunk)
+    return (base64.b64encode(md5.digest()).decode("ascii"),
+            base64.b64encode(crc.digest()).decode("ascii") if crc is not None else None)
+
+
+class UploadResult:
+    __slots__ = ("local_path", "filename", "path", "url", "bytes", "seconds", "skipped", "error")
+
+    def __init__(self, local_path, filename, path, url=None, nbytes=0, seconds=0.0, skipped=False, error=None):
+        self.local_path = local_path
+        self.filename = filename
+        self.path = path
+        self.url = url
+        self.bytes = nbytes
+        self.seconds = seconds
+        self.skipped = skipped
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def as_ref(self):
+        """The {"filename", "path", "url"} object stored on Firestore documents."""
+        ref = {"filename": self.filename, "path": self.path}
+        if self.url:
+            ref["url"] = self.url
+        return ref
+
+
+class Uploader:
+    """Bounded thread pool of uploads into one bucket."""
+
+    def __init__(self, bucket, workers=8, make_public=False, resumable_threshold=RESUMABLE_THRESHOLD,
+                 chunk_size=CHUNK_SIZE):
+        self.bucket = bucket
+        self.make_public = make_public
+        self.resumable_threshold = resumable_threshold
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self._lock = threading.Lock()
+        self.results = []
+
+    def object_name(self, prefix, local_path, md5=None):
+        if md5 is None:
+            md5 = file_checksums(local_path)[0]
+        digest = base64.b64decode(md5).hex()[:16]
+        return f"{prefix.rstrip('/')}/{digest}_{os.path.basename(local_path)}"
+
+    def submit(self, local_path, prefix, content_type=None):
+        """Upload `local_path` under `prefix/` in the background; returns a Future[UploadResult]."""
+        return self._executor.submit(self.upload, str(local_path), prefix, content_type)
+
+    def upload_many(self, paths, prefix, content_type=None):
+        """Upload all `paths` concurrently; returns results in input order."""
+        futures = [self.submit(p, prefix, content_type) for p in paths]
+        return [f.result() for f in futures]
+
+    def upload(self, local_path, prefix, content_type=None):
+        start = time.perf_counter()
+        filename = os.path.basename(local_path)
+        name = None
+        try:
+            md5, crc32c = file_checksums(local_path)
+            name = self.object_name(prefix, local_path, md5)
+            existing = self.bucket.get_blob(name)
+            if existing is not None and (existing.md5_hash == md5 or
+                                         (crc32c is not None and existing.crc32c == crc32c)):
+                result = UploadResult(local_path, filename, name, self._url(existing),
+                                      seconds=time.perf_counter() - start, skipped=True)
+            else:
+                size = os.path.getsize(local_path)
+                chunk_size = self.chunk_size if size > self.resumable_threshold else None
+                blob = self.bucket.blob(name, chunk_size=chunk_size)
+                mime = content_type or mimetypes.guess_type(local_path)[0] or "application/octet-stream"
+                blob.upload_from_filename(local_path, content_type=mime, checksum="md5")
+                result = UploadResult(local_path, filename, name, self._url(blob), nbytes=size,
+                                      seconds=time.perf_counter() - start)
+        except Exception as e:
+            result = UploadResult(local_path, filename, name, seconds=time.perf_counter() - start, error=str(e))
+            print(f"Upload failed for {local_path}: {e}", file=sys.stderr)
+        with self._lock:
+            self.results.append(result)
+        return result
+
+    def _url(self, blob):
+        if not self.make_public:
+            return None
+        try:
+            blob.make_public()
+            return blob.public_url
+        except Exception:
+            return blob.generate_signed_url(expiration=int(time.time()) + SIGNED_URL_SECONDS)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def report(self):
+        """Per-file throughput table plus totals."""
+        with self._lock:
+            results = list(self.results)
+        for r in sorted(results, key=lambda r: r.local_path):
+            if r.error:
+                status = "FAILED"
+            elif r.skipped:
+                status = "unchanged"
+            else:
+                mbps = r.bytes / r.seconds / 1e6 if r.seconds else 0.0
+                status = f"{r.bytes:>10} B {r.seconds:6.2f}s {mbps:6.2f} MB/s"
+            print(f"  {os.path.basename(r.local_path)[:40]:40} {status}")
+        uploaded = [r for r in results if r.ok and not r.skipped]
+        total = sum(r.bytes for r in uploaded)
+        print(f"Uploaded {len(uploaded)} file(s) ({total} bytes), skipped {sum(r.skipped for r in results)} "
+              f"unchanged, {sum(not r.ok for r in results)} failed")